@@ -1,5 +1,7 @@
 import argparse
+import json
 import logging
+import resource
 import time
 from functools import wraps
 from pathlib import Path
@@ -14,18 +16,30 @@ from scrapy.utils.project import get_project_settings
 from kurdish_scrapy.spiders.recursive import RecursiveSpider
 from kurdish_scrapy.spiders.sitemap import SitemapSpider
 from extractor.protocol import ContentExtractorProtocol
+from run_crawler import STREAMING_FEED_FORMATS, _infer_feed_format, _streaming_feed_options
 
 
 logger = logging.getLogger("benchmark")
 logger.setLevel(logging.INFO)
 logger.propagate = False
 
-SUPPORTED_FEED_FORMATS = {
-    ".csv": "csv",
-    ".json": "json",
-    ".jsonl": "jsonlines",
+MODE_LIVE = "live"
+MODE_RECORD = "record"
+MODE_REPLAY = "replay"
+
+# Record and replay runs start from a clean slate: no resumed crawl state,
+# sitemap ledger, learned throttle rates or dedup index from earlier runs.
+ISOLATED_SETTINGS = {
+    "CRAWL_STATE_DIR": "",
+    "SITEMAP_LEDGER_PATH": "",
+    "DEDUP_INDEX_PATH": "",
+    "ADAPTIVE_THROTTLE_STATE_PATH": "",
+    "MEMUSAGE_CHECK_INTERVAL_SECONDS": 1,
 }
 
+# Metrics where a lower value is better, for the baseline comparison
+LOWER_IS_BETTER = {"cpu_seconds_per_page", "peak_rss_mb", "bytes_per_item", "elapsed_seconds"}
+
 F = TypeVar("F", bound=Callable)
 
 
@@ -46,17 +60,6 @@ def log_spent_time(name: str | None = None) -> Callable[[F], F]:
     return decorator
 
 
-def _infer_feed_format(output_path: str) -> str:
-    ext = Path(output_path).suffix.lower()
-    feed_format = SUPPORTED_FEED_FORMATS.get(ext)
-    if not feed_format:
-        supported = ", ".join(SUPPORTED_FEED_FORMATS.keys())
-        raise ValueError(
-            f"Unsupported output extension '{ext}'. Use one of: {supported}"
-        )
-    return feed_format
-
-
 def parse_args() -> argparse.Namespace:
     parser = argparse.ArgumentParser(
         description="Run sitemap and recursive crawlers with timing logs."
@@ -69,18 +72,43 @@ def parse_args() -> argparse.Namespace:
     parser.add_argument(
         "--sitemap",
         required=True,
-        help="Sitemap spider output file path (supported: .csv, .json, .jsonl)",
+        help="Sitemap spider output file path (supported: .csv, .json, .jsonl, .parquet, .jsonl.gz, .jsonl.zst)",
     )
     parser.add_argument(
         "--recursive",
         required=True,
-        help="Recursive spider output file path (supported: .csv, .json, .jsonl)",
+        help="Recursive spider output file path (supported: .csv, .json, .jsonl, .parquet, .jsonl.gz, .jsonl.zst)",
     )
     parser.add_argument(
         "--benchmark-log",
         default="benchmark.log",
         help="Benchmark log file path (default: benchmark.log)",
     )
+    parser.add_argument(
+        "--refresh-sitemaps",
+        action="store_true",
+        help="Ignore the cached sitemap discovery result for the domain",
+    )
+    parser.add_argument(
+        "--mode",
+        choices=[MODE_LIVE, MODE_RECORD, MODE_REPLAY],
+        default=MODE_LIVE,
+        help="live: crawl the site; record: crawl it and store every response in "
+        "--archive; replay: serve responses from --archive without network access",
+    )
+    parser.add_argument(
+        "--archive",
+        default="benchmark_archive",
+        help="Directory of recorded responses (default: benchmark_archive)",
+    )
+    parser.add_argument(
+        "--results",
+        help="Write the metrics of this run to this JSON file",
+    )
+    parser.add_argument(
+        "--baseline",
+        help="Compare the metrics of this run with this JSON file of an earlier run",
+    )
     return parser.parse_args()
 
 
@@ -93,32 +121,142 @@ def configure_benchmark_logger(log_path: str) -> None:
     logger.addHandler(file_handler)
 
 
+def build_settings(mode: str, archive: str):
+    settings = get_project_settings()
+    if mode == MODE_LIVE:
+        return settings
+
+    settings.setdict(ISOLATED_SETTINGS, priority="cmdline")
+    settings.setdict(
+        {
+            "HTTPCACHE_ENABLED": True,
+            "HTTPCACHE_DIR": str(Path(archive).resolve() / "httpcache"),
+            "HTTPCACHE_STORAGE": "scrapy.extensions.httpcache.FilesystemCacheStorage",
+            "HTTPCACHE_POLICY": "scrapy.extensions.httpcache.DummyPolicy",
+            "HTTPCACHE_EXPIRATION_SECS": 0,
+            "HTTPCACHE_IGNORE_HTTP_CODES": [],
+        },
+        priority="cmdline",
+    )
+    if mode == MODE_REPLAY:
+        # Requests missing from the archive are dropped instead of fetched,
+        # and nothing else reaches out to the network.
+        settings.setdict(
+            {
+                "HTTPCACHE_IGNORE_MISSING": True,
+                "SCRAPEOPS_FAKE_USER_AGENT_ENABLED": False,
+                "DOWNLOAD_DELAY": 0,
+            },
+            priority="cmdline",
+        )
+    return settings
+
+
+def get_sitemap_urls(args: argparse.Namespace) -> set[str]:
+    """Sitemap URLs of the domain, stored in the archive when recording."""
+    sitemap_urls_path = Path(args.archive) / "sitemap_urls.json"
+    if args.mode == MODE_REPLAY:
+        return set(json.loads(sitemap_urls_path.read_text(encoding="utf-8")))
+
+    sitemap_urls = SitemapSpider.get_sitemap_urls(
+        args.domain, refresh=args.refresh_sitemaps or args.mode == MODE_RECORD
+    )
+    if args.mode == MODE_RECORD:
+        sitemap_urls_path.parent.mkdir(parents=True, exist_ok=True)
+        sitemap_urls_path.write_text(json.dumps(sorted(sitemap_urls)), encoding="utf-8")
+    return sitemap_urls
+
+
+def _cpu_seconds() -> float:
+    # Children covers extraction pool workers once they have exited.
+    total = 0.0
+    for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN):
+        usage = resource.getrusage(who)
+        total += usage.ru_utime + usage.ru_stime
+    return total
+
+
+def spider_metrics(stats: dict, elapsed: float, cpu_seconds: float) -> dict:
+    pages = stats.get("response_received_count", 0)
+    items = stats.get("item_scraped_count", 0)
+    response_bytes = stats.get("downloader/response_bytes", 0)
+    # MemoryUsage samples the RSS every second; ru_maxrss (KiB on Linux) is
+    # the process-wide peak and only a fallback.
+    peak_rss = stats.get("memusage/max") or (
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+    )
+    return {
+        "pages": pages,
+        "items": items,
+        "elapsed_seconds": round(elapsed, 3),
+        "pages_per_second": round(pages / elapsed, 3) if elapsed else 0.0,
+        "items_per_second": round(items / elapsed, 3) if elapsed else 0.0,
+        "cpu_seconds_per_page": round(cpu_seconds / pages, 4) if pages else 0.0,
+        "peak_rss_mb": round(peak_rss / 2**20, 1),
+        "bytes_per_item": round(response_bytes / items) if items else 0,
+        "archive_misses": stats.get("httpcache/ignore", 0),
+    }
+
+
+def compare_with_baseline(results: dict, baseline: dict) -> None:
+    for spider_name, metrics in results.items():
+        base_metrics = baseline.get(spider_name)
+        if not base_metrics:
+            logger.info("%s: no baseline", spider_name)
+            continue
+        for key, value in metrics.items():
+            base_value = base_metrics.get(key)
+            if not base_value or key in ("pages", "items", "archive_misses"):
+                continue
+            change = (value - base_value) / base_value * 100
+            better = change < 0 if key in LOWER_IS_BETTER else change > 0
+            logger.info(
+                "%s %s: %s (baseline %s, %+.1f%%%s)",
+                spider_name,
+                key,
+                value,
+                base_value,
+                change,
+                "" if abs(change) < 1 else ", better" if better else ", worse",
+            )
+
+
 def run_crawler(
     crawler_process: CrawlerProcess,
     output_path: str,
     content_extractor: ContentExtractorProtocol,
     spider_cls,
+    results: dict | None = None,
     **kwargs
 ):
     spider_name = spider_cls.__name__
     feed_format = _infer_feed_format(output_path)
-    crawler_process.settings.set(
-        "FEEDS",
-        {
+    # Both crawlers are created from the same settings, so reset the feed
+    # setting of the other kind of output.
+    if feed_format in STREAMING_FEED_FORMATS.values():
+        feeds = {}
+        streaming_feeds = {
+            output_path: _streaming_feed_options(crawler_process.settings, feed_format)
+        }
+    else:
+        feeds = {
             output_path: {
                 "format": feed_format,
                 "encoding": "utf-8",
                 "overwrite": False,
             }
-        },
-        priority="cmdline",
-    )
+        }
+        streaming_feeds = {}
+    crawler_process.settings.set("FEEDS", feeds, priority="cmdline")
+    crawler_process.settings.set("STREAMING_FEEDS", streaming_feeds, priority="cmdline")
     crawler = crawler_process.create_crawler(spider_cls)
     start_time: float | None = None
+    start_cpu = 0.0
 
     def _on_spider_opened(spider):
-        nonlocal start_time
+        nonlocal start_time, start_cpu
         start_time = time.perf_counter()
+        start_cpu = _cpu_seconds()
         logger.info("Starting %s -> %s", spider_name, output_path)
 
     def _on_spider_closed(spider, reason):
@@ -126,6 +264,11 @@ def run_crawler(
             return
         elapsed = time.perf_counter() - start_time
         logger.info("%s finished in %.2f seconds (reason=%s)", spider_name, elapsed, reason)
+        if results is not None:
+            results[spider_name] = metrics = spider_metrics(
+                crawler.stats.get_stats(), elapsed, _cpu_seconds() - start_cpu
+            )
+            logger.info("%s metrics: %s", spider_name, json.dumps(metrics))
 
     crawler.signals.connect(
         _on_spider_opened, signal=signals.spider_opened, weak=False
@@ -140,15 +283,18 @@ def main():
     args = parse_args()
     configure_benchmark_logger(args.benchmark_log)
     logger.info("Benchmark logs are written to %s", args.benchmark_log)
-    crawler_process = CrawlerProcess(get_project_settings())
+    logger.info("Mode: %s (archive: %s)", args.mode, args.archive)
+    crawler_process = CrawlerProcess(build_settings(args.mode, args.archive))
     total_start = time.perf_counter()
+    results: dict[str, dict] = {}
 
-    sitemap_urls = SitemapSpider.get_sitemap_urls(args.domain)
+    sitemap_urls = get_sitemap_urls(args)
     first_crawl = run_crawler(
         crawler_process=crawler_process,
         output_path=args.sitemap,
         content_extractor=ArticleExtractor(),
         spider_cls=SitemapSpider,
+        results=results,
         sitemap_urls=sitemap_urls,
     )
 
@@ -158,6 +304,7 @@ def main():
             output_path=args.recursive,
             content_extractor=ArticleExtractor(),
             spider_cls=RecursiveSpider,
+            results=results,
             url=args.domain,
         )
 
@@ -176,6 +323,13 @@ def main():
     first_crawl.addBoth(_finish)
     crawler_process.start()
 
+    if args.results:
+        Path(args.results).write_text(json.dumps(results, indent=2), encoding="utf-8")
+        logger.info("Metrics written to %s", args.results)
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text(encoding="utf-8"))
+        compare_with_baseline(results, baseline)
+
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,39 @@
+"""Cheap checks on raw HTML bytes that run before Trafilatura."""
+
+import re
+from typing import Optional
+
+NON_VISIBLE_REGEX = re.compile(
+    rb"<!--.*?-->|<(script|style|noscript|template|svg)\b.*?</\1\s*>",
+    re.IGNORECASE | re.DOTALL,
+)
+TAG_REGEX = re.compile(rb"<[^>]*>")
+WORD_REGEX = re.compile(rb"\S+")
+# Arabic block for Sorani, plus the Latin letters Kurmanji and Zazaki use
+# and English mostly does not.
+KURDISH_CHARS_REGEX = re.compile("[؀-ۿçêîşûÇÊÎŞÛ]")
+
+SKIP_TOO_FEW_WORDS = "too_few_words"
+SKIP_NO_KURDISH_CHARS = "no_kurdish_chars"
+
+
+def visible_text(body: bytes) -> bytes:
+    """Roughly strip markup, scripts and styles from an HTML body."""
+    return TAG_REGEX.sub(b" ", NON_VISIBLE_REGEX.sub(b" ", body))
+
+
+def skip_reason(body: bytes, encoding: str, min_word_count: int) -> Optional[str]:
+    """Return why a page can't yield an article, or None if it might.
+
+    The visible word count over-estimates the article text (menus, footers
+    and link lists are counted too), so a page below `min_word_count` can
+    never pass `LenPipeline`.
+    """
+    text = visible_text(body)
+    if len(WORD_REGEX.findall(text)) < min_word_count:
+        return SKIP_TOO_FEW_WORDS
+
+    if not KURDISH_CHARS_REGEX.search(text.decode(encoding, errors="ignore")):
+        return SKIP_NO_KURDISH_CHARS
+
+    return None
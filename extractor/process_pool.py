@@ -0,0 +1,115 @@
+"""Run content extraction in worker processes off the Twisted reactor thread."""
+
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Optional
+
+from twisted.internet import defer
+from twisted.python.failure import Failure
+
+from extractor.protocol import ContentExtractorProtocol
+from kurdish_scrapy import instrumentation, profiler
+
+
+_worker_extractor: Optional[ContentExtractorProtocol] = None
+
+
+def _init_worker(
+    content_extractor: ContentExtractorProtocol, profiling: Optional[tuple] = None
+) -> None:
+    global _worker_extractor
+    _worker_extractor = content_extractor
+    if profiling is not None:
+        profiler.follow_in_worker(*profiling)
+
+
+def _extract_in_worker(html: str, url: str) -> tuple[Any, float]:
+    start = time.perf_counter()
+    # Labels the worker's profile samples with the domain and stage
+    domain = instrumentation.url_domain(url)
+    with instrumentation.in_stage(instrumentation.STAGE_EXTRACT, domain):
+        result = _worker_extractor.extract(html, url)
+    return result, time.perf_counter() - start
+
+
+class ProcessPoolExtractor:
+    """Wrap a content extractor so that `extract` calls run in a process pool.
+
+    `extract_deferred` returns a Deferred fired on the reactor thread with the
+    result and the seconds the worker spent extracting it. At most
+    `max_pending` extractions are queued or running at once; further callers
+    wait on a semaphore, which keeps Scrapy's scraper slot full and so slows
+    the downloader down instead of piling up HTML in the pool queue.
+    """
+
+    def __init__(
+        self,
+        content_extractor: ContentExtractorProtocol,
+        max_workers: int,
+        max_pending: int = 0,
+    ):
+        """Initialize the process pool extractor.
+
+        Args:
+            content_extractor: Picklable extractor run inside each worker.
+            max_workers: Number of worker processes.
+            max_pending: Max extractions queued or running, defaults to
+                twice the number of workers.
+        """
+        self.content_extractor = content_extractor
+        self.max_workers = max_workers
+        self.max_pending = max_pending or max_workers * 2
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._semaphore = defer.DeferredSemaphore(self.max_pending)
+
+    @property
+    def queue_depth(self) -> int:
+        """Number of extractions waiting for a free pool slot."""
+        return len(self._semaphore.waiting)
+
+    def extract(self, html: str, url: str) -> Any:
+        """Extract synchronously in the calling process."""
+        return self.content_extractor.extract(html, url)
+
+    def extract_deferred(self, html: str, url: str) -> defer.Deferred:
+        """Extract in the pool, returning a Deferred with `(result, seconds)`.
+
+        `seconds` is the worker's extraction time, without the wait for a
+        pool slot and the transfer of the page and result between processes.
+        """
+        return self._semaphore.run(self._submit, html, url)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                initializer=_init_worker,
+                # Workers sample their stacks during the profiler's windows.
+                initargs=(self.content_extractor, profiler.worker_profiling()),
+            )
+        return self._executor
+
+    def _submit(self, html: str, url: str) -> defer.Deferred:
+        # Imported here so that importing this module does not install the
+        # default reactor before Scrapy installs the configured one.
+        from twisted.internet import reactor
+
+        deferred = defer.Deferred()
+        future = self._get_executor().submit(_extract_in_worker, html, url)
+
+        def _fire(done: Future) -> None:
+            error = done.exception()
+            if error is not None:
+                deferred.errback(Failure(error))
+            else:
+                deferred.callback(done.result())
+
+        future.add_done_callback(
+            lambda done: reactor.callFromThread(_fire, done)
+        )
+        return deferred
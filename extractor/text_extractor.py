@@ -5,7 +5,6 @@ import json
 
 import trafilatura
 
-from kurdish_scrapy.lang_model import language_model
 from kurdish_scrapy.items import DataItem
 from kurdish_scrapy.loaders import DataItemLoader
 
@@ -65,10 +64,6 @@ class ArticleExtractor:
         text = output.get("text") or ""
         word_count = len(text.split())
 
-        labels, probs = language_model.predict(text.replace("\n", " "))
-        lang = labels[0].replace("__label__", "")
-        lang_score = probs[0]
-
         loader = DataItemLoader(item=DataItem())
 
         loader.add_value("text", text)
@@ -76,8 +71,6 @@ class ArticleExtractor:
         loader.add_value("url", url)
         loader.add_value("publisher", output.get("hostname"))
         loader.add_value("word_count", word_count)
-        loader.add_value("lang", lang)
-        loader.add_value("lang_score", lang_score)
 
         loader.add_value("source_type", "news")
 
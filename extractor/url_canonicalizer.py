@@ -0,0 +1,177 @@
+import html
+import re
+from typing import Optional
+from urllib.parse import parse_qsl, urlencode, urljoin, urlsplit, urlunsplit
+
+
+CANONICAL_LINK_REGEX = re.compile(
+    rb"<link\s[^>]*?\brel\s*=\s*[\"']?canonical\b[^>]*>", re.IGNORECASE
+)
+LINK_HREF_REGEX = re.compile(
+    rb"""\bhref\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s>]+))""", re.IGNORECASE
+)
+SESSION_PATH_PARAM_REGEX = re.compile(r";(?:jsessionid|phpsessid|sid)=[^/?]*", re.IGNORECASE)
+AMP_PATH_REGEX = re.compile(r"/amp/?$", re.IGNORECASE)
+
+TRACKING_PARAM_PREFIXES = ("utm_",)
+TRACKING_PARAMS = frozenset(
+    {
+        "fbclid", "gclid", "dclid", "msclkid", "yclid", "igshid", "mc_cid",
+        "mc_eid", "_ga", "_gl", "ref_src",
+    }
+)
+AMP_PARAMS = frozenset({"amp"})
+SESSION_PARAMS = frozenset(
+    {"sid", "sessionid", "session_id", "phpsessid", "jsessionid", "cfid", "cftoken"}
+)
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def canonical_link(response) -> Optional[str]:
+    """Absolute URL of the page's `<link rel="canonical">`, if any."""
+    match = CANONICAL_LINK_REGEX.search(response.body[:65536])
+    if not match:
+        return None
+    href = LINK_HREF_REGEX.search(match.group(0))
+    if not href:
+        return None
+    raw = href.group(1) or href.group(2) or href.group(3)
+    value = html.unescape(raw.decode(response.encoding, errors="ignore")).strip()
+    return urljoin(response.url, value) if value else None
+
+
+class UrlCanonicalizer:
+    """Rewrite URLs of one site to a single canonical form.
+
+    Fixed rules lower-case the scheme and host, drop default ports,
+    fragments, tracking and session parameters and AMP variants, and sort
+    the query. Learned rules come from pages telling which URL they really
+    are, through `rel=canonical` or a redirect: the scheme and host they
+    point to become the site's origin, which `www.`/bare host and http/https
+    variants are then moved onto, query parameters they drop are learned as
+    not changing content, and the site's trailing-slash style is followed
+    once it is clear. Until the origin is clear, scheme and host are kept.
+    """
+
+    # Observations before a learned rule is applied
+    MIN_EVIDENCE = 3
+    MIN_AGREEMENT = 0.9
+
+    def __init__(self, site_url: str, rules: Optional[dict] = None):
+        """Initialize the canonicalizer.
+
+        Args:
+            site_url: Any URL of the site; only its host is used, to tell
+                the site's own URLs from others.
+            rules: Learned rules, updated in place. Pass `spider.state`
+                storage to keep them across resumed runs.
+        """
+        self.bare_host = (urlsplit(site_url).hostname or "").lower().removeprefix("www.")
+        self.rules = rules if rules is not None else {}
+        self.rules.setdefault("origins", {})
+        self.rules.setdefault("params", {})
+        self.rules.setdefault("trailing_slash", [0, 0])
+
+    def canonicalize(self, url: str) -> str:
+        parts = urlsplit(url)
+        scheme = parts.scheme.lower()
+        host = (parts.hostname or "").lower()
+        port = parts.port
+        if port == DEFAULT_PORTS.get(scheme):
+            port = None
+        netloc = f"{host}:{port}" if port else host
+        origin = self.site_origin()
+        if origin and host.removeprefix("www.") == self.bare_host:
+            origin_scheme, _, origin_netloc = origin.partition("://")
+            origin_port = urlsplit(origin).port
+            if port is None or port == origin_port:
+                scheme, netloc = origin_scheme, origin_netloc
+
+        path = SESSION_PATH_PARAM_REGEX.sub("", parts.path) or "/"
+        path = AMP_PATH_REGEX.sub("", path) or "/"
+        path = self._apply_trailing_slash(path)
+
+        query = urlencode(
+            sorted(
+                (key, value)
+                for key, value in parse_qsl(parts.query, keep_blank_values=True)
+                if not self.is_ignorable_param(key)
+                and not (key.lower() == "outputtype" and value.lower() == "amp")
+            )
+        )
+        return urlunsplit((scheme, netloc, path, query, ""))
+
+    def is_ignorable_param(self, name: str) -> bool:
+        name = name.lower()
+        if name in TRACKING_PARAMS or name in SESSION_PARAMS or name in AMP_PARAMS:
+            return True
+        if name.startswith(TRACKING_PARAM_PREFIXES):
+            return True
+        ignorable, significant = self.rules["params"].get(name, (0, 0))
+        return self._is_agreed(ignorable, significant)
+
+    def learn(self, url: str, canonical_url: str) -> None:
+        """Learn from a page at `url` that says it is `canonical_url`."""
+        parts = urlsplit(url)
+        canonical = urlsplit(canonical_url)
+        if (canonical.hostname or "").lower().removeprefix("www.") != self.bare_host:
+            return
+
+        origin = self._origin(canonical)
+        if origin:
+            origins = self.rules["origins"]
+            origins[origin] = origins.get(origin, 0) + 1
+
+        # A parameter only proved it doesn't change content if the canonical
+        # URL is the same page without it; `/?p=12` naming `/story-12/` says
+        # nothing about `p` on other paths.
+        same_page = (
+            parts.scheme.lower() == canonical.scheme.lower()
+            and (parts.hostname or "").lower() == (canonical.hostname or "").lower()
+            and parts.path == canonical.path
+        )
+        if parts.query and same_page:
+            canonical_params = {
+                key.lower() for key, _ in parse_qsl(canonical.query, keep_blank_values=True)
+            }
+            for key, _ in parse_qsl(parts.query, keep_blank_values=True):
+                counts = self.rules["params"].setdefault(key.lower(), [0, 0])
+                counts[key.lower() in canonical_params] += 1
+
+        path = canonical.path
+        if path not in ("", "/") and "." not in path.rpartition("/")[2]:
+            self.rules["trailing_slash"][path.endswith("/")] += 1
+
+    def site_origin(self) -> Optional[str]:
+        """The `scheme://host[:port]` the site's pages agree on, if clear yet."""
+        origins = self.rules["origins"]
+        total = sum(origins.values())
+        for origin, votes in origins.items():
+            if self._is_agreed(votes, total - votes):
+                return origin
+        return None
+
+    @staticmethod
+    def _origin(parts) -> Optional[str]:
+        scheme = parts.scheme.lower()
+        if scheme not in DEFAULT_PORTS or not parts.hostname:
+            return None
+        host = parts.hostname.lower()
+        port = None if parts.port == DEFAULT_PORTS[scheme] else parts.port
+        return f"{scheme}://{host}:{port}" if port else f"{scheme}://{host}"
+
+    def _apply_trailing_slash(self, path: str) -> str:
+        if path == "/" or "." in path.rpartition("/")[2]:
+            return path
+        without_slash, with_slash = self.rules["trailing_slash"]
+        if self._is_agreed(with_slash, without_slash):
+            return path if path.endswith("/") else path + "/"
+        if self._is_agreed(without_slash, with_slash):
+            return path.rstrip("/") or "/"
+        return path
+
+    def _is_agreed(self, votes: int, against: int) -> bool:
+        return (
+            votes >= self.MIN_EVIDENCE
+            and votes >= self.MIN_AGREEMENT * (votes + against)
+        )
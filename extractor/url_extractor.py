@@ -1,60 +1,104 @@
+import html
 import re
-from urllib.parse import urlparse
+from typing import Optional
+from urllib.parse import urljoin, urlsplit
 
 re_html = re.compile("text/html")
 
+_ATTR_VALUE = rb"""\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s>]+))"""
+# Comments, scripts and styles are matched too so that anchors inside them,
+# which are not links of the page, are skipped in the same pass.
+HREF_REGEX = re.compile(
+    rb"<!--.*?-->|<(script|style)\b.*?</\1\s*>|<a\s[^>]*?\bhref" + _ATTR_VALUE,
+    re.IGNORECASE | re.DOTALL,
+)
+BASE_HREF_REGEX = re.compile(rb"<base\s[^>]*?\bhref" + _ATTR_VALUE, re.IGNORECASE)
+
+REASON_SCHEME = "scheme"
+REASON_OFFSITE = "offsite"
+REASON_MEDIA = "media"
+
 
 class UrlExtractor:
 
-    IGNORE_FILE_EXTENSIONS = "(pdf)|(docx?)|(xlsx?)|(pptx?)|(epub)|(jpe?g)|(png)|(bmp)|(gif)|(tiff)|(webp)|(avi)|(mpe?g)|(mov)|(qt)|(webm)|(ogg)|(midi)|(mid)|(mp3)|(wav)|(zip)|(rar)|(exe)|(apk)|(css)"
+    IGNORE_FILE_EXTENSIONS = frozenset(
+        {
+            "pdf", "doc", "docx", "xls", "xlsx", "ppt", "pptx", "epub",
+            "jpg", "jpeg", "png", "bmp", "gif", "tiff", "webp",
+            "avi", "mpg", "mpeg", "mov", "qt", "webm", "ogg", "midi", "mid",
+            "mp3", "wav", "zip", "rar", "exe", "apk", "css",
+        }
+    )
 
-    IGNORE_REGEX = "(mail[tT]o)|([jJ]avascript)|(tel)|(fax)"
+    ALLOWED_SCHEMES = frozenset({"http", "https"})
 
     def extract(self, response) -> set[str]:
+        # Scan the raw body for anchors instead of building a second DOM next
+        # to the one Trafilatura builds for the same page.
         urls = set()
+        seen = set()
         domain = self.get_domain(response.url)
-        for href in response.css("a::attr(href)").getall():
-            url = response.urljoin(href)
+        body = response.body
+        base_url = response.url
+        base_match = BASE_HREF_REGEX.search(body)
+        if base_match:
+            base_url = urljoin(base_url, self._decode_href(base_match, response.encoding))
+
+        for match in HREF_REGEX.finditer(body):
+            if match.lastindex is None or match.lastindex == 1:
+                continue  # comment, script or style
+            href = self._decode_href(match, response.encoding)
+            if not href or href in seen:
+                continue
+            seen.add(href)
+            url = urljoin(base_url, href)
             url = url.split("#")[0]  # drop fragment
             if self.should_request(url, domain):
                 urls.add(url)
 
         return urls
 
+    @staticmethod
+    def _decode_href(match: re.Match, encoding: str) -> str:
+        raw = match.group(match.lastindex) if match.lastindex else b""
+        return html.unescape(raw.decode(encoding, errors="ignore")).strip()
+
     @staticmethod
     def content_type(response):
         return re_html.match(response.headers.get("Content-Type").decode("utf-8"))
 
     @classmethod
     def should_request(cls, url, domain):
-        return (
-            domain in url
-            and not cls._is_media_url(url)
-            and not cls._is_matched_ignore_regex(url)
-        )
+        return cls.classify(url, domain) is None
+
+    @classmethod
+    def classify(cls, url: str, domain: str) -> Optional[str]:
+        """Return why `url` should not be requested, or None if it should.
+
+        The URL is parsed once: the scheme must be http(s), the host must be
+        `domain` or one of its subdomains and the path must not end with an
+        ignored file extension.
+        """
+        parts = urlsplit(url)
+        if parts.scheme.lower() not in cls.ALLOWED_SCHEMES:
+            return REASON_SCHEME
+
+        host = (parts.hostname or "").removeprefix("www.")
+        if host != domain and not host.endswith("." + domain):
+            return REASON_OFFSITE
+
+        last_segment = parts.path.rpartition("/")[2]
+        if "." in last_segment:
+            extension = last_segment.rpartition(".")[2].lower()
+            if extension in cls.IGNORE_FILE_EXTENSIONS:
+                return REASON_MEDIA
+
+        return None
 
     @staticmethod
     def get_domain(url):
-        domain = urlparse(url).netloc
+        domain = (urlsplit(url).hostname or "").lower()
         if domain.startswith("www."):
             domain = domain[4:]
 
         return domain
-
-    @classmethod
-    def _is_media_url(cls, url: str):
-        matched = re.match(
-            r".*\." + cls.IGNORE_FILE_EXTENSIONS + r"$",
-            url,
-            re.IGNORECASE,
-        )
-        is_matched = bool(matched)
-        if is_matched:
-            print("It is media url")
-
-        return is_matched
-
-    @classmethod
-    def _is_matched_ignore_regex(cls, url):
-        matched = re.search(cls.IGNORE_REGEX, url)
-        return bool(matched)
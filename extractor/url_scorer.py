@@ -0,0 +1,100 @@
+import re
+from typing import Optional
+from urllib.parse import parse_qsl, urlsplit
+
+
+DATE_SEGMENT_REGEX = re.compile(r"^(?:19|20)\d{2}(?:[-_/]?\d{1,2}){0,2}$")
+NUMBER_REGEX = re.compile(r"\d+")
+PAGINATION_SEGMENTS = frozenset({"page", "pages", "p"})
+# Not "p": WordPress uses ?p=<id> for the articles themselves
+PAGINATION_PARAMS = frozenset({"page", "pg", "paged", "offset", "start"})
+
+
+class UrlScorer:
+    """Score same-site links by how likely they lead to an article.
+
+    The score becomes the Scrapy request priority, so article-like URLs are
+    fetched before tag pages, archives and pagination. It combines cheap URL
+    features (path depth, date segments, slug length, pagination) with the
+    share of fetched pages that produced an item under each path prefix of
+    the site.
+    """
+
+    MIN_PRIORITY = -10
+    MAX_PRIORITY = 10
+    # Fetches under a prefix before its yield history counts
+    MIN_SAMPLES = 5
+    HISTORY_WEIGHT = 8
+
+    def __init__(self, history: Optional[dict] = None):
+        """Initialize the scorer.
+
+        Args:
+            history: Per-prefix `[fetched, items]` counts, updated in place.
+                Pass `spider.state` storage to keep it across resumed runs.
+        """
+        self.history = history if history is not None else {}
+        self.fetched = sum(counts[0] for counts in self.history.values())
+        self.items = sum(counts[1] for counts in self.history.values())
+
+    def score(self, url: str) -> int:
+        parts = urlsplit(url)
+        segments = [segment for segment in parts.path.split("/") if segment]
+        score = 0
+
+        if not segments:
+            score -= 2
+        elif len(segments) > 6:
+            score -= 1
+
+        if any(DATE_SEGMENT_REGEX.match(segment) for segment in segments):
+            score += 3
+
+        if segments:
+            slug = segments[-1].rsplit(".", 1)[0]
+            words = [word for word in re.split(r"[-_+]", slug) if word]
+            if len(words) >= 4 or len(slug) >= 30:
+                score += 3
+            elif len(words) >= 2:
+                score += 1
+            elif slug.isdigit() and len(slug) >= 4:
+                score += 2  # numeric article id
+
+        if self._is_pagination(segments, parts.query):
+            score -= 3
+
+        score += self._history_score(self.prefix(segments))
+        return max(self.MIN_PRIORITY, min(self.MAX_PRIORITY, score))
+
+    def record(self, url: str, produced_item: bool) -> None:
+        """Count a fetched page, and whether it produced an item, for its prefix."""
+        segments = [segment for segment in urlsplit(url).path.split("/") if segment]
+        counts = self.history.setdefault(self.prefix(segments), [0, 0])
+        counts[0] += 1
+        counts[1] += int(produced_item)
+        self.fetched += 1
+        self.items += int(produced_item)
+
+    @staticmethod
+    def prefix(segments: list[str]) -> str:
+        """Up to two directory segments with numbers masked: `/news/N`."""
+        directories = segments[:-1][:2]
+        return "/" + "/".join(NUMBER_REGEX.sub("N", segment) for segment in directories)
+
+    def _history_score(self, prefix: str) -> int:
+        fetched, items = self.history.get(prefix, (0, 0))
+        if fetched < self.MIN_SAMPLES:
+            return 0
+        # Laplace-smoothed yield of the prefix against the site as a whole
+        prefix_yield = (items + 1) / (fetched + 2)
+        site_yield = (self.items + 1) / (self.fetched + 2)
+        return round((prefix_yield - site_yield) * self.HISTORY_WEIGHT)
+
+    @staticmethod
+    def _is_pagination(segments: list[str], query: str) -> bool:
+        for previous, segment in zip(segments, segments[1:]):
+            if previous.lower() in PAGINATION_SEGMENTS and segment.isdigit():
+                return True
+        return any(
+            key.lower() in PAGINATION_PARAMS for key, _ in parse_qsl(query)
+        )
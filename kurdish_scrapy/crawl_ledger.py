@@ -0,0 +1,111 @@
+import sqlite3
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+from kurdish_scrapy.shared import SharedRegistry
+
+
+KIND_ARTICLE = "article"
+KIND_SITEMAP = "sitemap"
+
+_ledgers: SharedRegistry["CrawlLedger"] = SharedRegistry()  # by ledger path
+
+
+@dataclass
+class LedgerEntry:
+    url: str
+    kind: str
+    lastmod: Optional[str]
+    etag: Optional[str]
+    last_modified: Optional[str]
+    updated_at: float
+
+
+class CrawlLedger:
+    """SQLite record of sitemap entries fetched by earlier runs.
+
+    Each article or child sitemap URL is stored with its sitemap `lastmod` and,
+    for articles, the `ETag` and `Last-Modified` response headers. Every
+    write is its own short transaction, so crawler processes sharing the
+    file never wait on each other for longer than one write.
+    """
+
+    def __init__(self, path: str):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        # In WAL mode this only syncs at checkpoints, which keeps per-write
+        # commits cheap.
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "url TEXT PRIMARY KEY, kind TEXT NOT NULL, lastmod TEXT, etag TEXT, "
+            "last_modified TEXT, updated_at REAL NOT NULL)"
+        )
+
+    def get(self, url: str) -> Optional[LedgerEntry]:
+        row = self.db.execute(
+            "SELECT url, kind, lastmod, etag, last_modified, updated_at "
+            "FROM entries WHERE url = ?",
+            (url,),
+        ).fetchone()
+        return LedgerEntry(*row) if row else None
+
+    def is_unchanged(self, url: str, lastmod: Optional[str]) -> bool:
+        """Whether `url` was recorded with the same, non-empty `lastmod`."""
+        if not lastmod:
+            return False
+        entry = self.get(url)
+        return entry is not None and entry.lastmod == lastmod
+
+    def record(
+        self,
+        url: str,
+        kind: str,
+        lastmod: Optional[str] = None,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+    ) -> None:
+        self.db.execute(
+            "INSERT OR REPLACE INTO entries "
+            "(url, kind, lastmod, etag, last_modified, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (url, kind, lastmod, etag, last_modified, time.time()),
+        )
+
+    def record_many(self, urls_lastmods: dict[str, Optional[str]], kind: str) -> None:
+        """Record URLs with their `lastmod` in a single transaction."""
+        now = time.time()
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO entries "
+                "(url, kind, lastmod, etag, last_modified, updated_at) "
+                "VALUES (?, ?, ?, NULL, NULL, ?)",
+                [(url, kind, lastmod, now) for url, lastmod in urls_lastmods.items()],
+            )
+            self.db.execute("COMMIT")
+        except BaseException:
+            self.db.execute("ROLLBACK")
+            raise
+
+    def close(self) -> None:
+        self.db.close()
+
+
+def open_ledger(path: str) -> CrawlLedger:
+    """Return the process's ledger connection for `path`, opening it on first use.
+
+    Crawlers of one process run on the same reactor thread, so they share
+    one connection instead of competing for the file's write lock.
+    """
+    return _ledgers.acquire(path, lambda: CrawlLedger(path))
+
+
+def close_ledger(path: str) -> None:
+    """Release `path`; the connection is closed when its last crawler releases it."""
+    ledger = _ledgers.release(path)
+    if ledger is not None:
+        ledger.close()
@@ -0,0 +1,85 @@
+import shutil
+import sqlite3
+from collections import OrderedDict
+from pathlib import Path
+
+from scrapy.dupefilters import RFPDupeFilter
+from scrapy.utils.job import job_dir
+
+from kurdish_scrapy.finish_reasons import COMPLETED_FINISH_REASONS
+
+
+class DiskDupeFilter(RFPDupeFilter):
+    """RFPDupeFilter that keeps seen request fingerprints in SQLite.
+
+    With `JOBDIR` set, fingerprints live in `<JOBDIR>/seen.sqlite3`, so memory
+    stays bounded by `DUPEFILTER_CACHE_SIZE` recently seen fingerprints and an
+    interrupted crawl resumes with its seen-set intact. A completed crawl
+    (finished, or stopped by its crawl budget) clears the set and drops the
+    request queue Scrapy keeps in `<JOBDIR>/requests.queue`, so the next run
+    starts over.
+    """
+
+    def __init__(
+        self,
+        path=None,
+        debug=False,
+        *,
+        fingerprinter=None,
+        cache_size: int = 100_000,
+        commit_interval: int = 1000,
+    ):
+        super().__init__(None, debug, fingerprinter=fingerprinter)
+        self.cache_size = cache_size
+        self.commit_interval = commit_interval
+        self._cache: OrderedDict[bytes, None] = OrderedDict()
+        self._uncommitted = 0
+        self.path = path
+        self.db = sqlite3.connect(Path(path, "seen.sqlite3") if path else ":memory:")
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS seen (fingerprint BLOB PRIMARY KEY) WITHOUT ROWID"
+        )
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(
+            job_dir(crawler.settings),
+            crawler.settings.getbool("DUPEFILTER_DEBUG"),
+            fingerprinter=crawler.request_fingerprinter,
+            cache_size=crawler.settings.getint("DUPEFILTER_CACHE_SIZE", 100_000),
+        )
+
+    def request_seen(self, request):
+        fingerprint = self.fingerprinter.fingerprint(request)
+        if fingerprint in self._cache:
+            self._cache.move_to_end(fingerprint)
+            return True
+
+        self._remember(fingerprint)
+        cursor = self.db.execute(
+            "INSERT OR IGNORE INTO seen (fingerprint) VALUES (?)", (fingerprint,)
+        )
+        if cursor.rowcount == 0:
+            return True
+
+        self._uncommitted += 1
+        if self._uncommitted >= self.commit_interval:
+            self.db.commit()
+            self._uncommitted = 0
+        return False
+
+    def close(self, reason):
+        if reason in COMPLETED_FINISH_REASONS:
+            self.db.execute("DELETE FROM seen")
+            # The scheduler has written its pending requests just before
+            # closing the dupefilter.
+            if self.path:
+                shutil.rmtree(Path(self.path, "requests.queue"), ignore_errors=True)
+        self.db.commit()
+        self.db.close()
+
+    def _remember(self, fingerprint: bytes) -> None:
+        self._cache[fingerprint] = None
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
@@ -0,0 +1,408 @@
+# Define here the extensions for your crawler
+#
+# See documentation in:
+# https://docs.scrapy.org/en/latest/topics/extensions.html
+
+import logging
+import time
+from pathlib import Path
+
+from protego import Protego
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from scrapy.utils.asyncio import call_later
+from scrapy.utils.defer import deferred_from_coro
+
+from kurdish_scrapy import feeds, finish_reasons, instrumentation, profiler, state_files
+
+
+logger = logging.getLogger(__name__)
+
+
+class AdaptiveThrottle:
+    """Learn a download delay and concurrency per domain.
+
+    Like AutoThrottle, the delay follows `latency / target concurrency`, but
+    it also backs off on 429/503 responses (honouring `Retry-After`) and on a
+    rising error rate, never goes below the robots.txt `Crawl-delay`, and
+    concurrency grows while a domain stays healthy. Learned rates are saved
+    to `ADAPTIVE_THROTTLE_STATE_PATH` and used as the starting point of the
+    next run.
+    """
+
+    BACKOFF_STATUSES = {429, 503}
+    ERROR_RATE_ALPHA = 0.2
+    ERROR_RATE_BACKOFF = 0.25
+
+    def __init__(self, crawler):
+        settings = crawler.settings
+        if not settings.getbool("ADAPTIVE_THROTTLE_ENABLED"):
+            raise NotConfigured
+
+        self.crawler = crawler
+        self.min_delay = settings.getfloat("ADAPTIVE_THROTTLE_MIN_DELAY")
+        self.max_delay = settings.getfloat("ADAPTIVE_THROTTLE_MAX_DELAY")
+        self.max_concurrency = settings.getint("ADAPTIVE_THROTTLE_MAX_CONCURRENCY")
+        self.target_concurrency = settings.getfloat(
+            "ADAPTIVE_THROTTLE_TARGET_CONCURRENCY"
+        )
+        self.state_path = settings.get("ADAPTIVE_THROTTLE_STATE_PATH")
+        # Rates saved by earlier runs, read-only: other crawlers may update
+        # the file before this one closes.
+        self.saved_domains: dict[str, dict] = self._load_state()
+        # Domains this crawler has seen a response from
+        self.domains: dict[str, dict] = {}
+
+        crawler.signals.connect(
+            self._response_downloaded, signal=signals.response_downloaded
+        )
+        crawler.signals.connect(
+            self._request_left_downloader, signal=signals.request_left_downloader
+        )
+        crawler.signals.connect(self._spider_closed, signal=signals.spider_closed)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler)
+
+    def _response_downloaded(self, response, request, spider):
+        key, slot = self._get_slot(request)
+        if slot is None:
+            return
+        state = self._get_domain_state(key, slot)
+
+        if response.url.endswith("/robots.txt") and response.status == 200:
+            crawl_delay = Protego.parse(response.text).crawl_delay("*")
+            state["crawl_delay"] = float(crawl_delay) if crawl_delay else 0.0
+
+        is_error = response.status >= 500 or response.status in self.BACKOFF_STATUSES
+        self._update_error_rate(state, is_error)
+        if response.status in self.BACKOFF_STATUSES:
+            retry_after = self._retry_after(response)
+            self._back_off(state, minimum=retry_after)
+            self.crawler.stats.inc_value(f"adaptive_throttle/backoff/{response.status}")
+        elif state["error_rate"] > self.ERROR_RATE_BACKOFF:
+            self._back_off(state)
+        else:
+            latency = request.meta.get("download_latency")
+            if latency is not None:
+                self._speed_up(state, latency)
+
+        self._apply(state, slot)
+
+    def _request_left_downloader(self, request, spider):
+        # Download errors (timeouts, refused connections) never set a latency.
+        if "download_latency" in request.meta:
+            return
+        key, slot = self._get_slot(request)
+        if slot is None:
+            return
+        state = self._get_domain_state(key, slot)
+        self._update_error_rate(state, True)
+        if state["error_rate"] > self.ERROR_RATE_BACKOFF:
+            self._back_off(state)
+            self._apply(state, slot)
+
+    def _spider_closed(self, spider, reason):
+        if not self.state_path:
+            return
+        # Merge with the file so crawlers sharing it keep each other's
+        # domains; only domains this crawler observed are written.
+        def merge(stored: dict) -> dict:
+            for key, state in self.domains.items():
+                stored[key] = {
+                    "delay": round(state["delay"], 3),
+                    "concurrency": state["concurrency"],
+                    "crawl_delay": state["crawl_delay"],
+                }
+            return stored
+
+        state_files.update_json(
+            self.state_path, merge, default={}, indent=2, sort_keys=True
+        )
+
+    def _get_slot(self, request):
+        key = request.meta.get("download_slot")
+        if key is None:
+            return None, None
+        return key, self.crawler.engine.downloader.slots.get(key)
+
+    def _get_domain_state(self, key, slot) -> dict:
+        state = self.domains.get(key)
+        if state is None:
+            # First response from the domain: start from the rates of an
+            # earlier run, or from the slot's defaults.
+            saved = self.saved_domains.get(key) or {
+                "delay": slot.delay,
+                "concurrency": slot.concurrency,
+                "crawl_delay": 0.0,
+            }
+            state = self.domains[key] = {**saved, "error_rate": 0.0}
+            self._apply(state, slot)
+        return state
+
+    def _update_error_rate(self, state, is_error):
+        state["error_rate"] = (1 - self.ERROR_RATE_ALPHA) * state[
+            "error_rate"
+        ] + self.ERROR_RATE_ALPHA * float(is_error)
+
+    def _back_off(self, state, minimum=0.0):
+        state["delay"] = max(state["delay"] * 2, self.min_delay, minimum)
+        state["concurrency"] = 1
+
+    def _speed_up(self, state, latency):
+        target_delay = latency / self.target_concurrency
+        # Lower the delay gradually, raise it right away.
+        if target_delay < state["delay"]:
+            state["delay"] = max(target_delay, state["delay"] * 0.9)
+        else:
+            state["delay"] = (state["delay"] + target_delay) / 2
+        if state["error_rate"] < self.ERROR_RATE_BACKOFF / 2:
+            state["concurrency"] = min(state["concurrency"] + 1, self.max_concurrency)
+
+    def _apply(self, state, slot):
+        floor = max(self.min_delay, state["crawl_delay"])
+        state["delay"] = min(max(state["delay"], floor), self.max_delay)
+        slot.delay = state["delay"]
+        slot.concurrency = state["concurrency"]
+
+    @staticmethod
+    def _retry_after(response) -> float:
+        value = response.headers.get(b"Retry-After")
+        try:
+            return float(value) if value else 0.0
+        except ValueError:
+            # HTTP-date form; fall back to plain exponential backoff
+            return 0.0
+
+    def _load_state(self) -> dict:
+        if not self.state_path:
+            return {}
+        return state_files.read_json(Path(self.state_path), {})
+
+
+class CrawlBudget:
+    """Close a domain's spider when it runs out of budget or stops yielding.
+
+    Budgets cap the pages, response bytes and wall time spent on one domain.
+    The yield rule looks at HTML pages in blocks of `CRAWL_YIELD_WINDOW` and
+    closes the spider when the share that produced an accepted item (one that
+    made it through every pipeline) falls below `CRAWL_YIELD_MIN_RATIO`. The
+    reason is recorded in the `crawl_budget/stop_reason` stat and used as the
+    spider's finish reason.
+    """
+
+    REASON_PAGES = finish_reasons.BUDGET_PAGES
+    REASON_BYTES = finish_reasons.BUDGET_BYTES
+    REASON_TIME = finish_reasons.BUDGET_TIME
+    REASON_LOW_YIELD = finish_reasons.LOW_YIELD
+    REASONS = finish_reasons.BUDGET_REASONS
+
+    def __init__(self, crawler):
+        settings = crawler.settings
+        self.crawler = crawler
+        self.max_pages = settings.getint("CRAWL_BUDGET_MAX_PAGES")
+        self.max_bytes = settings.getint("CRAWL_BUDGET_MAX_BYTES")
+        self.max_seconds = settings.getfloat("CRAWL_BUDGET_MAX_SECONDS")
+        self.yield_window = settings.getint("CRAWL_YIELD_WINDOW")
+        self.yield_min_ratio = settings.getfloat("CRAWL_YIELD_MIN_RATIO")
+        # A window or ratio of 0 disables the yield rule; a 0 window must not
+        # judge the yield after every single page
+        self.yield_enabled = self.yield_window > 0 and self.yield_min_ratio > 0
+        if not (self.max_pages or self.max_bytes or self.max_seconds or self.yield_enabled):
+            raise NotConfigured
+
+        self.pages = 0
+        self.bytes = 0
+        self.window_pages = 0
+        self.window_items = 0
+        self.stop_reason = None
+        self.timer = None
+
+        crawler.signals.connect(self._spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(self._response_received, signal=signals.response_received)
+        crawler.signals.connect(self._item_scraped, signal=signals.item_scraped)
+        crawler.signals.connect(self._spider_closed, signal=signals.spider_closed)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler)
+
+    def _spider_opened(self, spider):
+        self.started = time.monotonic()
+        if self.max_seconds:
+            self.timer = call_later(self.max_seconds, self._stop, self.REASON_TIME)
+
+    def _response_received(self, response, request, spider):
+        self.pages += 1
+        self.bytes += len(response.body)
+        if self.max_pages and self.pages >= self.max_pages:
+            self._stop(self.REASON_PAGES)
+        elif self.max_bytes and self.bytes >= self.max_bytes:
+            self._stop(self.REASON_BYTES)
+
+        # Sitemaps, robots.txt and feeds never produce items themselves.
+        content_type = response.headers.get(b"Content-Type", b"")
+        if b"html" in content_type.lower():
+            self.window_pages += 1
+            if self.yield_enabled and self.window_pages >= self.yield_window:
+                self._check_yield()
+
+    def _item_scraped(self, item, response, spider):
+        self.window_items += 1
+
+    def _check_yield(self):
+        ratio = self.window_items / self.window_pages
+        self.crawler.stats.set_value("crawl_budget/last_yield_ratio", round(ratio, 4))
+        self.window_pages = 0
+        self.window_items = 0
+        if ratio < self.yield_min_ratio:
+            logger.info(
+                "Yield of %.3f items per page is below %.3f, closing spider",
+                ratio,
+                self.yield_min_ratio,
+            )
+            self._stop(self.REASON_LOW_YIELD)
+
+    def _stop(self, reason):
+        if self.stop_reason is not None:
+            return
+        self.stop_reason = reason
+        self.crawler.stats.set_value("crawl_budget/stop_reason", reason)
+        deferred_from_coro(
+            self.crawler.engine.close_spider_async(reason=reason)
+        ).addErrback(
+            lambda failure: logger.error(
+                "Closing spider (%s) failed: %s", reason, failure.getErrorMessage()
+            )
+        )
+
+    def _spider_closed(self, spider, reason):
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        stats = self.crawler.stats
+        stats.set_value("crawl_budget/pages", self.pages)
+        stats.set_value("crawl_budget/bytes", self.bytes)
+        stats.set_value(
+            "crawl_budget/seconds", round(time.monotonic() - self.started, 1)
+        )
+
+
+class StreamingFeedExport:
+    """Write scraped items to the outputs in `STREAMING_FEEDS`.
+
+    `STREAMING_FEEDS` maps output paths to writer options, like `FEEDS`, for
+    formats Scrapy's feed exports can't stream (see `kurdish_scrapy.feeds`).
+    Crawlers of one process writing to the same path share one writer, which
+    is closed when the reactor shuts down rather than when a spider closes.
+    """
+
+    def __init__(self, crawler):
+        self.feeds = crawler.settings.getdict("STREAMING_FEEDS")
+        if not self.feeds:
+            raise NotConfigured
+
+        # Opened right away so that a missing optional dependency fails the
+        # crawl before it starts.
+        self.writers = [
+            feeds.open_writer(path, options) for path, options in self.feeds.items()
+        ]
+        crawler.signals.connect(self._item_scraped, signal=signals.item_scraped)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler)
+
+    def _item_scraped(self, item, spider):
+        for writer in self.writers:
+            writer.write(item)
+
+
+class Instrumentation:
+    """Collect per-stage timings and per-domain counters (see
+    `kurdish_scrapy.instrumentation`).
+
+    Download latencies, responses and scraped items are recorded here; the
+    spiders and pipelines time their own stages. When the spider closes its
+    domain's metrics are copied into the crawler stats under
+    `instrumentation/`. With `INSTRUMENTATION_DUMP_PATH` set, the metrics of
+    every domain in the process are written there in the Prometheus text
+    format every `INSTRUMENTATION_DUMP_INTERVAL` seconds.
+    """
+
+    def __init__(self, crawler):
+        settings = crawler.settings
+        if not settings.getbool("INSTRUMENTATION_ENABLED"):
+            raise NotConfigured
+
+        self.crawler = crawler
+        self.metrics = instrumentation.enable()
+        self.dump_path = settings.get("INSTRUMENTATION_DUMP_PATH")
+        self.dump_interval = settings.getfloat("INSTRUMENTATION_DUMP_INTERVAL")
+        self.domain = ""
+
+        crawler.signals.connect(self._spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(self._response_received, signal=signals.response_received)
+        crawler.signals.connect(self._item_scraped, signal=signals.item_scraped)
+        crawler.signals.connect(self._spider_closed, signal=signals.spider_closed)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler)
+
+    def _spider_opened(self, spider):
+        self.domain = instrumentation.spider_domain(spider)
+        if self.dump_path:
+            instrumentation.open_dump(self.dump_path, self.dump_interval)
+
+    def _response_received(self, response, request, spider):
+        self.metrics.count(instrumentation.COUNTER_PAGES, self.domain)
+        latency = request.meta.get("download_latency")
+        if latency is not None:
+            self.metrics.observe(instrumentation.STAGE_DOWNLOAD, self.domain, latency)
+
+    def _item_scraped(self, item, spider):
+        self.metrics.count(instrumentation.COUNTER_ITEMS_SCRAPED, self.domain)
+
+    def _spider_closed(self, spider):
+        for key, value in self.metrics.domain_stats(self.domain).items():
+            self.crawler.stats.set_value(key, value)
+        if self.dump_path:
+            instrumentation.close_dump(self.dump_path)
+
+
+class Profiler:
+    """Sample the stacks of the crawler process and its extraction pool workers.
+
+    See `kurdish_scrapy.profiler`.
+
+    With `PROFILER_ENABLED` the first spider of the process starts a window
+    of `PROFILER_DURATION` seconds. At any time, `PROFILER_SIGNAL` starts a
+    window of the same length, or ends a running one early. Each window is
+    written to `PROFILER_OUTPUT_DIR` as a folded-stack file.
+    """
+
+    def __init__(self, crawler):
+        settings = crawler.settings
+        self.enabled = settings.getbool("PROFILER_ENABLED")
+        signal_name = settings.get("PROFILER_SIGNAL")
+        if not self.enabled and not signal_name:
+            raise NotConfigured
+
+        self.duration = settings.getfloat("PROFILER_DURATION")
+        self.profiler = profiler.install(
+            settings.get("PROFILER_OUTPUT_DIR") or "logs",
+            settings.getfloat("PROFILER_INTERVAL"),
+            self.duration,
+            signal_name,
+        )
+        crawler.signals.connect(self._spider_opened, signal=signals.spider_opened)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler)
+
+    def _spider_opened(self, spider):
+        if self.enabled and not self.profiler.windows:
+            self.profiler.start(self.duration)
@@ -0,0 +1,226 @@
+"""Streaming feed writers shared by every crawler of a process.
+
+Scrapy's feed exports give each crawler its own exporter, and they all
+append to the same file. That works for line-based formats but not for
+formats with a footer such as Parquet or for rotated, compressed shards.
+The writers here are opened once per output path and process, shared by
+the crawlers through `open_writer` and closed when the reactor shuts down.
+They outlive any one crawler: a queue worker whose crawlers all finish
+before it claims the next domain keeps writing to the same file.
+"""
+
+import gzip
+import os
+import re
+from pathlib import Path
+
+from scrapy.utils.serialize import ScrapyJSONEncoder
+
+
+_writers: dict = {}  # by output path
+
+
+def free_path(path: str) -> str:
+    """`path`, or `out-1.parquet`, `out-2.parquet`... if it is already taken.
+
+    Earlier output is never overwritten, so a restarted shard keeps the items
+    of the domains it finished before. A name whose `.tmp` file exists is
+    taken too: another process may still be writing it.
+    """
+    file_path = Path(path)
+    candidate, number = file_path, 0
+    while candidate.exists() or candidate.with_name(candidate.name + ".tmp").exists():
+        number += 1
+        candidate = file_path.with_name(f"{file_path.stem}-{number}{file_path.suffix}")
+    return str(candidate)
+
+
+class ParquetFeedWriter:
+    """Write items to Parquet one bounded row group at a time.
+
+    At most `row_group_size` items are buffered, so memory stays flat however
+    long the crawl runs. `publisher`, `lang` and `source_type` are dictionary
+    encoded and `text` is compressed with `compression`. The file is written
+    under a `.tmp` name and renamed once its footer is complete.
+    """
+
+    DICTIONARY_COLUMNS = ["publisher", "lang", "source_type"]
+
+    def __init__(self, path: str, row_group_size: int = 2000, compression: str = "zstd"):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError as e:
+            raise RuntimeError(
+                "Parquet output needs pyarrow: pipenv install pyarrow"
+            ) from e
+
+        self._pa = pa
+        self.schema = pa.schema(
+            [
+                ("text", pa.string()),
+                ("title", pa.string()),
+                ("url", pa.string()),
+                ("publisher", pa.string()),
+                ("word_count", pa.int64()),
+                ("lang", pa.string()),
+                ("lang_score", pa.float64()),
+                ("source_type", pa.string()),
+            ]
+        )
+        self.row_group_size = row_group_size
+        self.path = free_path(path)
+        self.tmp_path = self.path + ".tmp"
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self._rows: list[dict] = []
+        self._writer = pq.ParquetWriter(
+            self.tmp_path,
+            self.schema,
+            use_dictionary=self.DICTIONARY_COLUMNS,
+            compression={
+                name: compression if name == "text" else "snappy"
+                for name in self.schema.names
+            },
+        )
+
+    def write(self, item) -> None:
+        self._rows.append({name: item.get(name) for name in self.schema.names})
+        if len(self._rows) >= self.row_group_size:
+            self._flush()
+
+    def close(self) -> None:
+        self._flush()
+        self._writer.close()
+        os.replace(self.tmp_path, self.path)
+
+    def _flush(self) -> None:
+        if not self._rows:
+            return
+        table = self._pa.Table.from_pylist(self._rows, schema=self.schema)
+        self._writer.write_table(table)
+        self._rows = []
+
+
+class JsonLinesShardWriter:
+    """Write items as compressed JSON lines into size- or count-rotated shards.
+
+    `out.jsonl.gz` becomes `out.part-00000.jsonl.gz`, `out.part-00001.jsonl.gz`
+    and so on; numbering continues after the parts already on disk. A shard
+    is written under a `.tmp` name and renamed once it holds `max_items`
+    items or `max_bytes` compressed bytes, or the crawl ends, so consumers
+    can read every finished shard while the crawl goes on. The compression
+    (`.gz` or `.zst`, the latter needing `zstandard`) follows the extension;
+    gzip uses `gzip_level`, as level 9 costs much more CPU for little gain.
+    """
+
+    def __init__(
+        self, path: str, max_bytes: int = 0, max_items: int = 0, gzip_level: int = 6
+    ):
+        file_path = Path(path)
+        self.directory = file_path.parent
+        # "out.shard-00.jsonl.gz" -> "out.shard-00" and "jsonl.gz"
+        self.extension = "".join(file_path.suffixes[-2:])[1:]
+        self.stem = file_path.name[: -len(self.extension) - 1]
+        self.compression = file_path.suffix[1:].lower()
+        if self.compression == "zst":
+            try:
+                import zstandard
+            except ImportError as e:
+                raise RuntimeError(
+                    ".zst output needs zstandard: pipenv install zstandard"
+                ) from e
+            self._zstd_compressor = zstandard.ZstdCompressor()
+        elif self.compression != "gz":
+            raise ValueError(f"Unsupported shard compression '.{self.compression}'")
+
+        self.max_bytes = max_bytes
+        self.max_items = max_items
+        self.gzip_level = gzip_level
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._encoder = ScrapyJSONEncoder(ensure_ascii=False)
+        self._index = self._next_index()
+        self._raw = None
+        self._stream = None
+        self._items = 0
+
+    def write(self, item) -> None:
+        if self._stream is None:
+            self._open_shard()
+        line = self._encoder.encode(dict(item)) + "\n"
+        self._stream.write(line.encode("utf-8"))
+        self._items += 1
+        if (self.max_items and self._items >= self.max_items) or (
+            self.max_bytes and self._raw.tell() >= self.max_bytes
+        ):
+            self._finish_shard()
+
+    def close(self) -> None:
+        if self._stream is not None:
+            self._finish_shard()
+
+    def _shard_path(self, index: int) -> Path:
+        return self.directory / f"{self.stem}.part-{index:05d}.{self.extension}"
+
+    def _next_index(self) -> int:
+        # Unfinished `.tmp` parts count too: another process may be writing them
+        part_regex = re.compile(
+            rf"{re.escape(self.stem)}\.part-(\d+)\.{re.escape(self.extension)}"
+            r"(?:\.tmp)?$"
+        )
+        indexes = [
+            int(match.group(1))
+            for name in os.listdir(self.directory)
+            if (match := part_regex.match(name))
+        ]
+        return max(indexes, default=-1) + 1
+
+    def _open_shard(self) -> None:
+        self._tmp_path = Path(str(self._shard_path(self._index)) + ".tmp")
+        self._raw = open(self._tmp_path, "wb")
+        if self.compression == "zst":
+            self._stream = self._zstd_compressor.stream_writer(self._raw, closefd=False)
+        else:
+            self._stream = gzip.GzipFile(
+                fileobj=self._raw, mode="wb", compresslevel=self.gzip_level
+            )
+        self._items = 0
+
+    def _finish_shard(self) -> None:
+        self._stream.close()
+        self._raw.close()
+        os.replace(self._tmp_path, self._shard_path(self._index))
+        self._index += 1
+        self._raw = self._stream = None
+
+
+WRITER_CLASSES = {
+    "parquet": ParquetFeedWriter,
+    "jsonlines_shards": JsonLinesShardWriter,
+}
+
+
+def open_writer(path: str, options: dict):
+    """Return the process's writer for `path`, creating it on first use.
+
+    Writers stay open until `close_writers`, which the first call schedules
+    for reactor shutdown.
+    """
+    writer = _writers.get(path)
+    if writer is not None:
+        return writer
+
+    if not _writers:
+        from twisted.internet import reactor
+
+        reactor.addSystemEventTrigger("before", "shutdown", close_writers)
+    writer_options = dict(options)
+    writer_class = WRITER_CLASSES[writer_options.pop("format")]
+    writer = _writers[path] = writer_class(path, **writer_options)
+    return writer
+
+
+def close_writers() -> None:
+    """Close every writer of the process, completing its files."""
+    while _writers:
+        _, writer = _writers.popitem()
+        writer.close()
@@ -0,0 +1,13 @@
+"""Spider finish reasons shared by the extensions, dupefilter and runner."""
+
+FINISHED = "finished"
+
+# Set by CrawlBudget when a domain runs out of budget or stops yielding
+BUDGET_PAGES = "budget_pages"
+BUDGET_BYTES = "budget_bytes"
+BUDGET_TIME = "budget_time"
+LOW_YIELD = "low_yield"
+BUDGET_REASONS = frozenset({BUDGET_PAGES, BUDGET_BYTES, BUDGET_TIME, LOW_YIELD})
+
+# A domain stopped by its crawl budget is done for this run, like a finished one
+COMPLETED_FINISH_REASONS = frozenset({FINISHED}) | BUDGET_REASONS
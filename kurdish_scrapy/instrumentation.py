@@ -0,0 +1,268 @@
+"""Latency histograms per crawl stage and counters per domain.
+
+Spiders, extractors and pipelines time their work with `timed()` and count
+events with `count()`. Both are no-ops until the `Instrumentation`
+extension calls `enable()`, so code outside a crawl (bencmark.py, worker
+processes) pays nothing. Metrics are kept once per process, labelled with
+the domain, because many crawlers share a process. Each crawler copies its
+own domain into its Scrapy stats, and `open_dump` periodically writes all
+of them in the Prometheus text format.
+"""
+
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional
+from urllib.parse import urlsplit
+
+from scrapy.utils.asyncio import create_looping_call
+
+from kurdish_scrapy.shared import SharedRegistry
+
+
+STAGE_DOWNLOAD = "download"
+STAGE_PREFILTER = "prefilter"
+STAGE_EXTRACT = "extract"
+# Wait for an extraction pool slot plus moving the page and result between processes
+STAGE_EXTRACT_WAIT = "extract_wait"
+STAGE_URL_EXTRACT = "url_extract"
+STAGE_LANG_ID = "lang_id"
+STAGE_DEDUP = "dedup"
+
+COUNTER_PAGES = "pages"
+COUNTER_ITEMS_SCRAPED = "items_scraped"
+COUNTER_ITEMS_DROPPED = "items_dropped"
+COUNTER_PREFILTER_SKIPPED = "prefilter_skipped"
+COUNTER_EXTRACTION_EMPTY = "extraction_empty"
+
+COUNTER_HELP = {
+    COUNTER_PAGES: "Responses received",
+    COUNTER_ITEMS_SCRAPED: "Items that passed every pipeline",
+    COUNTER_ITEMS_DROPPED: "Items dropped by a pipeline",
+    COUNTER_PREFILTER_SKIPPED: "Pages skipped before extraction",
+    COUNTER_EXTRACTION_EMPTY: "Pages the extractor found no article in",
+}
+
+# Upper bounds in seconds, from a cached fastText call to a slow download
+BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+METRIC_PREFIX = "kurdish_scrapy"
+# Domain label of work done for several domains at once
+ALL_DOMAINS = "*"
+
+_metrics: Optional["Metrics"] = None
+# Thread id -> (stage, domain) being timed on that thread
+_stages: dict[int, tuple[str, str]] = {}
+_dumps: SharedRegistry = SharedRegistry()  # dump path -> looping call
+
+
+class Histogram:
+    """Observation counts per `BUCKETS` bound, plus an overflow bucket."""
+
+    __slots__ = ("counts", "total", "count", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.total = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, seconds: float) -> None:
+        self.counts[bisect_left(BUCKETS, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+        if seconds > self.max:
+            self.max = seconds
+
+    def quantile(self, q: float) -> float:
+        """Estimate the `q` quantile by interpolating inside its bucket."""
+        rank = q * self.count
+        seen = 0
+        for index, bucket_count in enumerate(self.counts[:-1]):
+            if bucket_count and seen + bucket_count >= rank:
+                lower = BUCKETS[index - 1] if index else 0.0
+                estimate = lower + (BUCKETS[index] - lower) * (rank - seen) / bucket_count
+                return min(estimate, self.max)
+            seen += bucket_count
+        return self.max
+
+
+class Metrics:
+    def __init__(self):
+        self.histograms: dict[tuple[str, str], Histogram] = {}
+        self.counters: dict[tuple[str, str, str], int] = {}
+
+    def observe(self, stage: str, domain: str, seconds: float) -> None:
+        histogram = self.histograms.get((stage, domain))
+        if histogram is None:
+            histogram = self.histograms[stage, domain] = Histogram()
+        histogram.observe(seconds)
+
+    def count(self, name: str, domain: str, reason: str = "", amount: int = 1) -> None:
+        key = (name, domain, reason)
+        self.counters[key] = self.counters.get(key, 0) + amount
+
+    def domain_stats(self, domain: str) -> dict:
+        """Scrapy stats of one domain: stage timings in ms and the counters."""
+        stats = {}
+        for (stage, stage_domain), histogram in self.histograms.items():
+            if stage_domain != domain:
+                continue
+            prefix = f"instrumentation/{stage}"
+            stats[f"{prefix}/count"] = histogram.count
+            stats[f"{prefix}/total_ms"] = round(histogram.total * 1000)
+            stats[f"{prefix}/p50_ms"] = round(histogram.quantile(0.5) * 1000, 1)
+            stats[f"{prefix}/p95_ms"] = round(histogram.quantile(0.95) * 1000, 1)
+            stats[f"{prefix}/max_ms"] = round(histogram.max * 1000, 1)
+        for (name, counter_domain, reason), value in self.counters.items():
+            if counter_domain == domain:
+                key = f"instrumentation/{name}/{reason}" if reason else f"instrumentation/{name}"
+                stats[key] = value
+        return stats
+
+    def prometheus_text(self) -> str:
+        name = f"{METRIC_PREFIX}_stage_seconds"
+        lines = [
+            f"# HELP {name} Time spent in each crawl stage",
+            f"# TYPE {name} histogram",
+        ]
+        for (stage, domain), histogram in sorted(self.histograms.items()):
+            labels = f'stage="{_escape(stage)}",domain="{_escape(domain)}"'
+            cumulative = 0
+            for bound, bucket_count in zip(BUCKETS, histogram.counts):
+                cumulative += bucket_count
+                lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+            lines.append(f"{name}_sum{{{labels}}} {histogram.total:.6f}")
+            lines.append(f"{name}_count{{{labels}}} {histogram.count}")
+
+        for counter, help_text in COUNTER_HELP.items():
+            name = f"{METRIC_PREFIX}_{counter}_total"
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} counter")
+            for (counter_name, domain, reason), value in sorted(self.counters.items()):
+                if counter_name != counter:
+                    continue
+                labels = f'domain="{_escape(domain)}"'
+                if reason:
+                    labels += f',reason="{_escape(reason)}"'
+                lines.append(f"{name}{{{labels}}} {value}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path: str) -> None:
+        file_path = Path(path)
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        # Scrapers must never read a half-written file.
+        tmp_path = file_path.with_name(file_path.name + ".tmp")
+        tmp_path.write_text(self.prometheus_text(), encoding="utf-8")
+        os.replace(tmp_path, file_path)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def enable() -> Metrics:
+    """Start collecting metrics in this process and return the registry."""
+    global _metrics
+    if _metrics is None:
+        _metrics = Metrics()
+    return _metrics
+
+
+def get_metrics() -> Optional[Metrics]:
+    return _metrics
+
+
+@contextmanager
+def in_stage(stage: str, domain: str):
+    """Label the block as `stage` of `domain` without timing it.
+
+    While the block runs, `current_stage()` for this thread returns the stage
+    and domain, also in processes that collect no metrics, such as the
+    extraction pool workers. The block must not await: another coroutine
+    would run under the same stage.
+    """
+    thread_id = threading.get_ident()
+    previous = _stages.get(thread_id)
+    _stages[thread_id] = (stage, domain)
+    try:
+        yield
+    finally:
+        if previous is None:
+            del _stages[thread_id]
+        else:
+            _stages[thread_id] = previous
+
+
+@contextmanager
+def timed(stage: str, domain: str):
+    """Time the block as `stage` of `domain`, labelling it like `in_stage`."""
+    with in_stage(stage, domain):
+        if _metrics is None:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            _metrics.observe(stage, domain, time.perf_counter() - start)
+
+
+def observe(stage: str, domain: str, seconds: float) -> None:
+    """Record a duration measured elsewhere, e.g. across an await."""
+    if _metrics is not None:
+        _metrics.observe(stage, domain, seconds)
+
+
+def count(name: str, domain: str, reason: str = "", amount: int = 1) -> None:
+    if _metrics is not None:
+        _metrics.count(name, domain, reason, amount)
+
+
+def current_stage(thread_id: Optional[int] = None) -> Optional[tuple[str, str]]:
+    """`(stage, domain)` being timed on a thread (default: the calling one)."""
+    return _stages.get(threading.get_ident() if thread_id is None else thread_id)
+
+
+def url_domain(url: str) -> str:
+    """Domain label of a URL: its host without `www.`."""
+    return (urlsplit(url).hostname or "").lower().removeprefix("www.")
+
+
+def spider_domain(spider) -> str:
+    """Domain label of a spider: its allowed domain or its sitemaps' host."""
+    domains = getattr(spider, "allowed_domains", None)
+    if domains:
+        return domains[0].removeprefix("www.")
+    for url in getattr(spider, "sitemap_urls", None) or []:
+        return url_domain(url)
+    return spider.name
+
+
+def open_dump(path: str, interval: float) -> None:
+    """Write the metrics to `path` every `interval` seconds.
+
+    Crawlers of one process asking for the same path share one timer.
+    """
+
+    def start():
+        looping_call = create_looping_call(enable().write_prometheus, path)
+        looping_call.start(interval, now=False)
+        return looping_call
+
+    _dumps.acquire(path, start)
+
+
+def close_dump(path: str) -> None:
+    """Release `path`; the last crawler to release it writes a final dump."""
+    looping_call = _dumps.release(path)
+    if looping_call is not None:
+        if looping_call.running:
+            looping_call.stop()
+        _metrics.write_prometheus(path)
@@ -1,9 +1,36 @@
-import fasttext
-from huggingface_hub import hf_hub_download
+from functools import lru_cache
 
+from kurdish_scrapy.settings import FASTTEXT_MODEL_PATH, FASTTEXT_OFFLINE
 
-model_path = hf_hub_download(
-    repo_id="facebook/fasttext-language-identification", filename="model.bin"
-)
 
-language_model = fasttext.load_model(model_path)
+MODEL_REPO_ID = "facebook/fasttext-language-identification"
+MODEL_FILENAME = "model.bin"
+
+
+@lru_cache(maxsize=None)
+def get_language_model():
+    # Loaded on first use so importing the project (worker processes,
+    # bencmark.py) does not pay for the download and the model's memory.
+    # Processes forked after the first call share the loaded pages
+    # copy-on-write instead of loading their own copy.
+    import fasttext
+
+    return fasttext.load_model(get_model_path())
+
+
+def get_model_path() -> str:
+    if FASTTEXT_MODEL_PATH:
+        return FASTTEXT_MODEL_PATH
+
+    from huggingface_hub import hf_hub_download
+    from huggingface_hub.utils import LocalEntryNotFoundError
+
+    # Prefer the local Hugging Face cache so warm starts never hit the network.
+    try:
+        return hf_hub_download(
+            repo_id=MODEL_REPO_ID, filename=MODEL_FILENAME, local_files_only=True
+        )
+    except LocalEntryNotFoundError:
+        if FASTTEXT_OFFLINE:
+            raise
+    return hf_hub_download(repo_id=MODEL_REPO_ID, filename=MODEL_FILENAME)
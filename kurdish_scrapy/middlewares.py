@@ -3,12 +3,16 @@
 # See documentation in:
 # https://docs.scrapy.org/en/latest/topics/spider-middleware.html
 
-from scrapy import signals
+from collections import OrderedDict
+from scrapy import Request, signals
 import requests
 from urllib.parse import urlencode
 from random import randint
-from scrapy.exceptions import IgnoreRequest
+from scrapy.exceptions import IgnoreRequest, NotConfigured
+from extractor.url_canonicalizer import UrlCanonicalizer, canonical_link
 from extractor.url_extractor import UrlExtractor
+from kurdish_scrapy.crawl_ledger import KIND_ARTICLE
+from kurdish_scrapy.user_agents import get_user_agent_pool
 
 
 class SorjinBaseManualDataCollectorSpiderMiddleware:
@@ -106,50 +110,17 @@ class ScrapeOpsFakeUserAgentMiddleware:
 
     @classmethod
     def from_crawler(cls, crawler):
+        if not crawler.settings.getbool("SCRAPEOPS_FAKE_USER_AGENT_ENABLED"):
+            raise NotConfigured
         return cls(crawler.settings)
 
     def __init__(self, settings):
-        self.scrapeops_api_key = settings.get("SCRAPEOPS_API_KEY")
-        self.scrapeops_endpoint = settings.get(
-            "SCRAPEOPS_FAKE_USER_AGENT_ENDPOINT",
-            "http://headers.scrapeops.io/v1/user-agents?",
-        )
-        self.scrapeops_fake_user_agents_active = settings.get(
-            "SCRAPEOPS_FAKE_USER_AGENT_ENABLED", False
-        )
-        self.scrapeops_num_results = settings.get("SCRAPEOPS_NUM_RESULTS")
-        self.headers_list = []
-        self._get_user_agents_list()
-        self._scrapeops_fake_user_agents_enabled()
-
-    def _get_user_agents_list(self):
-        payload = {"api_key": self.scrapeops_api_key}
-        if self.scrapeops_num_results is not None:
-            payload["num_results"] = self.scrapeops_num_results
-        response = requests.get(self.scrapeops_endpoint, params=urlencode(payload))
-        json_response = response.json()
-        self.user_agents_list = json_response.get("result", [])
-
-    def _get_random_user_agent(self):
-        random_index = randint(0, len(self.user_agents_list) - 1)
-        return self.user_agents_list[random_index]
-
-    def _scrapeops_fake_user_agents_enabled(self):
-        if (
-            self.scrapeops_api_key is None
-            or self.scrapeops_api_key == ""
-            or self.scrapeops_fake_user_agents_active == False
-        ):
-            self.scrapeops_fake_user_agents_active = False
-        else:
-            self.scrapeops_fake_user_agents_active = True
+        # Shared by all crawlers in the process; loading never blocks on the
+        # network and refreshes happen in a background thread.
+        self.user_agent_pool = get_user_agent_pool(settings)
 
     def process_request(self, request, spider):
-        random_user_agent = self._get_random_user_agent()
-        request.headers["User-Agent"] = random_user_agent
-
-        print("************ NEW HEADER ATTACHED *******")
-        print(request.headers["User-Agent"])
+        request.headers["User-Agent"] = self.user_agent_pool.get_random_user_agent()
 
 
 class ScrapeOpsFakeBrowserHeaderAgentMiddleware:
@@ -219,5 +190,144 @@ class ScrapeOpsFakeBrowserHeaderAgentMiddleware:
 class MediaFilterMiddleware:
     def process_request(self, request, spider):
         domain = UrlExtractor.get_domain(request.url)
-        if not UrlExtractor.should_request(request.url, domain):
-            raise IgnoreRequest
+        reason = UrlExtractor.classify(request.url, domain)
+        if reason:
+            spider.crawler.stats.inc_value(f"url_filter/ignored/{reason}")
+            raise IgnoreRequest(f"Filtered URL ({reason}): {request.url}")
+
+
+class LedgerConditionalRequestMiddleware:
+    """Revalidate ledger-recorded articles with conditional requests.
+
+    Requests for URLs the spider's crawl ledger has seen before carry
+    `If-None-Match`/`If-Modified-Since`, and `304 Not Modified` responses are
+    dropped before they reach the spider.
+    """
+
+    def process_request(self, request, spider):
+        ledger = getattr(spider, "crawl_ledger", None)
+        if ledger is None:
+            return None
+
+        # The ledger knows articles by their sitemap URL.
+        entry = ledger.get(request.meta.get("canonicalized_from", request.url))
+        if entry is None or entry.kind != KIND_ARTICLE:
+            return None
+        if entry.etag:
+            request.headers.setdefault("If-None-Match", entry.etag)
+        if entry.last_modified:
+            request.headers.setdefault("If-Modified-Since", entry.last_modified)
+        return None
+
+    def process_response(self, request, response, spider):
+        if response.status == 304 and getattr(spider, "crawl_ledger", None):
+            spider.crawler.stats.inc_value("ledger/not_modified")
+            raise IgnoreRequest(f"Not modified since last crawl: {request.url}")
+        return response
+
+
+class UrlCanonicalizationMiddleware:
+    """Canonicalize the URLs of requests a spider yields.
+
+    Requests are rewritten to the site's canonical URL form before they reach
+    the scheduler and its dupefilter. Responses teach the canonicalizer
+    through their `rel=canonical` link and redirects, and the canonical URLs
+    they reveal are remembered: requests for such an alias are dropped, and a
+    response whose canonical URL was already fetched counts as a duplicate
+    fetch (`canonical/duplicate_fetch`, `canonical/duplicate_fetch_rate`).
+    """
+
+    def __init__(self, crawler):
+        if not crawler.settings.getbool("URL_CANONICALIZATION_ENABLED"):
+            raise NotConfigured
+        self.stats = crawler.stats
+        self.cache_size = crawler.settings.getint("URL_CANONICAL_CACHE_SIZE")
+        self.canonicalizer = None
+        # Canonical URL -> whether it was seen only as an alias of another URL
+        self.fetched: OrderedDict[str, bool] = OrderedDict()
+        crawler.signals.connect(self.spider_closed, signal=signals.spider_closed)
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(crawler)
+
+    def process_spider_input(self, response, spider):
+        canonicalizer = self._get_canonicalizer(spider, response.url)
+        declared = canonical_link(response)
+        originals = response.meta.get("redirect_urls", [])
+        for original in originals:
+            canonicalizer.learn(original, response.url)
+        if declared:
+            canonicalizer.learn(response.url, declared)
+
+        fetched = canonicalizer.canonicalize(response.url)
+        aliases = {canonicalizer.canonicalize(url) for url in originals}
+        if declared:
+            aliases.add(canonicalizer.canonicalize(declared))
+        aliases.discard(fetched)
+
+        self.stats.inc_value("canonical/fetched")
+        if any(url in self.fetched for url in (fetched, *aliases)):
+            self.stats.inc_value("canonical/duplicate_fetch")
+        self._remember(fetched, alias=False)
+        for url in aliases:
+            self._remember(url, alias=True)
+        return None
+
+    def process_spider_output(self, response, result, spider):
+        for item_or_request in result:
+            if isinstance(item_or_request, Request):
+                item_or_request = self._canonicalize_request(item_or_request, spider)
+                if item_or_request is None:
+                    continue
+            yield item_or_request
+
+    async def process_spider_output_async(self, response, result, spider):
+        async for item_or_request in result:
+            if isinstance(item_or_request, Request):
+                item_or_request = self._canonicalize_request(item_or_request, spider)
+                if item_or_request is None:
+                    continue
+            yield item_or_request
+
+    def spider_closed(self, spider):
+        fetched = self.stats.get_value("canonical/fetched", 0)
+        if fetched:
+            duplicates = self.stats.get_value("canonical/duplicate_fetch", 0)
+            self.stats.set_value(
+                "canonical/duplicate_fetch_rate", round(duplicates / fetched, 4)
+            )
+
+    def _canonicalize_request(self, request, spider):
+        canonicalizer = self._get_canonicalizer(spider, request.url)
+        url = canonicalizer.canonicalize(request.url)
+        # Requests for URLs fetched directly are left to the dupefilter.
+        if not request.dont_filter and self.fetched.get(url):
+            self.stats.inc_value("canonical/alias_filtered")
+            return None
+        if url == request.url:
+            return request
+        self.stats.inc_value("canonical/rewritten")
+        return request.replace(
+            url=url,
+            meta={**request.meta, "canonicalized_from": request.url},
+        )
+
+    def _remember(self, url, alias):
+        # A URL fetched directly stays marked as fetched, not as an alias.
+        self.fetched[url] = self.fetched.get(url, True) and alias
+        self.fetched.move_to_end(url)
+        if len(self.fetched) > self.cache_size:
+            self.fetched.popitem(last=False)
+
+    def _get_canonicalizer(self, spider, url):
+        if self.canonicalizer is None:
+            start_urls = getattr(spider, "start_urls", None)
+            # spider.state is saved in JOBDIR, so a resumed crawl keeps the
+            # learned rules.
+            state = getattr(spider, "state", None)
+            rules = state.setdefault("url_canonical_rules", {}) if state is not None else None
+            self.canonicalizer = UrlCanonicalizer(
+                start_urls[0] if start_urls else url, rules
+            )
+        return self.canonicalizer
@@ -0,0 +1,219 @@
+import hashlib
+import re
+import sqlite3
+import time
+import zlib
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+
+from kurdish_scrapy.shared import SharedRegistry
+
+WORD_REGEX = re.compile(r"\w+")
+
+# Largest Mersenne prime below 2**64, the modulus of the permutation hashes
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+
+_indexes: SharedRegistry["NearDuplicateIndex"] = SharedRegistry()  # by index path
+
+
+class MinHasher:
+    """MinHash signatures of word shingles.
+
+    The permutations are drawn from a fixed seed, so signatures computed by
+    different runs and processes can be compared with each other.
+    """
+
+    def __init__(self, num_perm: int = 128, shingle_size: int = 5, seed: int = 1):
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        generator = np.random.RandomState(seed)
+        # a, b < 2**32 and shingle hashes < 2**32 keep a * x + b within uint64
+        self._a = generator.randint(1, 1 << 32, size=num_perm, dtype=np.uint64)
+        self._b = generator.randint(0, 1 << 32, size=num_perm, dtype=np.uint64)
+
+    def signature(self, text: str) -> np.ndarray:
+        words = WORD_REGEX.findall(text.lower())
+        size = self.shingle_size
+        shingles = {
+            " ".join(words[i : i + size])
+            for i in range(max(len(words) - size + 1, 1))
+        }
+        hashes = np.fromiter(
+            (zlib.crc32(shingle.encode("utf-8")) for shingle in shingles),
+            dtype=np.uint64,
+            count=len(shingles),
+        )
+        permuted = (np.outer(hashes, self._a) + self._b) % _MERSENNE_PRIME & _MAX_HASH
+        return permuted.min(axis=0).astype(np.uint32)
+
+
+def content_hash(text: str) -> bytes:
+    """Hash of the text with case and whitespace differences removed."""
+    normalized = " ".join(text.lower().split())
+    return hashlib.blake2b(normalized.encode("utf-8"), digest_size=16).digest()
+
+
+@dataclass
+class Duplicate:
+    kind: str  # "exact" or "near"
+    url: str
+    similarity: float
+
+
+class NearDuplicateIndex:
+    """SQLite-backed MinHash LSH index of accepted texts.
+
+    Signatures are split into `bands`; texts sharing any band are candidates
+    and count as near-duplicates when their estimated Jaccard similarity is at
+    least `threshold`. Everything lives in SQLite, so memory stays bounded by
+    its page cache, the index survives restarts and crawler processes on one
+    machine can share the file. At most `max_documents` texts are kept; the
+    oldest are evicted first.
+    """
+
+    EVICT_INTERVAL = 1000
+
+    def __init__(
+        self,
+        path: str,
+        threshold: float = 0.8,
+        num_perm: int = 128,
+        bands: int = 16,
+        shingle_size: int = 5,
+        max_documents: int = 0,
+    ):
+        if num_perm % bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        if path != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.threshold = threshold
+        self.bands = bands
+        self.max_documents = max_documents
+        self.hasher = MinHasher(num_perm=num_perm, shingle_size=shingle_size)
+        self._inserts = 0
+        self.db = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            "id INTEGER PRIMARY KEY, content_hash BLOB NOT NULL UNIQUE, "
+            "signature BLOB NOT NULL, url TEXT, added_at REAL NOT NULL)"
+        )
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS bands ("
+            "band INTEGER NOT NULL, key INTEGER NOT NULL, document_id INTEGER NOT NULL)"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS bands_key ON bands (band, key)")
+        self.db.execute(
+            "CREATE INDEX IF NOT EXISTS bands_document ON bands (document_id)"
+        )
+
+    def add(self, text: str, url: str) -> Optional[Duplicate]:
+        """Add `text` unless it duplicates an indexed text; return the match."""
+        digest = content_hash(text)
+        signature = self.hasher.signature(text)
+        band_keys = self._band_keys(signature)
+
+        # Check and insert in one write transaction so that two processes
+        # adding the same text at once cannot both keep it.
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            duplicate = self._find(digest, signature, band_keys)
+            if duplicate is None:
+                self._insert(digest, signature, band_keys, url)
+            self.db.execute("COMMIT")
+        except BaseException:
+            self.db.execute("ROLLBACK")
+            raise
+        return duplicate
+
+    def close(self) -> None:
+        self.db.close()
+
+    def _find(self, digest, signature, band_keys) -> Optional[Duplicate]:
+        row = self.db.execute(
+            "SELECT url FROM documents WHERE content_hash = ?", (digest,)
+        ).fetchone()
+        if row is not None:
+            return Duplicate("exact", row[0], 1.0)
+
+        candidate_ids = set()
+        for band, key in enumerate(band_keys):
+            candidate_ids.update(
+                document_id
+                for (document_id,) in self.db.execute(
+                    "SELECT document_id FROM bands WHERE band = ? AND key = ?",
+                    (band, key),
+                )
+            )
+        best = None
+        for document_id in candidate_ids:
+            row = self.db.execute(
+                "SELECT signature, url FROM documents WHERE id = ?", (document_id,)
+            ).fetchone()
+            if row is None:
+                continue  # evicted
+            other = np.frombuffer(row[0], dtype=np.uint32)
+            similarity = float(np.mean(signature == other))
+            if similarity >= self.threshold and (
+                best is None or similarity > best.similarity
+            ):
+                best = Duplicate("near", row[1], similarity)
+        return best
+
+    def _insert(self, digest, signature, band_keys, url) -> None:
+        cursor = self.db.execute(
+            "INSERT INTO documents (content_hash, signature, url, added_at) "
+            "VALUES (?, ?, ?, ?)",
+            (digest, signature.tobytes(), url, time.time()),
+        )
+        self.db.executemany(
+            "INSERT INTO bands (band, key, document_id) VALUES (?, ?, ?)",
+            [(band, key, cursor.lastrowid) for band, key in enumerate(band_keys)],
+        )
+        self._inserts += 1
+        if self.max_documents and self._inserts % self.EVICT_INTERVAL == 0:
+            self._evict()
+
+    def _evict(self) -> None:
+        row = self.db.execute(
+            "SELECT id FROM documents ORDER BY id DESC LIMIT 1 OFFSET ?",
+            (self.max_documents,),
+        ).fetchone()
+        if row is None:
+            return
+        self.db.execute("DELETE FROM documents WHERE id <= ?", (row[0],))
+        self.db.execute("DELETE FROM bands WHERE document_id <= ?", (row[0],))
+
+    def _band_keys(self, signature: np.ndarray) -> list[int]:
+        rows = len(signature) // self.bands
+        return [
+            int.from_bytes(
+                hashlib.blake2b(
+                    signature[band * rows : (band + 1) * rows].tobytes(), digest_size=8
+                ).digest(),
+                "big",
+                signed=True,
+            )
+            for band in range(self.bands)
+        ]
+
+
+def open_index(path: str, **kwargs) -> NearDuplicateIndex:
+    """Return the process's index connection for `path`, opening it on first use.
+
+    Crawlers of one process run on the same reactor thread, so they share
+    one connection instead of waiting on each other's write transactions.
+    The first crawler's `kwargs` configure the index.
+    """
+    return _indexes.acquire(path, lambda: NearDuplicateIndex(path, **kwargs))
+
+
+def close_index(path: str) -> None:
+    """Release `path`; the connection is closed when its last crawler releases it."""
+    index = _indexes.release(path)
+    if index is not None:
+        index.close()
@@ -6,10 +6,16 @@
 
 # useful for handling different item types with a single interface
 
-from scrapy.exceptions import DropItem
+from scrapy.exceptions import DropItem, NotConfigured
+from scrapy.utils.defer import maybe_deferred_to_future
+from twisted.internet.defer import Deferred
 
 
+from kurdish_scrapy import instrumentation, near_duplicates
+from kurdish_scrapy.lang_model import get_language_model
+from kurdish_scrapy.loaders import round_float_3
 from kurdish_scrapy.settings import ALLOWED_LANGS, TEXT_MIN_WORD_COUNT
+from kurdish_scrapy.shared import SharedRegistry
 
 
 class LenPipeline:
@@ -21,11 +27,129 @@ class LenPipeline:
                 TEXT_MIN_WORD_COUNT,
                 item.get("url", "<unknown-url>"),
             )
+            instrumentation.count(
+                instrumentation.COUNTER_ITEMS_DROPPED,
+                instrumentation.spider_domain(spider),
+                "too_short",
+            )
             raise DropItem("Text is too short")
 
         return item
 
 
+class LanguageIdBatcher:
+    """Detect item languages with one fastText call per micro-batch.
+
+    One batcher is shared by every crawler of the process (see
+    `open_batcher`), since a single domain crawled politely rarely has more
+    than one or two items in flight. Items wait until `batch_size` of them
+    are pending or `max_delay` seconds have passed since the first one
+    arrived. The batch sizes are counted in the stats of each crawler with
+    an item in the batch.
+    """
+
+    # Lower bounds of the batch size buckets counted in the stats
+    BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+
+    def __init__(self, batch_size: int, max_delay: float):
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self._pending: list[tuple[dict, Deferred, object]] = []
+        self._flush_call = None
+
+    def predict(self, item, stats) -> Deferred:
+        """Return a Deferred fired with `item` once its language is set."""
+        deferred = Deferred()
+        self._pending.append((item, deferred, stats))
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+        elif self._flush_call is None:
+            from twisted.internet import reactor
+
+            self._flush_call = reactor.callLater(self.max_delay, self.flush)
+        return deferred
+
+    def flush(self):
+        if self._flush_call is not None and self._flush_call.active():
+            self._flush_call.cancel()
+        self._flush_call = None
+        pending, self._pending = self._pending, []
+        if not pending:
+            return
+
+        self._count_batch(pending)
+        texts = [item["text"].replace("\n", " ") for item, _, _ in pending]
+        try:
+            # Batches mix domains, so they are timed for all domains at once.
+            with instrumentation.timed(
+                instrumentation.STAGE_LANG_ID, instrumentation.ALL_DOMAINS
+            ):
+                labels, probs = get_language_model().predict(texts)
+        except Exception as e:
+            for _, deferred, _ in pending:
+                deferred.errback(e)
+            return
+
+        for (item, deferred, _), item_labels, item_probs in zip(pending, labels, probs):
+            item["lang"] = item_labels[0].replace("__label__", "")
+            item["lang_score"] = round_float_3(item_probs[0])
+            deferred.callback(item)
+
+    def _count_batch(self, pending) -> None:
+        size = len(pending)
+        lower = max(bound for bound in self.BATCH_SIZE_BUCKETS if bound <= size)
+        upper = lower * 2 - 1
+        bucket = str(lower) if lower == upper else f"{lower}-{upper}"
+        if lower == self.BATCH_SIZE_BUCKETS[-1]:
+            bucket = f"{lower}+"
+        for stats in {id(stats): stats for _, _, stats in pending}.values():
+            stats.inc_value("lang_id/batches")
+            stats.inc_value(f"lang_id/batch_size/{bucket}")
+
+
+_batchers: SharedRegistry[LanguageIdBatcher] = SharedRegistry()
+
+
+def open_batcher(batch_size: int, max_delay: float) -> LanguageIdBatcher:
+    """Return the process's language ID batcher, creating it on first use."""
+    return _batchers.acquire(None, lambda: LanguageIdBatcher(batch_size, max_delay))
+
+
+def close_batcher() -> None:
+    """Release the batcher; the last crawler to release it flushes it."""
+    batcher = _batchers.release(None)
+    if batcher is not None:
+        batcher.flush()
+
+
+class LanguageIdPipeline:
+    """Set `lang` and `lang_score` through the process's `LanguageIdBatcher`."""
+
+    def __init__(self, stats, batch_size: int, max_delay: float):
+        self.stats = stats
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.batcher = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        return cls(
+            crawler.stats,
+            batch_size=crawler.settings.getint("LANG_ID_BATCH_SIZE", 64),
+            max_delay=crawler.settings.getfloat("LANG_ID_BATCH_MAX_DELAY", 1.0),
+        )
+
+    def open_spider(self, spider):
+        self.batcher = open_batcher(self.batch_size, self.max_delay)
+
+    async def process_item(self, item, spider):
+        self.stats.inc_value("lang_id/items")
+        return await maybe_deferred_to_future(self.batcher.predict(item, self.stats))
+
+    def close_spider(self, spider):
+        close_batcher()
+
+
 class LanguagePipeline:
     def process_item(self, item, spider):
         lang = item["lang"]
@@ -35,6 +159,70 @@ class LanguagePipeline:
                 lang,
                 item.get("url", "<unknown-url>"),
             )
+            instrumentation.count(
+                instrumentation.COUNTER_ITEMS_DROPPED,
+                instrumentation.spider_domain(spider),
+                "not_kurdish",
+            )
             raise DropItem(f"Item is not Kurdish ({lang})")
 
         return item
+
+
+class DedupPipeline:
+    """Drop items whose text repeats, exactly or nearly, an accepted item.
+
+    Exact copies are found by a hash of the normalized text, near-duplicates
+    (syndicated stories, mirrors, query-string variants) by MinHash LSH. The
+    index is a SQLite file at `DEDUP_INDEX_PATH`, shared by every crawler and
+    shard using the same path and kept between runs. The crawlers of one
+    process share a single connection to it.
+    """
+
+    def __init__(self, stats, index_kwargs: dict):
+        self.stats = stats
+        self.index_kwargs = index_kwargs
+        self.index = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool("DEDUP_ENABLED"):
+            raise NotConfigured
+        return cls(
+            crawler.stats,
+            {
+                "path": settings.get("DEDUP_INDEX_PATH") or ":memory:",
+                "threshold": settings.getfloat("DEDUP_NEAR_THRESHOLD"),
+                "num_perm": settings.getint("DEDUP_NUM_PERM"),
+                "bands": settings.getint("DEDUP_BANDS"),
+                "shingle_size": settings.getint("DEDUP_SHINGLE_SIZE"),
+                "max_documents": settings.getint("DEDUP_MAX_DOCUMENTS"),
+            },
+        )
+
+    def open_spider(self, spider):
+        self.index = near_duplicates.open_index(**self.index_kwargs)
+
+    def close_spider(self, spider):
+        near_duplicates.close_index(self.index_kwargs["path"])
+
+    def process_item(self, item, spider):
+        domain = instrumentation.spider_domain(spider)
+        with instrumentation.timed(instrumentation.STAGE_DEDUP, domain):
+            duplicate = self.index.add(item["text"], item.get("url"))
+        if duplicate is None:
+            return item
+
+        self.stats.inc_value(f"dedup/{duplicate.kind}")
+        instrumentation.count(
+            instrumentation.COUNTER_ITEMS_DROPPED, domain, f"duplicate_{duplicate.kind}"
+        )
+        spider.logger.debug(
+            "Dropping %s duplicate (%.2f) of %s: %s",
+            duplicate.kind,
+            duplicate.similarity,
+            duplicate.url,
+            item.get("url", "<unknown-url>"),
+        )
+        raise DropItem(f"Text is a {duplicate.kind} duplicate of {duplicate.url}")
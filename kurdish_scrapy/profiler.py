@@ -0,0 +1,241 @@
+"""Sampling profiler for live crawls.
+
+A background thread reads the stack of every other thread of the process
+(the reactor, Scrapy's and sitemap discovery's thread pools) every
+`interval` seconds and counts identical stacks. Stacks taken inside an
+`instrumentation.timed()` or `in_stage()` block are prefixed with its
+domain and stage.
+The result is written in the folded format read by flamegraph.pl,
+speedscope and inferno:
+
+    MainThread;domain:nuhev.com;stage:extract;parse (spiders/recursive.py:13);... 42
+
+Extraction pool workers are separate processes. Each one runs its own
+sampler thread that follows the windows of the crawler process through a
+shared value, and writes its own file next to the crawler's.
+"""
+
+import logging
+import multiprocessing
+import multiprocessing.util
+import os
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+from kurdish_scrapy import instrumentation
+
+
+logger = logging.getLogger(__name__)
+
+# Seconds between checks of a worker for a window opened by the crawler process
+WINDOW_POLL_INTERVAL = 0.1
+
+_profiler: Optional["SamplingProfiler"] = None
+_signal_name = ""
+
+
+class SamplingProfiler:
+    """Sample thread stacks in windows, one output file per window."""
+
+    def __init__(self, output_dir: str, interval: float = 0.01):
+        self.output_dir = output_dir
+        self.interval = interval
+        self.windows = 0
+        self.samples: Counter = Counter()
+        self.sampling_seconds = 0.0
+        self._labels: dict = {}  # code object -> frame label
+        # Start time of the running window (0 = none), shared with the
+        # worker processes following it; set up by `install`
+        self.window = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, duration: float = 0) -> None:
+        """Sample for `duration` seconds (0 = until `stop`), then write the file."""
+        with self._lock:
+            if self.running:
+                return
+            self._stop.clear()
+            self.windows += 1
+            self._thread = threading.Thread(
+                target=self._run, args=(duration,), name="sampling-profiler", daemon=True
+            )
+            self._thread.start()
+
+    def toggle(self, duration: float = 0) -> None:
+        """Start a window, or end the running one without waiting for it."""
+        if self.running:
+            self._stop.set()
+        else:
+            self.start(duration)
+
+    def stop(self) -> None:
+        """End the current window; the file is written before this returns."""
+        thread = self._thread
+        if thread is None:
+            return
+        self._stop.set()
+        if thread is not threading.current_thread():
+            thread.join()
+
+    def follow(self, window) -> None:
+        """Sample during the windows another process opens in `window`."""
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._follow, args=(window,), name="sampling-profiler", daemon=True
+        )
+        self._thread.start()
+
+    def _run(self, duration: float) -> None:
+        started = time.monotonic()
+        started_at = datetime.now()
+        own_id = threading.get_ident()
+        logger.info(
+            "Profiling every %.0f ms%s",
+            self.interval * 1000,
+            f" for {duration:g} s" if duration else "",
+        )
+        if self.window is not None:
+            self.window.value = started_at.timestamp()
+        while not self._stop.wait(self.interval):
+            self._sample(own_id)
+            if duration and time.monotonic() - started >= duration:
+                break
+        if self.window is not None:
+            self.window.value = 0.0
+        self._write(started_at, time.monotonic() - started)
+
+    def _follow(self, window) -> None:
+        own_id = threading.get_ident()
+        while not self._stop.wait(WINDOW_POLL_INTERVAL):
+            opened = window.value
+            if not opened:
+                continue
+            self.windows += 1
+            started = time.monotonic()
+            while window.value == opened and not self._stop.wait(self.interval):
+                self._sample(own_id)
+            self._write(datetime.fromtimestamp(opened), time.monotonic() - started)
+
+    def _sample(self, own_id: int) -> None:
+        sample_started = time.perf_counter()
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_id:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(self._label(frame.f_code))
+                frame = frame.f_back
+            stack.reverse()
+            stage = instrumentation.current_stage(thread_id)
+            if stage is not None:
+                stack[:0] = (f"domain:{stage[1]}", f"stage:{stage[0]}")
+            stack.insert(0, names.get(thread_id, str(thread_id)))
+            self.samples[tuple(stack)] += 1
+        self.sampling_seconds += time.perf_counter() - sample_started
+
+    def _label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            filename = "/".join(Path(code.co_filename).parts[-2:])
+            label = self._labels[code] = (
+                f"{code.co_name} ({filename}:{code.co_firstlineno})".replace(";", ":")
+            )
+        return label
+
+    def _write(self, started_at: datetime, elapsed: float) -> None:
+        samples, self.samples = self.samples, Counter()
+        sampling_seconds, self.sampling_seconds = self.sampling_seconds, 0.0
+        if not samples:
+            return
+        path = Path(
+            self.output_dir,
+            f"profile_{started_at.strftime('%Y%m%d_%H%M%S')}_{os.getpid()}.folded",
+        )
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as folded_file:
+            for stack, count in samples.most_common():
+                folded_file.write(f"{';'.join(stack)} {count}\n")
+        # The sampler holds the GIL while it walks the stacks, so this is
+        # roughly the time it took from the crawl.
+        logger.info(
+            "Wrote %d profile samples of %d threads to %s (sampling took %.1f%% of %.0f s)",
+            sum(samples.values()),
+            len({stack[0] for stack in samples}),
+            path,
+            100 * sampling_seconds / elapsed if elapsed else 0,
+            elapsed,
+        )
+
+
+def install(
+    output_dir: str, interval: float, duration: float, signal_name: str = ""
+) -> SamplingProfiler:
+    """Return the process's profiler, creating it on first use.
+
+    The first call also makes `signal_name` toggle a window of `duration`
+    seconds and writes the running window when the reactor shuts down.
+    """
+    global _profiler, _signal_name
+    if _profiler is not None:
+        return _profiler
+    _profiler = SamplingProfiler(output_dir, interval)
+    _profiler.window = multiprocessing.Value("d", 0.0)
+    _signal_name = signal_name
+
+    from twisted.internet import reactor
+
+    reactor.addSystemEventTrigger("before", "shutdown", _profiler.stop)
+    if signal_name:
+        signal_number = getattr(signal, signal_name, None)
+        if signal_number is None:
+            logger.warning("Signal %s is not available, profiling on demand is off", signal_name)
+        elif threading.current_thread() is not threading.main_thread():
+            logger.warning("Not on the main thread, profiling on demand is off")
+        else:
+            # The handler interrupts the reactor thread wherever it is, maybe
+            # inside `start()` holding its lock; toggle from the reactor loop.
+            signal.signal(
+                signal_number,
+                lambda signum, frame: reactor.callFromThread(_profiler.toggle, duration),
+            )
+            logger.info(
+                "Send %s to process %d to start or stop profiling", signal_name, os.getpid()
+            )
+    return _profiler
+
+
+def worker_profiling() -> Optional[tuple]:
+    """Arguments for `follow_in_worker`, or None if the process is not profiled.
+
+    Must be called before the worker processes are started.
+    """
+    if _profiler is None:
+        return None
+    return _profiler.output_dir, _profiler.interval, _profiler.window, _signal_name
+
+
+def follow_in_worker(output_dir: str, interval: float, window, signal_name: str) -> None:
+    """Profile this worker process during the crawler process's windows."""
+    global _profiler
+    # A forked worker inherits the crawler's profiler and signal handler;
+    # the signal would start a window of its own.
+    signal_number = getattr(signal, signal_name, None) if signal_name else None
+    if signal_number is not None:
+        signal.signal(signal_number, signal.SIG_IGN)
+    _profiler = SamplingProfiler(output_dir, interval)
+    _profiler.follow(window)
+    # Write a window still open when the pool shuts the worker down.
+    multiprocessing.util.Finalize(None, _profiler.stop, exitpriority=10)
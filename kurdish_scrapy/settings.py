@@ -29,9 +29,32 @@ ROBOTSTXT_OBEY = True
 
 # Concurrency and throttling settings
 # CONCURRENT_REQUESTS = 16
+# Starting point for domains AdaptiveThrottle has not seen yet
 CONCURRENT_REQUESTS_PER_DOMAIN = 1
 DOWNLOAD_DELAY = 1
 
+# Learn per-domain delay and concurrency from latency, errors, 429/503
+# responses and robots.txt Crawl-delay, and keep them between runs
+ADAPTIVE_THROTTLE_ENABLED = os.getenv("ADAPTIVE_THROTTLE_ENABLED", "true").lower() in ("1", "true", "yes")
+ADAPTIVE_THROTTLE_MIN_DELAY = float(os.getenv("ADAPTIVE_THROTTLE_MIN_DELAY", 0.25))
+ADAPTIVE_THROTTLE_MAX_DELAY = float(os.getenv("ADAPTIVE_THROTTLE_MAX_DELAY", 60))
+ADAPTIVE_THROTTLE_MAX_CONCURRENCY = int(os.getenv("ADAPTIVE_THROTTLE_MAX_CONCURRENCY", 4))
+ADAPTIVE_THROTTLE_TARGET_CONCURRENCY = float(
+    os.getenv("ADAPTIVE_THROTTLE_TARGET_CONCURRENCY", 2.0)
+)
+ADAPTIVE_THROTTLE_STATE_PATH = os.getenv(
+    "ADAPTIVE_THROTTLE_STATE_PATH", ".cache/throttle.json"
+)
+
+# Per-domain crawl budgets, 0 = unlimited
+CRAWL_BUDGET_MAX_PAGES = int(os.getenv("CRAWL_BUDGET_MAX_PAGES", 0))
+CRAWL_BUDGET_MAX_BYTES = int(os.getenv("CRAWL_BUDGET_MAX_BYTES", 0))
+CRAWL_BUDGET_MAX_SECONDS = float(os.getenv("CRAWL_BUDGET_MAX_SECONDS", 0))
+# Close a domain's spider when fewer than CRAWL_YIELD_MIN_RATIO of the last
+# CRAWL_YIELD_WINDOW HTML pages produced an accepted item; 0 disables the rule
+CRAWL_YIELD_WINDOW = int(os.getenv("CRAWL_YIELD_WINDOW", 500))
+CRAWL_YIELD_MIN_RATIO = float(os.getenv("CRAWL_YIELD_MIN_RATIO", 0.01))
+
 # Disable cookies (enabled by default)
 # COOKIES_ENABLED = False
 
@@ -46,28 +69,77 @@ DOWNLOAD_DELAY = 1
 
 # Enable or disable spider middlewares
 # See https://docs.scrapy.org/en/latest/topics/spider-middleware.html
-# SPIDER_MIDDLEWARES = {
-#    "kurdish_scrapy.middlewares.SorjinBaseManualDataCollectorSpiderMiddleware": 543,
-# }
+SPIDER_MIDDLEWARES = {
+    "kurdish_scrapy.middlewares.UrlCanonicalizationMiddleware": 550,
+}
+
+# Rewrite yielded request URLs to one canonical form per site (learned host and
+# scheme, tracking/session params, AMP variants, learned ignorable params and
+# trailing slash style) and drop requests for URLs known as aliases via rel=canonical
+URL_CANONICALIZATION_ENABLED = os.getenv("URL_CANONICALIZATION_ENABLED", "true").lower() in ("1", "true", "yes")
+# Canonical URLs of fetched pages and their aliases kept in memory per domain
+URL_CANONICAL_CACHE_SIZE = int(os.getenv("URL_CANONICAL_CACHE_SIZE", 100_000))
 
 # Enable or disable downloader middlewares
 # See https://docs.scrapy.org/en/latest/topics/downloader-middleware.html
 DOWNLOADER_MIDDLEWARES = {
     "kurdish_scrapy.middlewares.MediaFilterMiddleware": 300,
     "kurdish_scrapy.middlewares.ScrapeOpsFakeUserAgentMiddleware": 400,
+    "kurdish_scrapy.middlewares.LedgerConditionalRequestMiddleware": 450,
 }
 
 # Enable or disable extensions
 # See https://docs.scrapy.org/en/latest/topics/extensions.html
-# EXTENSIONS = {
-#    "scrapy.extensions.telnet.TelnetConsole": None,
-# }
+EXTENSIONS = {
+    "kurdish_scrapy.extensions.AdaptiveThrottle": 500,
+    "kurdish_scrapy.extensions.CrawlBudget": 510,
+    "kurdish_scrapy.extensions.StreamingFeedExport": 520,
+    "kurdish_scrapy.extensions.Instrumentation": 530,
+    "kurdish_scrapy.extensions.Profiler": 540,
+}
+
+# Time download, prefilter, extraction, link extraction, language ID and dedup
+# per domain and count pages, items and drop reasons. Results go to the crawl
+# stats and, when a path is set, to a Prometheus text file rewritten every
+# INSTRUMENTATION_DUMP_INTERVAL seconds. run_crawler defaults the path to the
+# log file with a .prom suffix.
+INSTRUMENTATION_ENABLED = os.getenv("INSTRUMENTATION_ENABLED", "true").lower() in ("1", "true", "yes")
+INSTRUMENTATION_DUMP_PATH = os.getenv("INSTRUMENTATION_DUMP_PATH", "")
+INSTRUMENTATION_DUMP_INTERVAL = float(os.getenv("INSTRUMENTATION_DUMP_INTERVAL", 30))
+
+# Sample the stacks of every thread of a crawler process PROFILER_INTERVAL
+# seconds apart for PROFILER_DURATION seconds (0 = until the crawl ends) and
+# write them as folded stacks for flamegraph.pl or speedscope. Profiling starts
+# with the crawl when PROFILER_ENABLED is set, and at any time on
+# `kill -<PROFILER_SIGNAL> <pid>`; the same signal ends a running window early.
+# An empty PROFILER_SIGNAL disables it. run_crawler defaults PROFILER_OUTPUT_DIR
+# to the directory of the log file.
+PROFILER_ENABLED = os.getenv("PROFILER_ENABLED", "false").lower() in ("1", "true", "yes")
+PROFILER_SIGNAL = os.getenv("PROFILER_SIGNAL", "SIGUSR1")
+PROFILER_DURATION = float(os.getenv("PROFILER_DURATION", 60))
+PROFILER_INTERVAL = float(os.getenv("PROFILER_INTERVAL", 0.01))
+PROFILER_OUTPUT_DIR = os.getenv("PROFILER_OUTPUT_DIR", "")
+
+# Outputs written by StreamingFeedExport, set by run_crawler for .parquet,
+# .jsonl.gz and .jsonl.zst output
+STREAMING_FEEDS = {}
+# .jsonl.gz/.jsonl.zst shards are finished and renamed at this many compressed
+# bytes or items, 0 = no limit
+FEED_SHARD_MAX_BYTES = int(os.getenv("FEED_SHARD_MAX_BYTES", 128 * 1024 * 1024))
+FEED_SHARD_MAX_ITEMS = int(os.getenv("FEED_SHARD_MAX_ITEMS", 0))
+# gzip level of .jsonl.gz shards; 9 costs much more CPU for a few % smaller files
+FEED_SHARD_GZIP_LEVEL = int(os.getenv("FEED_SHARD_GZIP_LEVEL", 6))
+# Items buffered per Parquet row group, and the codec of the text column
+FEED_PARQUET_ROW_GROUP_SIZE = int(os.getenv("FEED_PARQUET_ROW_GROUP_SIZE", 2000))
+FEED_PARQUET_COMPRESSION = os.getenv("FEED_PARQUET_COMPRESSION", "zstd")
 
 # Configure item pipelines
 # See https://docs.scrapy.org/en/latest/topics/item-pipeline.html
 ITEM_PIPELINES = {
     "kurdish_scrapy.pipelines.LenPipeline": 100,
+    "kurdish_scrapy.pipelines.LanguageIdPipeline": 150,
     "kurdish_scrapy.pipelines.LanguagePipeline": 200,
+    "kurdish_scrapy.pipelines.DedupPipeline": 300,
 }
 
 # Enable and configure the AutoThrottle extension (disabled by default)
@@ -112,9 +184,30 @@ SITEMAP_PATTERNS = [
     "/news-sitemap.xml",
 ]
 
+# Sitemap discovery probes this many domains at once, with at most
+# SITEMAP_DISCOVERY_PER_HOST requests in flight per domain
+SITEMAP_DISCOVERY_MAX_DOMAINS = int(os.getenv("SITEMAP_DISCOVERY_MAX_DOMAINS", 16))
+SITEMAP_DISCOVERY_PER_HOST = int(os.getenv("SITEMAP_DISCOVERY_PER_HOST", 4))
+# Discovery results are cached per domain. Found sitemaps are reused for
+# SITEMAP_DISCOVERY_CACHE_TTL seconds, "no sitemap" verdicts for
+# SITEMAP_DISCOVERY_CACHE_NEGATIVE_TTL. Set the path to an empty value to always probe.
+SITEMAP_DISCOVERY_CACHE_PATH = os.getenv(
+    "SITEMAP_DISCOVERY_CACHE_PATH", ".cache/sitemap_discovery.json"
+)
+SITEMAP_DISCOVERY_CACHE_TTL = int(os.getenv("SITEMAP_DISCOVERY_CACHE_TTL", 7 * 24 * 3600))
+SITEMAP_DISCOVERY_CACHE_NEGATIVE_TTL = int(
+    os.getenv("SITEMAP_DISCOVERY_CACHE_NEGATIVE_TTL", 24 * 3600)
+)
+
 SCRAPEOPS_FAKE_USER_AGENT_ENABLED = True
 SCRAPEOPS_NUM_RESULTS = 10
 SCRAPEOPS_FAKE_USER_AGENT_ENDPOINT = "https://headers.scrapeops.io/v1/user-agents?"
+# User agents fetched from ScrapeOps are cached here and refreshed in the
+# background once older than SCRAPEOPS_USER_AGENT_CACHE_TTL seconds
+SCRAPEOPS_USER_AGENT_CACHE_PATH = os.getenv(
+    "SCRAPEOPS_USER_AGENT_CACHE_PATH", ".cache/user_agents.json"
+)
+SCRAPEOPS_USER_AGENT_CACHE_TTL = int(os.getenv("SCRAPEOPS_USER_AGENT_CACHE_TTL", 24 * 3600))
 
 # keep only Kurdish-related languages
 # kmr_Latn → Kurmanji (Northern Kurdish, Latin script)
@@ -122,3 +215,55 @@ SCRAPEOPS_FAKE_USER_AGENT_ENDPOINT = "https://headers.scrapeops.io/v1/user-agent
 # diq_Latn → Zazaki (Latin script)
 ALLOWED_LANGS = os.getenv("ALLOWED_LANGS", "kmr_Latn,ckb_Arab,diq_Latn").split(",")
 TEXT_MIN_WORD_COUNT = int(os.getenv("TEXT_MIN_WORD_COUNT", 100))
+
+# Skip Trafilatura for pages whose raw HTML can't hold TEXT_MIN_WORD_COUNT words
+# or has no Kurdish (Arabic or Kurdish Latin) characters
+PREFILTER_ENABLED = os.getenv("PREFILTER_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# Give recursive crawl requests a priority from URL features and the item yield
+# of their path prefix, so likely articles are fetched before listing pages
+URL_PRIORITY_ENABLED = os.getenv("URL_PRIORITY_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# Recursive crawls keep their request queue and seen-set on disk in
+# <CRAWL_STATE_DIR>/<spider>/<domain> so an interrupted run resumes where it stopped.
+# Set to an empty value to crawl in memory only.
+CRAWL_STATE_DIR = os.getenv("CRAWL_STATE_DIR", "crawl_state")
+# Sitemap crawls record fetched articles and child sitemaps with their lastmod,
+# ETag and Last-Modified, and skip or revalidate them on later runs.
+# Set to an empty value to re-crawl every sitemap entry.
+SITEMAP_LEDGER_PATH = os.getenv(
+    "SITEMAP_LEDGER_PATH",
+    os.path.join(CRAWL_STATE_DIR, "sitemap_ledger.sqlite3") if CRAWL_STATE_DIR else "",
+)
+# Drop items whose text is an exact or near duplicate (MinHash estimated
+# Jaccard similarity of word 5-gram shingles >= DEDUP_NEAR_THRESHOLD) of an
+# accepted item. The SQLite index is shared by all crawlers using the same path.
+DEDUP_ENABLED = os.getenv("DEDUP_ENABLED", "true").lower() in ("1", "true", "yes")
+DEDUP_INDEX_PATH = os.getenv(
+    "DEDUP_INDEX_PATH",
+    os.path.join(CRAWL_STATE_DIR, "dedup.sqlite3") if CRAWL_STATE_DIR else "",
+)
+DEDUP_NEAR_THRESHOLD = float(os.getenv("DEDUP_NEAR_THRESHOLD", 0.8))
+DEDUP_NUM_PERM = int(os.getenv("DEDUP_NUM_PERM", 128))
+DEDUP_BANDS = int(os.getenv("DEDUP_BANDS", 16))
+DEDUP_SHINGLE_SIZE = int(os.getenv("DEDUP_SHINGLE_SIZE", 5))
+# Oldest texts are evicted from the index beyond this count, 0 = keep all
+DEDUP_MAX_DOCUMENTS = int(os.getenv("DEDUP_MAX_DOCUMENTS", 0))
+# Recently seen request fingerprints kept in memory in front of the on-disk seen-set
+DUPEFILTER_CACHE_SIZE = int(os.getenv("DUPEFILTER_CACHE_SIZE", 100_000))
+
+# Run trafilatura extraction in a pool of worker processes so parsing does not
+# block the reactor. 0 keeps extraction inline on the reactor thread.
+EXTRACTION_POOL_WORKERS = int(os.getenv("EXTRACTION_POOL_WORKERS", 0))
+# Max extractions queued or running at once, 0 = twice the number of workers
+EXTRACTION_POOL_MAX_PENDING = int(os.getenv("EXTRACTION_POOL_MAX_PENDING", 0))
+
+# fastText language identification model. Set FASTTEXT_MODEL_PATH to use a local
+# model.bin; with FASTTEXT_OFFLINE the Hugging Face cache is never refreshed.
+FASTTEXT_MODEL_PATH = os.getenv("FASTTEXT_MODEL_PATH")
+FASTTEXT_OFFLINE = os.getenv("FASTTEXT_OFFLINE", "false").lower() in ("1", "true", "yes")
+
+# Language identification runs on micro-batches of items that passed LenPipeline,
+# collected from every crawler of the process
+LANG_ID_BATCH_SIZE = int(os.getenv("LANG_ID_BATCH_SIZE", 64))
+LANG_ID_BATCH_MAX_DELAY = float(os.getenv("LANG_ID_BATCH_MAX_DELAY", 1.0))
@@ -0,0 +1,45 @@
+"""Objects shared by the crawlers of one process.
+
+Many crawlers run in one process on the same reactor thread. Resources such
+as the crawl ledger connection, the dedup index or the language ID batcher
+are created by the first crawler that needs them and closed by the last one
+that releases them.
+"""
+
+from dataclasses import dataclass
+from typing import Callable, Generic, Hashable, Optional, TypeVar
+
+
+T = TypeVar("T")
+
+
+@dataclass
+class _Entry(Generic[T]):
+    value: T
+    users: int = 0
+
+
+class SharedRegistry(Generic[T]):
+    """Reference-counted objects, one per key."""
+
+    def __init__(self):
+        self._entries: dict[Hashable, _Entry[T]] = {}
+
+    def acquire(self, key: Hashable, factory: Callable[[], T]) -> T:
+        """Return the object of `key`, creating it with `factory` on first use."""
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = self._entries[key] = _Entry(factory())
+        entry.users += 1
+        return entry.value
+
+    def release(self, key: Hashable) -> Optional[T]:
+        """Release `key`; return its object if this was its last user, to be closed."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        entry.users -= 1
+        if entry.users > 0:
+            return None
+        del self._entries[key]
+        return entry.value
@@ -1,102 +1,317 @@
-import gzip
-import io
+import logging
 import re
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Iterable, Optional
 from urllib.parse import urljoin, urlparse
 
 import requests
 from requests import Response
+from requests.adapters import HTTPAdapter
 from requests.exceptions import RequestException
 
-from kurdish_scrapy.settings import SITEMAP_PATTERNS
+from kurdish_scrapy.settings import (
+    SITEMAP_DISCOVERY_CACHE_NEGATIVE_TTL,
+    SITEMAP_DISCOVERY_CACHE_PATH,
+    SITEMAP_DISCOVERY_CACHE_TTL,
+    SITEMAP_DISCOVERY_MAX_DOMAINS,
+    SITEMAP_DISCOVERY_PER_HOST,
+    SITEMAP_PATTERNS,
+)
+from kurdish_scrapy.state_files import read_json, update_json
 
 
 SITEMAP_REGEX = re.compile(r"Sitemap:\s([^\r\n#]*)", re.MULTILINE)
 
+# Bytes of a sitemap candidate inspected to decide whether it is a sitemap
+PREVIEW_BYTES = 8192
+GZIP_MAGIC = b"\x1f\x8b"
 
-def get_sitemap_urls(url: str) -> set[str]:
-    sitemap_urls_from_robots = get_sitemap_urls_from_robots(url)
-    if sitemap_urls_from_robots:
-        return sitemap_urls_from_robots
-    return get_sitemap_urls_from_patterns(url)
+logger = logging.getLogger(__name__)
 
+PROBE_HEADERS = {
+    "Accept": "application/xml,text/xml;q=0.9,*/*;q=0.8",
+    "User-Agent": "Mozilla/5.0 (compatible; KurdishTextDataCollector/1.0)",
+}
 
-def get_sitemap_urls_from_robots(url: str) -> set[str]:
-    parsed_url = urlparse(url)
-    robots_url = f"{parsed_url.scheme}://{parsed_url.netloc}/robots.txt"
-    try:
-        response = requests.get(url=robots_url, timeout=10)
-    except RequestException:
-        response = None
 
-    if not response or response.status_code != 200:
-        return set()
+class SitemapDiscovery:
+    """Find sitemap URLs for many domains concurrently.
 
-    sitemap_urls: set[str] = set()
-    for sitemap_url in SITEMAP_REGEX.findall(response.text):
-        normalized_sitemap_url = urljoin(robots_url, sitemap_url.strip())
-        if _is_same_domain(url, normalized_sitemap_url):
-            probed = _probe_sitemap_url(normalized_sitemap_url)
-            if probed:
-                sitemap_urls.add(probed)
-    return sitemap_urls
+    Domains are handled in parallel by up to `max_domains` threads sharing one
+    keep-alive `requests.Session`. Each domain sends at most `per_host`
+    requests at a time, and pattern probing stops after the first batch that
+    finds a sitemap.
+    """
 
+    def __init__(
+        self,
+        session: Optional[requests.Session] = None,
+        max_domains: int = SITEMAP_DISCOVERY_MAX_DOMAINS,
+        per_host: int = SITEMAP_DISCOVERY_PER_HOST,
+        patterns: Iterable[str] = SITEMAP_PATTERNS,
+        timeout: float = 10,
+    ):
+        self.max_domains = max_domains
+        self.per_host = per_host
+        self.patterns = list(patterns)
+        self.timeout = timeout
+        self.session = session or self._build_session(max_domains * per_host)
+        self.bytes_transferred = 0
+        self._bytes_lock = threading.Lock()
+        self._probe_executor = ThreadPoolExecutor(
+            max_workers=max_domains * per_host,
+            thread_name_prefix="sitemap-probe",
+        )
 
-def get_sitemap_urls_from_patterns(url: str) -> set[str]:
-    sitemap_urls: set[str] = set()
-    for sitemap_path in SITEMAP_PATTERNS:
-        url_sitemap = urljoin(url, sitemap_path)
-        probed = _probe_sitemap_url(url_sitemap)
-        if probed:
-            sitemap_urls.add(probed)
-    return sitemap_urls
+    def close(self) -> None:
+        self._probe_executor.shutdown(wait=True, cancel_futures=True)
+        self.session.close()
 
+    def __enter__(self) -> "SitemapDiscovery":
+        return self
 
-def _is_same_domain(base_url: str, candidate_url: str) -> bool:
-    base_host = (urlparse(base_url).hostname or "").lower().removeprefix("www.")
-    candidate_host = (urlparse(candidate_url).hostname or "").lower().removeprefix(
-        "www."
-    )
-    return base_host == candidate_host
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def discover_many(self, urls: Iterable[str]) -> dict[str, set[str]]:
+        urls = list(urls)
+        with ThreadPoolExecutor(
+            max_workers=self.max_domains, thread_name_prefix="sitemap-domain"
+        ) as domain_executor:
+            results = domain_executor.map(self.discover, urls)
+            return dict(zip(urls, results))
+
+    def discover(self, url: str) -> set[str]:
+        sitemap_urls_from_robots = self.discover_from_robots(url)
+        if sitemap_urls_from_robots:
+            return sitemap_urls_from_robots
+        return self.discover_from_patterns(url)
+
+    def discover_from_robots(self, url: str) -> set[str]:
+        parsed_url = urlparse(url)
+        robots_url = f"{parsed_url.scheme}://{parsed_url.netloc}/robots.txt"
+        try:
+            response = self.session.get(url=robots_url, timeout=self.timeout)
+        except RequestException:
+            response = None
+        else:
+            with self._bytes_lock:
+                self.bytes_transferred += len(response.content)
+
+        if not response or response.status_code != 200:
+            return set()
+
+        candidates = []
+        for sitemap_url in SITEMAP_REGEX.findall(response.text):
+            normalized_sitemap_url = urljoin(robots_url, sitemap_url.strip())
+            if _is_same_domain(url, normalized_sitemap_url):
+                candidates.append(normalized_sitemap_url)
+        return self._probe_batches(candidates, stop_early=False)
 
+    def discover_from_patterns(self, url: str) -> set[str]:
+        candidates = [urljoin(url, sitemap_path) for sitemap_path in self.patterns]
+        return self._probe_batches(candidates, stop_early=True)
 
-def _probe_sitemap_url(url: str) -> str | None:
+    def probe(self, url: str) -> Optional[str]:
+        """
+        Fetch a sitemap candidate URL and return the final resolved URL only if it
+        looks like an actual sitemap (not an HTML page such as `/latest`).
+
+        Only the first `PREVIEW_BYTES` of the body are requested and read;
+        Scrapy downloads the full sitemap later.
+        """
+        headers = {**PROBE_HEADERS, "Range": f"bytes=0-{PREVIEW_BYTES - 1}"}
+        try:
+            response = self.session.get(
+                url=url,
+                timeout=self.timeout,
+                headers=headers,
+                allow_redirects=True,
+                stream=True,
+            )
+        except RequestException:
+            return None
+
+        with response:
+            if response.status_code not in (200, 206):
+                self._count_bytes(response)
+                return None
+            try:
+                preview = _read_preview(response)
+            except RequestException:
+                return None
+            finally:
+                self._count_bytes(response)
+
+        if not _is_sitemap_preview(
+            preview, response.headers.get("Content-Type", ""), response.url
+        ):
+            return None
+
+        return response.url
+
+    def _count_bytes(self, response: Response) -> None:
+        # urllib3 reports the bytes read off the wire, before decompression.
+        transferred = response.raw.tell() if response.raw is not None else 0
+        with self._bytes_lock:
+            self.bytes_transferred += transferred
+
+    def _probe_batches(self, candidates: list[str], stop_early: bool) -> set[str]:
+        sitemap_urls: set[str] = set()
+        for start in range(0, len(candidates), self.per_host):
+            batch = candidates[start : start + self.per_host]
+            for probed in self._probe_executor.map(self.probe, batch):
+                if probed:
+                    sitemap_urls.add(probed)
+            if stop_early and sitemap_urls:
+                break
+        return sitemap_urls
+
+    @staticmethod
+    def _build_session(pool_size: int) -> requests.Session:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+
+class DiscoveryCache:
+    """JSON file of discovery results keyed by domain URL.
+
+    An empty result is the "no sitemap, crawl recursively" verdict. It
+    expires after `negative_ttl` rather than `ttl`, so a site that was down
+    during discovery is retried sooner.
     """
-    Fetch a sitemap candidate URL and return the final resolved URL only if it
-    looks like an actual sitemap (not an HTML page such as `/latest`).
+
+    def __init__(self, path: str, ttl: float, negative_ttl: float):
+        self.path = Path(path)
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._entries = read_json(self.path, {})
+
+    def get(self, url: str) -> Optional[set[str]]:
+        entry = self._entries.get(self._key(url))
+        if entry is None:
+            return None
+        sitemap_urls = entry["sitemap_urls"]
+        ttl = self.ttl if sitemap_urls else self.negative_ttl
+        if time.time() - entry["checked_at"] > ttl:
+            return None
+        return set(sitemap_urls)
+
+    def set(self, url: str, sitemap_urls: set[str]) -> None:
+        self._entries[self._key(url)] = {
+            "sitemap_urls": sorted(sitemap_urls),
+            "checked_at": time.time(),
+        }
+
+    def save(self) -> None:
+        """Merge the entries into the file, keeping the newer of each domain.
+
+        Discovery shards save to the same file at the same time; each one
+        re-reads it under a lock so no shard drops another's results.
+        """
+
+        def merge(stored: dict) -> dict:
+            for key, entry in self._entries.items():
+                current = stored.get(key)
+                if current is None or current.get("checked_at", 0) <= entry["checked_at"]:
+                    stored[key] = entry
+            return stored
+
+        self._entries = update_json(
+            self.path, merge, default={}, indent=2, sort_keys=True
+        )
+
+    @staticmethod
+    def _key(url: str) -> str:
+        return url.strip().rstrip("/")
+
+
+def discover_sitemap_urls(
+    urls: Iterable[str], refresh: bool = False
+) -> dict[str, set[str]]:
+    """Return sitemap URLs per domain, probing only domains not cached.
+
+    With `refresh`, cached results are ignored and overwritten.
     """
-    headers = {
-        "Accept": "application/xml,text/xml;q=0.9,*/*;q=0.8",
-        "User-Agent": "Mozilla/5.0 (compatible; KurdishTextDataCollector/1.0)",
-    }
-    try:
-        response = requests.get(
-            url=url, timeout=10, headers=headers, allow_redirects=True
+    urls = list(urls)
+    cache = _open_cache()
+    results: dict[str, set[str]] = {}
+    if cache is not None and not refresh:
+        for url in urls:
+            cached = cache.get(url)
+            if cached is not None:
+                results[url] = cached
+
+    missing = [url for url in urls if url not in results]
+    if missing:
+        max_domains = min(len(missing), SITEMAP_DISCOVERY_MAX_DOMAINS)
+        with SitemapDiscovery(max_domains=max_domains) as discovery:
+            discovered = discovery.discover_many(missing)
+        logger.info(
+            "Sitemap discovery probed %d domain(s), transferred %d bytes",
+            len(missing),
+            discovery.bytes_transferred,
         )
-    except RequestException:
-        return None
+        results.update(discovered)
+        if cache is not None:
+            for url, sitemap_urls in discovered.items():
+                cache.set(url, sitemap_urls)
+            cache.save()
+    return results
 
-    if response.status_code != 200:
-        return None
 
-    if not _is_sitemap_response(response):
+def get_sitemap_urls(url: str, refresh: bool = False) -> set[str]:
+    return discover_sitemap_urls([url], refresh=refresh)[url]
+
+
+def _open_cache() -> Optional[DiscoveryCache]:
+    if not SITEMAP_DISCOVERY_CACHE_PATH:
         return None
+    return DiscoveryCache(
+        SITEMAP_DISCOVERY_CACHE_PATH,
+        ttl=SITEMAP_DISCOVERY_CACHE_TTL,
+        negative_ttl=SITEMAP_DISCOVERY_CACHE_NEGATIVE_TTL,
+    )
 
-    return response.url
 
+def _is_same_domain(base_url: str, candidate_url: str) -> bool:
+    base_host = (urlparse(base_url).hostname or "").lower().removeprefix("www.")
+    candidate_host = (urlparse(candidate_url).hostname or "").lower().removeprefix(
+        "www."
+    )
+    return base_host == candidate_host
 
-def _is_sitemap_response(response: Response) -> bool:
-    content_type = (response.headers.get("Content-Type", "") or "").lower()
-    response_url = (getattr(response, "url", "") or "").lower()
 
-    preview_bytes = (getattr(response, "content", b"") or b"")[:8192]
-    if preview_bytes.startswith(b"\x1f\x8b"):
-        try:
-            with gzip.GzipFile(
-                fileobj=io.BytesIO(getattr(response, "content", b"") or b"")
-            ) as gz:
-                preview_bytes = gz.read(8192)
-        except OSError:
-            preview_bytes = b""
+def _read_preview(response: Response) -> bytes:
+    """Read at most `PREVIEW_BYTES` of the (decompressed) body."""
+    preview = b""
+    decompressor = None
+    for chunk in response.iter_content(chunk_size=PREVIEW_BYTES):
+        if decompressor is None and not preview and chunk.startswith(GZIP_MAGIC):
+            # .xml.gz files are gzip data themselves, not a Content-Encoding
+            # that requests already undid, so inflate them incrementally.
+            decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        if decompressor is not None:
+            try:
+                chunk = decompressor.decompress(chunk, PREVIEW_BYTES - len(preview))
+            except zlib.error:
+                return b""
+        preview += chunk
+        if len(preview) >= PREVIEW_BYTES:
+            break
+    return preview[:PREVIEW_BYTES]
+
+
+def _is_sitemap_preview(preview_bytes: bytes, content_type: str, url: str) -> bool:
+    content_type = (content_type or "").lower()
+    response_url = (url or "").lower()
 
     body_preview = preview_bytes.decode("utf-8", errors="ignore").lstrip().lower()
     has_sitemap_root_tag = "<urlset" in body_preview or "<sitemapindex" in body_preview
@@ -118,4 +333,3 @@ def _is_sitemap_response(response: Response) -> bool:
         or content_type == ""
     )
     return looks_like_sitemap_url and looks_like_xmlish
-
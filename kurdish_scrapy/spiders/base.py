@@ -1,14 +1,61 @@
 import scrapy
-from typing import Optional
+import time
+from pathlib import Path
+from typing import Any, Optional
 from urllib.parse import urlparse
 
+from scrapy.utils.defer import maybe_deferred_to_future
+
+from extractor import prefilter
 from extractor.protocol import ContentExtractorProtocol
+from kurdish_scrapy import instrumentation
+
+
+class ContentExtractionMixin:
+    content_extractor: Optional[ContentExtractorProtocol]
 
+    async def extract_content(self, response) -> Any:
+        domain = instrumentation.spider_domain(self)
+        if self.settings.getbool("PREFILTER_ENABLED"):
+            with instrumentation.timed(instrumentation.STAGE_PREFILTER, domain):
+                reason = prefilter.skip_reason(
+                    response.body,
+                    response.encoding,
+                    self.settings.getint("TEXT_MIN_WORD_COUNT"),
+                )
+            if reason:
+                self.logger.debug("Prefilter skipped %s (%s)", response.url, reason)
+                self.crawler.stats.inc_value(f"prefilter/skipped/{reason}")
+                instrumentation.count(
+                    instrumentation.COUNTER_PREFILTER_SKIPPED, domain, reason
+                )
+                return None
 
-class BaseSpider(scrapy.Spider):
+        # Extractors backed by a process pool return a Deferred so that
+        # trafilatura does not block the reactor while parsing.
+        extract_deferred = getattr(self.content_extractor, "extract_deferred", None)
+        if extract_deferred is None:
+            with instrumentation.timed(instrumentation.STAGE_EXTRACT, domain):
+                result = self.content_extractor.extract(response.text, response.url)
+        else:
+            start = time.perf_counter()
+            result, extract_seconds = await maybe_deferred_to_future(
+                extract_deferred(response.text, response.url)
+            )
+            waited = time.perf_counter() - start - extract_seconds
+            instrumentation.observe(instrumentation.STAGE_EXTRACT, domain, extract_seconds)
+            instrumentation.observe(
+                instrumentation.STAGE_EXTRACT_WAIT, domain, max(waited, 0.0)
+            )
+        if not result:
+            instrumentation.count(instrumentation.COUNTER_EXTRACTION_EMPTY, domain)
+        return result
+
+
+class BaseSpider(ContentExtractionMixin, scrapy.Spider):
     custom_settings = {
         "DEPTH_LIMIT": 0,  # 0 = no depth limit (crawl entire site)
-        "DUPEFILTER_CLASS": "scrapy.dupefilters.RFPDupeFilter",  # default, filters duplicates
+        "DUPEFILTER_CLASS": "kurdish_scrapy.dupefilters.DiskDupeFilter",  # seen-set on disk under JOBDIR
     }
 
     def __init__(
@@ -23,6 +70,20 @@ class BaseSpider(scrapy.Spider):
         self.content_extractor = content_extractor
         self.start_urls = [url]
 
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super().from_crawler(crawler, *args, **kwargs)
+        # Settings are still mutable here. Give each domain its own JOBDIR so
+        # the request queue and seen-set live on disk and survive a restart.
+        state_dir = crawler.settings.get("CRAWL_STATE_DIR")
+        if state_dir and not crawler.settings.get("JOBDIR"):
+            crawler.settings.set(
+                "JOBDIR",
+                str(Path(state_dir, spider.name, spider.allowed_domains[0])),
+                priority="spider",
+            )
+        return spider
+
     def get_domain(self, url):
         parsed = urlparse(url)
         return parsed.netloc
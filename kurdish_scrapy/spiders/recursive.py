@@ -1,31 +1,72 @@
 import scrapy
+from scrapy import signals
 
 from extractor.url_extractor import UrlExtractor
+from extractor.url_scorer import UrlScorer
+from kurdish_scrapy import instrumentation
 from kurdish_scrapy.spiders.base import BaseSpider
 
 
 class RecursiveSpider(BaseSpider):
     name = "recursive_spider"
 
-    def parse(self, response):
+    url_scorer = None
+
+    async def parse(self, response):
         self.logger.debug("Processing %s", response.url)
         if not UrlExtractor.content_type(response):
             self.logger.debug("Skipped non-HTML response: %s", response.url)
             return
 
-        result = self.content_extractor.extract(response.text, response.url)
+        result = await self.extract_content(response)
+        url_scorer = self.get_url_scorer()
         if result:
             self.logger.debug("Yielding article item: %s", response.url)
             yield result
         else:
             self.logger.debug("Extraction returned None: %s", response.url)
+            if url_scorer is not None:
+                url_scorer.record(response.url, False)
 
         # Follow internal links recursively when enabled.
         url_extractor = UrlExtractor()
-        current_page_contained_urls = url_extractor.extract(response)
+        with instrumentation.timed(
+            instrumentation.STAGE_URL_EXTRACT, instrumentation.spider_domain(self)
+        ):
+            current_page_contained_urls = url_extractor.extract(response)
         for current_page_contained_url in current_page_contained_urls:
             yield scrapy.Request(
                 current_page_contained_url,
                 callback=self.parse,
                 dont_filter=False,
+                priority=(
+                    url_scorer.score(current_page_contained_url)
+                    if url_scorer is not None
+                    else 0
+                ),
             )
+
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super().from_crawler(crawler, *args, **kwargs)
+        if crawler.settings.getbool("URL_PRIORITY_ENABLED"):
+            # A page yields only if its item survives the pipelines, so pages
+            # with an item are recorded once the pipelines have decided.
+            crawler.signals.connect(spider._item_scraped, signal=signals.item_scraped)
+            crawler.signals.connect(spider._item_dropped, signal=signals.item_dropped)
+        return spider
+
+    def _item_scraped(self, item, response, spider):
+        self.get_url_scorer().record(response.url, True)
+
+    def _item_dropped(self, item, response, exception, spider):
+        self.get_url_scorer().record(response.url, False)
+
+    def get_url_scorer(self):
+        if self.url_scorer is None and self.settings.getbool("URL_PRIORITY_ENABLED"):
+            # spider.state is saved in JOBDIR, so a resumed crawl keeps the
+            # yield history of each path prefix.
+            state = getattr(self, "state", None)
+            history = state.setdefault("url_prefix_yield", {}) if state is not None else None
+            self.url_scorer = UrlScorer(history)
+        return self.url_scorer
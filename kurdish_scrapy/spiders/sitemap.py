@@ -5,28 +5,99 @@ from scrapy.spiders import SitemapSpider as BaseSitemapSpider
 
 from extractor.url_extractor import UrlExtractor
 from kurdish_scrapy import sitemap_discovery
+from kurdish_scrapy.crawl_ledger import (
+    KIND_ARTICLE,
+    KIND_SITEMAP,
+    close_ledger,
+    open_ledger,
+)
+from kurdish_scrapy.spiders.base import ContentExtractionMixin
 
 SITEMAP_REGEX = re.compile(r"Sitemap:\s([^\r\n#]*)", re.MULTILINE)
 
 
-class SitemapSpider(BaseSitemapSpider):
+class SitemapSpider(ContentExtractionMixin, BaseSitemapSpider):
     name = "sitemap_spider"
 
     def __init__(self, content_extractor, sitemap_urls, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.content_extractor = content_extractor
         self.sitemap_urls = sitemap_urls
+        self.ledger_path = None
+        self.crawl_ledger = None
+        self._pending_article_lastmods: dict[str, str] = {}
+        self._pending_sitemap_lastmods: dict[str, str] = {}
 
-    def parse(self, response):
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super().from_crawler(crawler, *args, **kwargs)
+        spider.ledger_path = crawler.settings.get("SITEMAP_LEDGER_PATH")
+        if spider.ledger_path:
+            spider.crawl_ledger = open_ledger(spider.ledger_path)
+        return spider
+
+    def sitemap_filter(self, entries):
+        if self.crawl_ledger is None:
+            yield from entries
+            return
+
+        # Scrapy passes the parsed Sitemap, whose type tells index from urlset.
+        is_index = getattr(entries, "type", None) == "sitemapindex"
+        kind = KIND_SITEMAP if is_index else KIND_ARTICLE
+        for entry in entries:
+            loc = entry["loc"]
+            lastmod = entry.get("lastmod")
+            if self.crawl_ledger.is_unchanged(loc, lastmod):
+                self.crawler.stats.inc_value(f"ledger/unchanged/{kind}")
+                continue
+            if lastmod:
+                if is_index:
+                    self._pending_sitemap_lastmods[loc] = lastmod
+                else:
+                    self._pending_article_lastmods[loc] = lastmod
+            yield entry
+
+    async def parse(self, response):
         self.logger.debug("Processing %s", response.url)
+        self._record_article(response)
         if not UrlExtractor.content_type(response):
             self.logger.debug("Skipped non-HTML response: %s", response.url)
             return
 
-        result = self.content_extractor.extract(response.text, response.url)
+        result = await self.extract_content(response)
         if result:
             yield result
 
+    def closed(self, reason):
+        if self.crawl_ledger is None:
+            return
+        # Child sitemaps are only marked as done after a complete run, so an
+        # interrupted crawl does not skip the articles it never reached.
+        if reason == "finished":
+            self.crawl_ledger.record_many(self._pending_sitemap_lastmods, KIND_SITEMAP)
+        close_ledger(self.ledger_path)
+
+    def _record_article(self, response):
+        if self.crawl_ledger is None:
+            return
+        # Record the URL as the sitemap lists it, before canonicalization
+        # and redirects.
+        url = response.meta.get(
+            "canonicalized_from", response.meta.get("redirect_urls", [response.url])[0]
+        )
+        self.crawl_ledger.record(
+            url,
+            KIND_ARTICLE,
+            lastmod=self._pending_article_lastmods.pop(url, None),
+            etag=self._header(response, b"ETag"),
+            last_modified=self._header(response, b"Last-Modified"),
+        )
+
+    @staticmethod
+    def _header(response, name):
+        value = response.headers.get(name)
+        return value.decode("latin-1") if value else None
+
     @classmethod
-    def get_sitemap_urls(cls, url):
-        return sitemap_discovery.get_sitemap_urls(url)
+    def get_sitemap_urls(cls, url, refresh=False):
+        return sitemap_discovery.get_sitemap_urls(url, refresh=refresh)
@@ -0,0 +1,75 @@
+"""JSON state files shared by concurrent crawler processes.
+
+Discovery shards, crawlers and the user agent refresh all rewrite small
+JSON files next to each other. `update_json` serializes the
+read-merge-write of one file under a lock file and writes through a unique
+temporary file, so no writer loses another's entries or renames a file
+another writer is still filling.
+"""
+
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Union
+
+try:
+    import fcntl
+except ImportError:  # Windows: writes stay atomic, but are not merged under a lock
+    fcntl = None
+
+
+@contextmanager
+def locked(path: Path):
+    """Hold an exclusive lock on `<path>.lock` for the block."""
+    if fcntl is None:
+        yield
+        return
+    with open(path.with_name(path.name + ".lock"), "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def read_json(path: Path, default: Any) -> Any:
+    try:
+        return json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return default
+
+
+def write_json(path: Path, data: Any, **dump_kwargs) -> None:
+    """Replace `path` with `data` without a reader ever seeing a partial file."""
+    with tempfile.NamedTemporaryFile(
+        "w",
+        encoding="utf-8",
+        dir=path.parent,
+        prefix=path.name + ".",
+        suffix=".tmp",
+        delete=False,
+    ) as tmp_file:
+        json.dump(data, tmp_file, **dump_kwargs)
+    try:
+        os.replace(tmp_file.name, path)
+    except OSError:
+        os.unlink(tmp_file.name)
+        raise
+
+
+def update_json(
+    path: Union[str, Path], merge: Callable[[Any], Any], default: Any = None, **dump_kwargs
+) -> Any:
+    """Rewrite `path` with `merge(current contents)` and return what was written.
+
+    The file is re-read under the lock, so `merge` sees every write that
+    finished before it and no concurrent update is lost.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with locked(path):
+        data = merge(read_json(path, default))
+        write_json(path, data, **dump_kwargs)
+    return data
@@ -0,0 +1,126 @@
+import logging
+import random
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+from urllib.parse import urlencode
+
+import requests
+from requests.exceptions import RequestException
+
+from kurdish_scrapy.state_files import read_json, update_json
+
+
+logger = logging.getLogger(__name__)
+
+# Used until the ScrapeOps list has been fetched once, and when no API key is set
+BUNDLED_USER_AGENTS = [
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/123.0.0.0 Safari/537.36 Edg/123.0.0.0",
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:125.0) Gecko/20100101 Firefox/125.0",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.4 Safari/605.1.15",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 14.4; rv:125.0) Gecko/20100101 Firefox/125.0",
+    "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Safari/537.36",
+    "Mozilla/5.0 (X11; Ubuntu; Linux x86_64; rv:125.0) Gecko/20100101 Firefox/125.0",
+    "Mozilla/5.0 (iPhone; CPU iPhone OS 17_4 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.4 Mobile/15E148 Safari/604.1",
+    "Mozilla/5.0 (Linux; Android 14; Pixel 8) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0.0.0 Mobile Safari/537.36",
+]
+
+
+class UserAgentPool:
+    """Process-wide list of user agents backed by a local cache file.
+
+    The list is read from `cache_path` (or the bundled list) on creation. If
+    an API key is configured and the cache is older than `max_age` seconds, a
+    daemon thread fetches a fresh list from ScrapeOps and swaps it in, so no
+    crawler ever waits on the network.
+    """
+
+    def __init__(
+        self,
+        cache_path: str,
+        max_age: float,
+        endpoint: str,
+        api_key: Optional[str],
+        num_results: Optional[int] = None,
+    ):
+        self.cache_path = Path(cache_path) if cache_path else None
+        self.max_age = max_age
+        self.endpoint = endpoint
+        self.api_key = api_key
+        self.num_results = num_results
+        self.user_agents = self._load_cache() or list(BUNDLED_USER_AGENTS)
+        self._refresh_thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def get_random_user_agent(self) -> str:
+        return random.choice(self.user_agents)
+
+    def refresh_in_background(self) -> None:
+        if not self.api_key or not self._is_stale():
+            return
+        with self._lock:
+            if self._refresh_thread is not None and self._refresh_thread.is_alive():
+                return
+            self._refresh_thread = threading.Thread(
+                target=self._refresh, name="user-agent-refresh", daemon=True
+            )
+            self._refresh_thread.start()
+
+    def _is_stale(self) -> bool:
+        if self.cache_path is None or not self.cache_path.exists():
+            return True
+        return time.time() - self.cache_path.stat().st_mtime > self.max_age
+
+    def _load_cache(self) -> list[str]:
+        if self.cache_path is None:
+            return []
+        user_agents = read_json(self.cache_path, [])
+        return [ua for ua in user_agents if isinstance(ua, str) and ua]
+
+    def _refresh(self) -> None:
+        payload = {"api_key": self.api_key}
+        if self.num_results is not None:
+            payload["num_results"] = self.num_results
+        try:
+            response = requests.get(self.endpoint, params=urlencode(payload), timeout=10)
+            user_agents = response.json().get("result", [])
+        except (RequestException, ValueError) as e:
+            logger.warning("Could not refresh user agents from ScrapeOps: %s", e)
+            return
+
+        if not user_agents:
+            logger.warning("ScrapeOps returned no user agents, keeping current list")
+            return
+
+        self.user_agents = user_agents
+        if self.cache_path is not None:
+            # The newest list wins; the lock only keeps processes refreshing
+            # at the same time from renaming over each other's temp file.
+            update_json(self.cache_path, lambda stored: user_agents, indent=2)
+        logger.info("Refreshed %d user agents from ScrapeOps", len(user_agents))
+
+
+_user_agent_pool: Optional[UserAgentPool] = None
+_user_agent_pool_lock = threading.Lock()
+
+
+def get_user_agent_pool(settings) -> UserAgentPool:
+    """Return the pool shared by every crawler in this process."""
+    global _user_agent_pool
+    with _user_agent_pool_lock:
+        if _user_agent_pool is None:
+            _user_agent_pool = UserAgentPool(
+                cache_path=settings.get("SCRAPEOPS_USER_AGENT_CACHE_PATH"),
+                max_age=settings.getfloat("SCRAPEOPS_USER_AGENT_CACHE_TTL"),
+                endpoint=settings.get(
+                    "SCRAPEOPS_FAKE_USER_AGENT_ENDPOINT",
+                    "http://headers.scrapeops.io/v1/user-agents?",
+                ),
+                api_key=settings.get("SCRAPEOPS_API_KEY"),
+                num_results=settings.get("SCRAPEOPS_NUM_RESULTS"),
+            )
+        _user_agent_pool.refresh_in_background()
+        return _user_agent_pool
@@ -0,0 +1,161 @@
+import sqlite3
+import time
+from pathlib import Path
+from typing import Iterable, Optional, Protocol
+
+
+class WorkQueueProtocol(Protocol):
+    """Shared queue of crawl work items leased to runners.
+
+    A claimed item is leased to one worker until its lease expires; the
+    worker renews the lease with `heartbeat` while it works on the item and
+    ends it with `complete`, `release` or `fail`. Items whose lease expired are handed
+    out again, so work held by a crashed runner is not lost. A worker whose
+    `heartbeat` fails has lost the item to another worker and must stop
+    working on it without ending the lease.
+    """
+
+    def add(self, items: Iterable[str]) -> int:
+        pass
+
+    def claim(self, worker_id: str, lease_seconds: float) -> Optional[str]:
+        pass
+
+    def heartbeat(self, worker_id: str, item: str, lease_seconds: float) -> bool:
+        pass
+
+    def complete(self, worker_id: str, item: str) -> None:
+        pass
+
+    def release(self, worker_id: str, item: str) -> None:
+        pass
+
+    def fail(self, worker_id: str, item: str) -> None:
+        pass
+
+
+STATUS_PENDING = "pending"
+STATUS_LEASED = "leased"
+STATUS_DONE = "done"
+# Failed or expired on each of its `max_attempts` leases
+STATUS_FAILED = "failed"
+
+
+class SqliteWorkQueue:
+    """Work queue in a SQLite file shared by runners on one machine.
+
+    Claims run in an immediate transaction, so concurrent runners never lease
+    the same item. Other backends (a database server, Redis) can implement
+    `WorkQueueProtocol` to share the queue across machines.
+    """
+
+    def __init__(self, path: str, max_attempts: int = 3):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.max_attempts = max_attempts
+        self.db = sqlite3.connect(path, timeout=30, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS work ("
+            "item TEXT PRIMARY KEY, status TEXT NOT NULL, lease_owner TEXT, "
+            "lease_expires REAL, attempts INTEGER NOT NULL DEFAULT 0, "
+            "updated_at REAL NOT NULL)"
+        )
+
+    def add(self, items: Iterable[str]) -> int:
+        """Add new items as pending, ignoring ones already queued or done."""
+        now = time.time()
+        with self._transaction():
+            cursor = self.db.executemany(
+                "INSERT OR IGNORE INTO work (item, status, updated_at) VALUES (?, ?, ?)",
+                [(item, STATUS_PENDING, now) for item in items],
+            )
+        return cursor.rowcount
+
+    def claim(self, worker_id: str, lease_seconds: float) -> Optional[str]:
+        now = time.time()
+        with self._transaction():
+            # An expired lease on the last attempt means its runner died on
+            # the item every time it was tried.
+            self.db.execute(
+                "UPDATE work SET status = ?, lease_owner = NULL, lease_expires = NULL, "
+                "updated_at = ? WHERE status = ? AND lease_expires < ? AND attempts >= ?",
+                (STATUS_FAILED, now, STATUS_LEASED, now, self.max_attempts),
+            )
+            row = self.db.execute(
+                "SELECT item FROM work WHERE attempts < ? AND (status = ? "
+                "OR (status = ? AND lease_expires < ?)) "
+                "ORDER BY attempts, rowid LIMIT 1",
+                (self.max_attempts, STATUS_PENDING, STATUS_LEASED, now),
+            ).fetchone()
+            if row is None:
+                return None
+            self.db.execute(
+                "UPDATE work SET status = ?, lease_owner = ?, lease_expires = ?, "
+                "attempts = attempts + 1, updated_at = ? WHERE item = ?",
+                (STATUS_LEASED, worker_id, now + lease_seconds, now, row[0]),
+            )
+        return row[0]
+
+    def heartbeat(self, worker_id: str, item: str, lease_seconds: float) -> bool:
+        """Extend a lease; False if the worker no longer holds it."""
+        now = time.time()
+        with self._transaction():
+            cursor = self.db.execute(
+                "UPDATE work SET lease_expires = ?, updated_at = ? "
+                "WHERE item = ? AND status = ? AND lease_owner = ?",
+                (now + lease_seconds, now, item, STATUS_LEASED, worker_id),
+            )
+        return cursor.rowcount == 1
+
+    def complete(self, worker_id: str, item: str) -> None:
+        self._end_lease(worker_id, item, STATUS_DONE)
+
+    def release(self, worker_id: str, item: str) -> None:
+        """Give an item back without counting the attempt (e.g. on shutdown)."""
+        self._end_lease(worker_id, item, STATUS_PENDING, attempt_delta=-1)
+
+    def fail(self, worker_id: str, item: str) -> None:
+        """Give an item back for a retry, or mark it failed after `max_attempts`."""
+        with self._transaction():
+            self.db.execute(
+                "UPDATE work SET status = CASE WHEN attempts >= ? THEN ? ELSE ? END, "
+                "lease_owner = NULL, lease_expires = NULL, updated_at = ? "
+                "WHERE item = ? AND lease_owner = ?",
+                (
+                    self.max_attempts,
+                    STATUS_FAILED,
+                    STATUS_PENDING,
+                    time.time(),
+                    item,
+                    worker_id,
+                ),
+            )
+
+    def counts(self) -> dict[str, int]:
+        rows = self.db.execute("SELECT status, COUNT(*) FROM work GROUP BY status")
+        return dict(rows.fetchall())
+
+    def _end_lease(
+        self, worker_id: str, item: str, status: str, attempt_delta: int = 0
+    ) -> None:
+        with self._transaction():
+            self.db.execute(
+                "UPDATE work SET status = ?, lease_owner = NULL, lease_expires = NULL, "
+                "attempts = MAX(attempts + ?, 0), updated_at = ? "
+                "WHERE item = ? AND lease_owner = ?",
+                (status, attempt_delta, time.time(), item, worker_id),
+            )
+
+    def _transaction(self):
+        return _ImmediateTransaction(self.db)
+
+
+class _ImmediateTransaction:
+    def __init__(self, db: sqlite3.Connection):
+        self.db = db
+
+    def __enter__(self):
+        self.db.execute("BEGIN IMMEDIATE")
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.db.execute("ROLLBACK" if exc_type else "COMMIT")
@@ -1,12 +1,16 @@
 import argparse
 import json
 import logging
+import os
+import socket
 import sys
 from datetime import datetime
 from pathlib import Path
 
 from extractor.text_extractor import ArticleExtractor
-from run_crawler import run_crawler
+from kurdish_scrapy.work_queue import SqliteWorkQueue
+from run_crawler import run_crawler, run_queue_crawler
+from shard_runner import run_sharded
 
 
 def parse_args() -> argparse.Namespace:
@@ -17,7 +21,7 @@ def parse_args() -> argparse.Namespace:
         "-o",
         "--output",
         required=True,
-        help="Output file path (supported: .csv, .json, .jsonl)",
+        help="Output file path (supported: .csv, .json, .jsonl, .parquet, .jsonl.gz, .jsonl.zst)",
     )
     parser.add_argument(
         "--log-file",
@@ -30,6 +34,26 @@ def parse_args() -> argparse.Namespace:
         choices=["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"],
         help="Logging verbosity",
     )
+    parser.add_argument(
+        "--refresh-sitemaps",
+        action="store_true",
+        help="Ignore cached sitemap discovery results and probe every domain again",
+    )
+    parser.add_argument(
+        "--shards",
+        type=int,
+        default=1,
+        help="Split domains across this many crawler processes, each with its own output and log shard",
+    )
+    parser.add_argument(
+        "--queue",
+        help="SQLite work queue shared with other runners; domains are leased from it instead of all being crawled here",
+    )
+    parser.add_argument(
+        "--worker-id",
+        default=f"{socket.gethostname()}-{os.getpid()}",
+        help="Name of this runner in the work queue",
+    )
     return parser.parse_args()
 
 
@@ -77,13 +101,43 @@ def main():
         args.log_file,
     )
     try:
-        run_crawler(
-            output_path=args.output,
-            content_extractor=ArticleExtractor(),
-            urls_to_crawl=urls_to_crawl,
-            log_file=args.log_file,
-            log_level=args.log_level,
-        )
+        if args.queue:
+            work_queue = SqliteWorkQueue(args.queue)
+            added = work_queue.add(sorted(urls_to_crawl))
+            logger.info(
+                "Added %d new domain(s) to work queue %s as %s",
+                added,
+                args.queue,
+                args.worker_id,
+            )
+            run_queue_crawler(
+                output_path=args.output,
+                content_extractor=ArticleExtractor(),
+                work_queue=work_queue,
+                worker_id=args.worker_id,
+                log_file=args.log_file,
+                log_level=args.log_level,
+                refresh_sitemaps=args.refresh_sitemaps,
+            )
+        elif args.shards > 1:
+            run_sharded(
+                output_path=args.output,
+                content_extractor=ArticleExtractor(),
+                urls_to_crawl=urls_to_crawl,
+                shard_count=args.shards,
+                log_file=args.log_file,
+                log_level=args.log_level,
+                refresh_sitemaps=args.refresh_sitemaps,
+            )
+        else:
+            run_crawler(
+                output_path=args.output,
+                content_extractor=ArticleExtractor(),
+                urls_to_crawl=urls_to_crawl,
+                log_file=args.log_file,
+                log_level=args.log_level,
+                refresh_sitemaps=args.refresh_sitemaps,
+            )
     except Exception:
         logger.exception("Crawler run failed")
         raise
@@ -1,26 +1,270 @@
+"""Corpus statistics for crawler output, computed in one streaming pass.
+
+Reads csv, json, jsonl, compressed jsonl shards (.gz/.zst) and parquet files
+without loading them into memory. Unique titles, URLs and texts are counted
+with HyperLogLog sketches (or exact hash sets with --exact), and files are
+read in parallel worker processes whose results are merged.
+"""
+
 import argparse
+import csv
+import glob
+import gzip
+import hashlib
+import io
+import json
+import math
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterator
+
+UNIQUE_FIELDS = ("title", "url", "text")
+# Lower bounds of the word count histogram buckets
+WORD_COUNT_BUCKETS = (0, 50, 100, 200, 500, 1000, 2000, 5000)
+# Characters between the items of a JSON array export
+JSON_SEPARATORS = frozenset("[], \t\r\n")
+
+_JSON_DECODER = json.JSONDecoder()
+
+
+def _hash64(value: str) -> int:
+    digest = hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big")
+
+
+class HyperLogLog:
+    """Cardinality sketch with 2**precision registers (~1.04/sqrt(m) error)."""
+
+    def __init__(self, precision: int = 14):
+        self.precision = precision
+        self.registers = bytearray(1 << precision)
+
+    def add(self, value: str) -> None:
+        hashed = _hash64(value)
+        index = hashed >> (64 - self.precision)
+        rest_bits = 64 - self.precision
+        rank = rest_bits - (hashed & ((1 << rest_bits) - 1)).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other: "HyperLogLog") -> None:
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+    def count(self) -> int:
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -register for register in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)  # linear counting for small sets
+        return round(estimate)
+
+
+class ExactCounter:
+    """Exact distinct count over 64-bit hashes of the values."""
+
+    def __init__(self):
+        self.hashes: set[int] = set()
+
+    def add(self, value: str) -> None:
+        self.hashes.add(_hash64(value))
+
+    def merge(self, other: "ExactCounter") -> None:
+        self.hashes |= other.hashes
+
+    def count(self) -> int:
+        return len(self.hashes)
+
+
+class CorpusStats:
+    def __init__(self, exact: bool = False):
+        self.files = 0
+        self.rows = 0
+        self.unique = {
+            field: ExactCounter() if exact else HyperLogLog() for field in UNIQUE_FIELDS
+        }
+        self.publisher_rows: Counter = Counter()
+        self.publisher_words: Counter = Counter()
+        self.lang_rows: Counter = Counter()
+        self.lang_words: Counter = Counter()
+        self.word_count_histogram: Counter = Counter()
+
+    def add(self, row: dict) -> None:
+        self.rows += 1
+        for field in UNIQUE_FIELDS:
+            value = row.get(field)
+            if value:
+                self.unique[field].add(str(value))
+
+        word_count = _word_count(row)
+        publisher = row.get("publisher") or "<none>"
+        lang = row.get("lang") or "<none>"
+        self.publisher_rows[publisher] += 1
+        self.publisher_words[publisher] += word_count
+        self.lang_rows[lang] += 1
+        self.lang_words[lang] += word_count
+        self.word_count_histogram[_bucket(word_count)] += 1
+
+    def merge(self, other: "CorpusStats") -> None:
+        self.files += other.files
+        self.rows += other.rows
+        for field in UNIQUE_FIELDS:
+            self.unique[field].merge(other.unique[field])
+        self.publisher_rows.update(other.publisher_rows)
+        self.publisher_words.update(other.publisher_words)
+        self.lang_rows.update(other.lang_rows)
+        self.lang_words.update(other.lang_words)
+        self.word_count_histogram.update(other.word_count_histogram)
+
+
+def _word_count(row: dict) -> int:
+    try:
+        return int(row["word_count"])
+    except (KeyError, TypeError, ValueError):
+        return len(str(row.get("text") or "").split())
+
+
+def _bucket(word_count: int) -> int:
+    for lower in reversed(WORD_COUNT_BUCKETS):
+        if word_count >= lower:
+            return lower
+    return 0
+
+
+def _open_text(path: str):
+    lowered = path.lower()
+    if lowered.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", newline="")
+    if lowered.endswith(".zst"):
+        import zstandard
+
+        raw = open(path, "rb")
+        reader = zstandard.ZstdDecompressor().stream_reader(raw, closefd=True)
+        return io.TextIOWrapper(reader, encoding="utf-8", newline="")
+    return open(path, encoding="utf-8", newline="")
+
+
+def _json_line_items(line: str) -> Iterator[dict]:
+    """Items on one line of a .jsonl file or of Scrapy's .json export.
+
+    The .json export puts one item per line inside "[" ... "]", and runs
+    appended to the same file leave lines like "][" between the arrays, so
+    the brackets and commas around items are skipped.
+    """
+    position = 0
+    while True:
+        while position < len(line) and line[position] in JSON_SEPARATORS:
+            position += 1
+        if position == len(line):
+            return
+        item, position = _JSON_DECODER.raw_decode(line, position)
+        yield item
+
+
+def iter_rows(path: str, batch_size: int = 10_000) -> Iterator[dict]:
+    lowered = path.lower()
+    if lowered.endswith(".parquet"):
+        import pyarrow.parquet as pq
+
+        parquet_file = pq.ParquetFile(path)
+        for batch in parquet_file.iter_batches(batch_size=batch_size):
+            yield from batch.to_pylist()
+        return
+
+    base = lowered.removesuffix(".gz").removesuffix(".zst")
+    with _open_text(path) as text_file:
+        if base.endswith(".csv"):
+            csv.field_size_limit(2**31 - 1)
+            yield from csv.DictReader(text_file)
+        elif base.endswith(".jsonl") or base.endswith(".json"):
+            for line in text_file:
+                yield from _json_line_items(line)
+        else:
+            raise ValueError(f"Unsupported file type: {path}")
+
+
+def count_file(path: str, exact: bool = False) -> CorpusStats:
+    stats = CorpusStats(exact=exact)
+    stats.files = 1
+    for row in iter_rows(path):
+        stats.add(row)
+    return stats
+
+
+def count_files(paths: list[str], workers: int, exact: bool = False) -> CorpusStats:
+    total = CorpusStats(exact=exact)
+    if workers <= 1 or len(paths) == 1:
+        for path in paths:
+            total.merge(count_file(path, exact))
+        return total
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for stats in executor.map(count_file, paths, [exact] * len(paths)):
+            total.merge(stats)
+    return total
+
+
+def print_report(stats: CorpusStats, exact: bool, top: int) -> None:
+    approx = "" if exact else " (approx.)"
+    print(f"Files read: {stats.files}")
+    print(f"The files contain {stats.rows} rows (excluding headers).")
+    for field in UNIQUE_FIELDS:
+        print(f"Number of unique {field}s{approx}: {stats.unique[field].count()}")
 
-import pandas as pd
+    _print_breakdown("publisher", stats.publisher_rows, stats.publisher_words, top)
+    _print_breakdown("lang", stats.lang_rows, stats.lang_words, top)
 
-parser = argparse.ArgumentParser(
-    description="Count the number of rows in a CSV file using pandas."
-)
+    print("\nWord count histogram:")
+    largest = max(stats.word_count_histogram.values(), default=0)
+    for lower, upper in zip(WORD_COUNT_BUCKETS, [*WORD_COUNT_BUCKETS[1:], None]):
+        rows = stats.word_count_histogram.get(lower, 0)
+        label = f"{lower}-{upper - 1}" if upper else f"{lower}+"
+        bar = "#" * round(40 * rows / largest) if largest else ""
+        print(f"  {label:>10} {rows:>10} {bar}")
 
-parser.add_argument(
-    "--file-name",
-    type=str,
-    required=True,
-    help="File name",
-)
 
-args = parser.parse_args()
+def _print_breakdown(name: str, rows: Counter, words: Counter, top: int) -> None:
+    print(f"\nRows by {name} (top {top} of {len(rows)}):")
+    for key, count in rows.most_common(top):
+        print(f"  {key:<40} {count:>10} rows {words[key]:>14} words")
 
 
-df = pd.read_csv(args.file_name)
-print(f"The CSV file contains {len(df)} rows (excluding header).")
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Count rows, unique values and breakdowns of crawler output files."
+    )
+    parser.add_argument(
+        "--file-name",
+        type=str,
+        nargs="+",
+        required=True,
+        help="Output files or glob patterns (.csv, .json, .jsonl, .jsonl.gz, .jsonl.zst, .parquet)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=4,
+        help="Files read in parallel",
+    )
+    parser.add_argument(
+        "--exact",
+        action="store_true",
+        help="Count unique values exactly with hash sets instead of HyperLogLog",
+    )
+    parser.add_argument(
+        "--top",
+        type=int,
+        default=20,
+        help="Publishers and languages listed in the breakdowns",
+    )
+    args = parser.parse_args()
 
+    paths = sorted({path for pattern in args.file_name for path in glob.glob(pattern)})
+    if not paths:
+        parser.error("No files match --file-name")
+    stats = count_files(paths, args.workers, args.exact)
+    print_report(stats, args.exact, args.top)
 
-for unique_field in ("title", "url", "text"):
-    unique_field_count = df[unique_field].nunique()
 
-    print(f"Number of unique {unique_field}s: {unique_field_count}")
+if __name__ == "__main__":
+    main()
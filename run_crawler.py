@@ -1,12 +1,20 @@
 import logging
 from pathlib import Path
+from typing import Callable, Optional
 
-from scrapy.crawler import CrawlerProcess
+from scrapy.crawler import Crawler, CrawlerProcess
+from scrapy.settings import Settings
+from scrapy.utils.defer import deferred_from_coro
 from scrapy.utils.project import get_project_settings
+from scrapy.utils.reactor import install_reactor
 from twisted.python.failure import Failure
 
+from kurdish_scrapy import sitemap_discovery
+from kurdish_scrapy.finish_reasons import COMPLETED_FINISH_REASONS
 from kurdish_scrapy.spiders.recursive import RecursiveSpider
 from kurdish_scrapy.spiders.sitemap import SitemapSpider
+from kurdish_scrapy.work_queue import WorkQueueProtocol
+from extractor.process_pool import ProcessPoolExtractor
 from extractor.protocol import ContentExtractorProtocol
 
 
@@ -15,92 +23,345 @@ SUPPORTED_FEED_FORMATS = {
     ".json": "json",
     ".jsonl": "jsonlines",
 }
+# Written by the StreamingFeedExport extension instead of Scrapy's FEEDS
+STREAMING_FEED_FORMATS = {
+    ".parquet": "parquet",
+    ".jsonl.gz": "jsonlines_shards",
+    ".jsonl.zst": "jsonlines_shards",
+}
+
+# Finish reason of a domain whose work queue lease another runner took over
+FINISH_REASON_LEASE_LOST = "lease_lost"
 
 logger = logging.getLogger(__name__)
 
 
 def _infer_feed_format(output_path: str) -> str:
-    ext = Path(output_path).suffix.lower()
-    feed_format = SUPPORTED_FEED_FORMATS.get(ext)
+    suffixes = Path(output_path).suffixes
+    ext = "".join(suffixes[-2:]).lower() if len(suffixes) > 1 else ""
+    if ext not in STREAMING_FEED_FORMATS:
+        ext = Path(output_path).suffix.lower()
+    feed_format = SUPPORTED_FEED_FORMATS.get(ext) or STREAMING_FEED_FORMATS.get(ext)
     if not feed_format:
-        supported = ", ".join(SUPPORTED_FEED_FORMATS.keys())
+        supported = ", ".join([*SUPPORTED_FEED_FORMATS, *STREAMING_FEED_FORMATS])
         raise ValueError(
             f"Unsupported output extension '{ext}'. Use one of: {supported}"
         )
     return feed_format
 
 
+def _build_settings(output_path: str, log_file: str, log_level: str) -> Settings:
+    feed_format = _infer_feed_format(output_path)
+    settings = get_project_settings()
+    if feed_format in STREAMING_FEED_FORMATS.values():
+        settings.set(
+            "STREAMING_FEEDS",
+            {output_path: _streaming_feed_options(settings, feed_format)},
+            priority="cmdline",
+        )
+    else:
+        settings.set(
+            "FEEDS",
+            {
+                output_path: {
+                    "format": feed_format,
+                    "encoding": "utf-8",
+                    "overwrite": False,
+                }
+            },
+            priority="cmdline",
+        )
+    settings.set("LOG_ENABLED", True, priority="cmdline")
+    settings.set("LOG_FILE", log_file, priority="cmdline")
+    settings.set("LOG_LEVEL", log_level.upper(), priority="cmdline")
+    if not settings.get("INSTRUMENTATION_DUMP_PATH"):
+        # Next to the log, so each shard gets its own metrics file
+        settings.set(
+            "INSTRUMENTATION_DUMP_PATH",
+            str(Path(log_file).with_suffix(".prom")),
+            priority="cmdline",
+        )
+    if not settings.get("PROFILER_OUTPUT_DIR"):
+        settings.set(
+            "PROFILER_OUTPUT_DIR", str(Path(log_file).parent), priority="cmdline"
+        )
+    return settings
+
+
+def _streaming_feed_options(settings: Settings, feed_format: str) -> dict:
+    if feed_format == "parquet":
+        return {
+            "format": feed_format,
+            "row_group_size": settings.getint("FEED_PARQUET_ROW_GROUP_SIZE"),
+            "compression": settings.get("FEED_PARQUET_COMPRESSION"),
+        }
+    return {
+        "format": feed_format,
+        "max_bytes": settings.getint("FEED_SHARD_MAX_BYTES"),
+        "max_items": settings.getint("FEED_SHARD_MAX_ITEMS"),
+        "gzip_level": settings.getint("FEED_SHARD_GZIP_LEVEL"),
+    }
+
+
+def _wrap_content_extractor(
+    settings: Settings, content_extractor: ContentExtractorProtocol
+) -> ContentExtractorProtocol:
+    pool_workers = settings.getint("EXTRACTION_POOL_WORKERS")
+    if pool_workers > 0:
+        logger.info("Extracting content in %d worker process(es)", pool_workers)
+        return ProcessPoolExtractor(
+            content_extractor,
+            max_workers=pool_workers,
+            max_pending=settings.getint("EXTRACTION_POOL_MAX_PENDING"),
+        )
+    return content_extractor
+
+
+def _schedule_domain(
+    crawler_process: CrawlerProcess,
+    url_to_crawl: str,
+    sitemap_urls: set[str],
+    content_extractor: ContentExtractorProtocol,
+):
+    if sitemap_urls:
+        logger.info(
+            "Using sitemap spider for %s (%d sitemap URL candidates)",
+            url_to_crawl,
+            len(sitemap_urls),
+        )
+        crawler = crawler_process.create_crawler(SitemapSpider)
+        deferred = crawler_process.crawl(
+            crawler,
+            content_extractor=content_extractor,
+            sitemap_urls=sitemap_urls,
+        )
+    else:
+        logger.info("Using recursive spider for %s", url_to_crawl)
+        crawler = crawler_process.create_crawler(RecursiveSpider)
+        deferred = crawler_process.crawl(
+            crawler,
+            url=url_to_crawl,
+            content_extractor=content_extractor,
+        )
+    return crawler, deferred
+
+
+def _log_failure(failure: Failure, message: str, *args) -> None:
+    logger.error(
+        message,
+        *args,
+        failure.getErrorMessage(),
+        exc_info=(
+            failure.type,
+            failure.value,
+            failure.getTracebackObject(),
+        ),
+    )
+
+
 def run_crawler(
     output_path: str,
     content_extractor: ContentExtractorProtocol,
     urls_to_crawl: set[str],
     log_file: str = "logs/crawler.log",
     log_level: str = "INFO",
-) -> None:
-    feed_format = _infer_feed_format(output_path)
-    settings = get_project_settings()
-    settings.set(
-        "FEEDS",
-        {
-            output_path: {
-                "format": feed_format,
-                "encoding": "utf-8",
-                "overwrite": False,
-            }
-        },
-        priority="cmdline",
-    )
-    settings.set("LOG_ENABLED", True, priority="cmdline")
-    settings.set("LOG_FILE", log_file, priority="cmdline")
-    settings.set("LOG_LEVEL", log_level.upper(), priority="cmdline")
+    refresh_sitemaps: bool = False,
+    on_domain_finished: Optional[Callable[[str, dict], None]] = None,
+) -> dict[str, dict]:
+    """Crawl every domain in one CrawlerProcess and return stats per domain.
+
+    `on_domain_finished` is called with the domain and its crawl stats as soon
+    as a domain's crawl finishes normally or within its crawl budget.
+    """
+    settings = _build_settings(output_path, log_file, log_level)
+    content_extractor = _wrap_content_extractor(settings, content_extractor)
     crawler_process = CrawlerProcess(settings)
     crawl_failures: list[Failure] = []
 
     def _log_crawl_failure(failure: Failure) -> Failure:
         crawl_failures.append(failure)
-        logger.error(
-            "Crawler deferred failed: %s",
-            failure.getErrorMessage(),
-            exc_info=(
-                failure.type,
-                failure.value,
-                failure.getTracebackObject(),
-            ),
-        )
+        _log_failure(failure, "Crawler deferred failed: %s")
         return failure
 
+    logger.info("Discovering sitemaps for %d domain(s)", len(urls_to_crawl))
+    discovered_sitemap_urls = sitemap_discovery.discover_sitemap_urls(
+        urls_to_crawl, refresh=refresh_sitemaps
+    )
+
     logger.info("Scheduling spiders for %d domain(s)", len(urls_to_crawl))
+    domain_crawlers: dict[str, Crawler] = {}
     for url_to_crawl in urls_to_crawl:
-        sitemap_urls = SitemapSpider.get_sitemap_urls(url_to_crawl)
-        if sitemap_urls:
-            logger.info(
-                "Using sitemap spider for %s (%d sitemap URL candidates)",
-                url_to_crawl,
-                len(sitemap_urls),
-            )
-            deferred = crawler_process.crawl(
-                SitemapSpider,
-                content_extractor=content_extractor,
-                sitemap_urls=sitemap_urls,
-            )
-            deferred.addErrback(_log_crawl_failure)
-        else:
-            logger.info("Using recursive spider for %s", url_to_crawl)
-            deferred = crawler_process.crawl(
-                RecursiveSpider,
-                url=url_to_crawl,
-                content_extractor=content_extractor,
+        crawler, deferred = _schedule_domain(
+            crawler_process,
+            url_to_crawl,
+            discovered_sitemap_urls[url_to_crawl],
+            content_extractor,
+        )
+        domain_crawlers[url_to_crawl] = crawler
+        if on_domain_finished is not None:
+            deferred.addCallback(
+                _notify_domain_finished, url_to_crawl, crawler, on_domain_finished
             )
-            deferred.addErrback(_log_crawl_failure)
+        deferred.addErrback(_log_crawl_failure)
 
     try:
         crawler_process.start()
     except Exception as e:
         logger.exception(f"Crawler process crashed: {e}")
         raise
+    finally:
+        if isinstance(content_extractor, ProcessPoolExtractor):
+            content_extractor.shutdown()
 
     if crawl_failures:
         logger.error("Crawler finished with %d deferred failure(s)", len(crawl_failures))
         raise RuntimeError(
             f"Crawler finished with {len(crawl_failures)} deferred failure(s)."
         )
+
+    return {
+        url: crawler.stats.get_stats() for url, crawler in domain_crawlers.items()
+    }
+
+
+def run_queue_crawler(
+    output_path: str,
+    content_extractor: ContentExtractorProtocol,
+    work_queue: WorkQueueProtocol,
+    worker_id: str,
+    log_file: str = "logs/crawler.log",
+    log_level: str = "INFO",
+    refresh_sitemaps: bool = False,
+    max_active_domains: int = 8,
+    lease_seconds: float = 600,
+) -> dict[str, dict]:
+    """Crawl domains leased from a shared work queue until it is drained.
+
+    Up to `max_active_domains` domains are crawled at once. Their leases are
+    renewed every `lease_seconds / 3`. A domain is marked complete when its
+    crawl finishes normally and handed back to the queue otherwise; leases of
+    a runner that dies expire and other runners take the domains over.
+    """
+    settings = _build_settings(output_path, log_file, log_level)
+    content_extractor = _wrap_content_extractor(settings, content_extractor)
+    crawler_process = CrawlerProcess(settings)
+
+    # Crawlers are only created once work is claimed, so install the
+    # configured reactor before the first import of twisted's default one.
+    install_reactor(settings["TWISTED_REACTOR"], settings["ASYNCIO_EVENT_LOOP"])
+    from twisted.internet import reactor, task, threads
+
+    active: set[str] = set()
+    crawlers: dict[str, Crawler] = {}
+    # Domains whose lease another runner took over; their outcome is not ours
+    lost: set[str] = set()
+    domain_stats: dict[str, dict] = {}
+    state = {"stopping": False}
+
+    def _claim_more() -> None:
+        while not state["stopping"] and len(active) < max_active_domains:
+            url_to_crawl = work_queue.claim(worker_id, lease_seconds)
+            if url_to_crawl is None:
+                break
+            logger.info("Claimed %s from the work queue", url_to_crawl)
+            active.add(url_to_crawl)
+            deferred = threads.deferToThread(
+                sitemap_discovery.get_sitemap_urls,
+                url_to_crawl,
+                refresh=refresh_sitemaps,
+            )
+            deferred.addCallback(_start_domain, url_to_crawl)
+            deferred.addErrback(_domain_failed, url_to_crawl)
+
+        if not active and reactor.running:
+            logger.info("No more work for this runner, stopping")
+            if heartbeat.running:
+                heartbeat.stop()
+            reactor.stop()
+
+    def _start_domain(sitemap_urls: set[str], url_to_crawl: str):
+        if url_to_crawl in lost:
+            # Lost while its sitemaps were being discovered
+            _forget(url_to_crawl)
+            _claim_more()
+            return None
+        crawler, deferred = _schedule_domain(
+            crawler_process, url_to_crawl, sitemap_urls, content_extractor
+        )
+        crawlers[url_to_crawl] = crawler
+        deferred.addCallback(_domain_done, url_to_crawl, crawler)
+        return deferred
+
+    def _forget(url_to_crawl: str) -> None:
+        active.discard(url_to_crawl)
+        crawlers.pop(url_to_crawl, None)
+        lost.discard(url_to_crawl)
+
+    def _domain_done(_, url_to_crawl: str, crawler: Crawler) -> None:
+        stats = crawler.stats.get_stats()
+        domain_stats[url_to_crawl] = stats
+        was_lost = url_to_crawl in lost
+        _forget(url_to_crawl)
+        reason = stats.get("finish_reason")
+        if was_lost:
+            logger.info("Stopped crawling %s, another runner holds it now", url_to_crawl)
+        elif reason in COMPLETED_FINISH_REASONS:
+            work_queue.complete(worker_id, url_to_crawl)
+        elif reason == "shutdown":
+            work_queue.release(worker_id, url_to_crawl)
+            state["stopping"] = True
+        else:
+            work_queue.fail(worker_id, url_to_crawl)
+        _claim_more()
+
+    def _domain_failed(failure: Failure, url_to_crawl: str) -> None:
+        _log_failure(failure, "Crawl of %s failed: %s", url_to_crawl)
+        was_lost = url_to_crawl in lost
+        _forget(url_to_crawl)
+        if not was_lost:
+            work_queue.fail(worker_id, url_to_crawl)
+        _claim_more()
+
+    def _renew_leases() -> None:
+        for url_to_crawl in list(active):
+            if url_to_crawl in lost:
+                continue
+            if work_queue.heartbeat(worker_id, url_to_crawl, lease_seconds):
+                continue
+            # Another runner has claimed the domain; crawling on would
+            # write its items twice.
+            logger.warning("Lost the lease on %s, stopping its crawl", url_to_crawl)
+            lost.add(url_to_crawl)
+            crawler = crawlers.get(url_to_crawl)
+            if crawler is not None and crawler.engine is not None:
+                deferred_from_coro(
+                    crawler.engine.close_spider_async(reason=FINISH_REASON_LEASE_LOST)
+                ).addErrback(_log_failure, "Could not stop %s: %s", url_to_crawl)
+
+    heartbeat = task.LoopingCall(_renew_leases)
+    heartbeat.start(lease_seconds / 3, now=False)
+    reactor.callWhenRunning(_claim_more)
+    try:
+        crawler_process.start(stop_after_crawl=False)
+    except Exception as e:
+        logger.exception(f"Crawler process crashed: {e}")
+        raise
+    finally:
+        if isinstance(content_extractor, ProcessPoolExtractor):
+            content_extractor.shutdown()
+        for url_to_crawl in active - lost:
+            work_queue.release(worker_id, url_to_crawl)
+
+    return domain_stats
+
+
+def _notify_domain_finished(
+    result,
+    url: str,
+    crawler: Crawler,
+    on_domain_finished: Callable[[str, dict], None],
+):
+    stats = crawler.stats.get_stats()
+    if stats.get("finish_reason") in COMPLETED_FINISH_REASONS:
+        on_domain_finished(url, stats)
+    return result
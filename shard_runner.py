@@ -0,0 +1,200 @@
+import hashlib
+import json
+import logging
+import multiprocessing
+import time
+from datetime import datetime
+from pathlib import Path
+
+from extractor.protocol import ContentExtractorProtocol
+
+
+logger = logging.getLogger(__name__)
+
+# Seconds between checks of the worker processes
+SUPERVISE_INTERVAL = 5
+
+
+def shard_for(url: str, shard_count: int) -> int:
+    """Stable shard index of a domain URL, independent of PYTHONHASHSEED."""
+    digest = hashlib.sha1(url.encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % shard_count
+
+
+def shard_path(path: str, index: int) -> str:
+    """`output.jsonl` -> `output.shard-00.jsonl` (keeps multi-part suffixes)."""
+    file_path = Path(path)
+    stem, dot, extension = file_path.name.partition(".")
+    return str(file_path.with_name(f"{stem}.shard-{index:02d}{dot}{extension}"))
+
+
+def split_domains(urls_to_crawl: set[str], shard_count: int) -> list[set[str]]:
+    shards: list[set[str]] = [set() for _ in range(shard_count)]
+    for url in urls_to_crawl:
+        shards[shard_for(url, shard_count)].add(url)
+    return shards
+
+
+def run_sharded(
+    output_path: str,
+    content_extractor: ContentExtractorProtocol,
+    urls_to_crawl: set[str],
+    shard_count: int,
+    log_file: str = "logs/crawler.log",
+    log_level: str = "INFO",
+    refresh_sitemaps: bool = False,
+    max_restarts: int = 3,
+) -> dict:
+    """Crawl the domains in `shard_count` supervised worker processes.
+
+    Each worker runs `run_crawler` on its shard of the domains with its own
+    output file and log (`shard_path`). Domains whose crawl finished are
+    appended with their stats to `<output>.shard-NN.done.jsonl`, so a crashed
+    worker is restarted on the remaining domains only. When all workers are
+    done the stats of the finished domains are merged into
+    `<output>.stats.json`.
+    """
+    shards = split_domains(urls_to_crawl, shard_count)
+    for index in range(shard_count):
+        Path(_done_path(output_path, index)).unlink(missing_ok=True)
+    workers: dict[int, multiprocessing.Process] = {}
+    restarts = {index: 0 for index in range(shard_count)}
+    failed: list[int] = []
+    context = multiprocessing.get_context("spawn")
+
+    def _start(index: int) -> None:
+        done_path = _done_path(output_path, index)
+        remaining = shards[index] - set(_read_done(done_path))
+        if not remaining:
+            logger.info("Shard %d has no remaining domains", index)
+            return
+        process = context.Process(
+            target=_run_shard,
+            name=f"crawler-shard-{index:02d}",
+            args=(
+                shard_path(output_path, index),
+                content_extractor,
+                remaining,
+                shard_path(log_file, index),
+                log_level,
+                refresh_sitemaps,
+                done_path,
+            ),
+        )
+        process.start()
+        workers[index] = process
+        logger.info(
+            "Started shard %d (pid %d) with %d domain(s)",
+            index,
+            process.pid,
+            len(remaining),
+        )
+
+    for index in range(shard_count):
+        _start(index)
+
+    while workers:
+        time.sleep(SUPERVISE_INTERVAL)
+        for index, process in list(workers.items()):
+            if process.is_alive():
+                continue
+            del workers[index]
+            if process.exitcode == 0:
+                logger.info("Shard %d finished", index)
+            elif restarts[index] < max_restarts:
+                restarts[index] += 1
+                logger.warning(
+                    "Shard %d exited with code %s, restarting (%d/%d)",
+                    index,
+                    process.exitcode,
+                    restarts[index],
+                    max_restarts,
+                )
+                _start(index)
+            else:
+                logger.error(
+                    "Shard %d exited with code %s, giving up after %d restart(s)",
+                    index,
+                    process.exitcode,
+                    max_restarts,
+                )
+                failed.append(index)
+
+    merged_stats = merge_stats(
+        stats
+        for index in range(shard_count)
+        for stats in _read_done(_done_path(output_path, index)).values()
+    )
+    stats_path = Path(output_path).with_name(Path(output_path).name + ".stats.json")
+    stats_path.write_text(
+        json.dumps(merged_stats, indent=2, sort_keys=True, default=str),
+        encoding="utf-8",
+    )
+    logger.info("Merged stats of %d shard(s) written to %s", shard_count, stats_path)
+
+    if failed:
+        raise RuntimeError(f"Crawler shard(s) {failed} failed after restarts.")
+    return merged_stats
+
+
+def merge_stats(stats_list) -> dict:
+    """Sum numeric stats; keep the max for `*_max`/`*/max` keys."""
+    merged: dict = {}
+    for stats in stats_list:
+        for key, value in stats.items():
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            if key.endswith("max"):
+                merged[key] = max(merged.get(key, value), value)
+            else:
+                merged[key] = merged.get(key, 0) + value
+    return merged
+
+
+def _done_path(output_path: str, index: int) -> str:
+    return shard_path(output_path, index) + ".done.jsonl"
+
+
+def _read_done(done_path: str) -> dict[str, dict]:
+    done: dict[str, dict] = {}
+    try:
+        with open(done_path, encoding="utf-8") as done_file:
+            for line in done_file:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # line cut short by a crash
+                done[record["domain"]] = record["stats"]
+    except FileNotFoundError:
+        pass
+    return done
+
+
+def _run_shard(
+    output_path: str,
+    content_extractor: ContentExtractorProtocol,
+    urls_to_crawl: set[str],
+    log_file: str,
+    log_level: str,
+    refresh_sitemaps: bool,
+    done_path: str,
+) -> None:
+    from main import configure_logging
+    from run_crawler import run_crawler
+
+    configure_logging(log_file, log_level)
+
+    def _record_done(url: str, stats: dict) -> None:
+        record = {"domain": url, "finished_at": datetime.now().isoformat(), "stats": stats}
+        with open(done_path, "a", encoding="utf-8") as done_file:
+            done_file.write(json.dumps(record, default=str) + "\n")
+
+    run_crawler(
+        output_path=output_path,
+        content_extractor=content_extractor,
+        urls_to_crawl=urls_to_crawl,
+        log_file=log_file,
+        log_level=log_level,
+        refresh_sitemaps=refresh_sitemaps,
+        on_domain_finished=_record_done,
+    )
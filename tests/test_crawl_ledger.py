@@ -0,0 +1,45 @@
+import sqlite3
+
+import pytest
+
+from kurdish_scrapy.crawl_ledger import (
+    KIND_ARTICLE,
+    KIND_SITEMAP,
+    CrawlLedger,
+    close_ledger,
+    open_ledger,
+)
+
+
+def test_crawlers_of_a_process_share_one_connection(tmp_path):
+    path = str(tmp_path / "ledger.sqlite3")
+    first = open_ledger(path)
+    second = open_ledger(path)
+    assert first is second
+
+    close_ledger(path)
+    first.record("https://example.com/a", KIND_ARTICLE, lastmod="2024-01-01")
+    close_ledger(path)
+    # Closed by the last crawler
+    with pytest.raises(sqlite3.ProgrammingError):
+        first.record("https://example.com/b", KIND_ARTICLE)
+    assert open_ledger(path).is_unchanged("https://example.com/a", "2024-01-01")
+    close_ledger(path)
+
+
+def test_writers_on_one_file_do_not_block_each_other(tmp_path):
+    # Two processes, e.g. shards, each with their own connection.
+    path = str(tmp_path / "ledger.sqlite3")
+    first = CrawlLedger(path)
+    second = CrawlLedger(path)
+    second.db.execute("PRAGMA busy_timeout = 100")
+
+    for number in range(10):
+        first.record(f"https://a.example/{number}", KIND_ARTICLE, lastmod="1")
+        second.record(f"https://b.example/{number}", KIND_ARTICLE, lastmod="1")
+    second.record_many({"https://b.example/sitemap.xml": "2"}, KIND_SITEMAP)
+
+    assert second.is_unchanged("https://a.example/9", "1")
+    assert first.is_unchanged("https://b.example/sitemap.xml", "2")
+    first.close()
+    second.close()
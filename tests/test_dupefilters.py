@@ -0,0 +1,39 @@
+import pytest
+from scrapy import Request
+from scrapy.utils.request import RequestFingerprinter
+
+from kurdish_scrapy.dupefilters import DiskDupeFilter
+from kurdish_scrapy.finish_reasons import BUDGET_REASONS
+
+
+def _open(job_dir):
+    return DiskDupeFilter(str(job_dir), fingerprinter=RequestFingerprinter())
+
+
+def _close_with_pending_requests(job_dir, reason):
+    dupefilter = _open(job_dir)
+    assert not dupefilter.request_seen(Request("https://example.com/a"))
+    # Written by the scheduler right before it closes the dupefilter
+    (job_dir / "requests.queue").mkdir()
+    (job_dir / "requests.queue" / "active.json").write_text("[0]")
+    dupefilter.close(reason)
+
+
+@pytest.mark.parametrize("reason", ["finished", *sorted(BUDGET_REASONS)])
+def test_completed_crawl_starts_over(tmp_path, reason):
+    _close_with_pending_requests(tmp_path, reason)
+
+    assert not (tmp_path / "requests.queue").exists()
+    dupefilter = _open(tmp_path)
+    assert not dupefilter.request_seen(Request("https://example.com/a"))
+    dupefilter.close("shutdown")
+
+
+@pytest.mark.parametrize("reason", ["shutdown", "cancelled"])
+def test_interrupted_crawl_resumes(tmp_path, reason):
+    _close_with_pending_requests(tmp_path, reason)
+
+    assert (tmp_path / "requests.queue" / "active.json").exists()
+    dupefilter = _open(tmp_path)
+    assert dupefilter.request_seen(Request("https://example.com/a"))
+    dupefilter.close("shutdown")
@@ -0,0 +1,144 @@
+import json
+from types import SimpleNamespace
+from unittest.mock import Mock
+
+import pytest
+from scrapy import Request
+from scrapy.exceptions import NotConfigured
+from scrapy.http import HtmlResponse
+from scrapy.settings import Settings
+from twisted.internet.defer import Deferred
+
+from kurdish_scrapy import extensions
+from kurdish_scrapy.extensions import AdaptiveThrottle, CrawlBudget
+from kurdish_scrapy.finish_reasons import LOW_YIELD
+
+
+def _throttle(state_path, slots):
+    settings = Settings(
+        {
+            "ADAPTIVE_THROTTLE_ENABLED": True,
+            "ADAPTIVE_THROTTLE_MIN_DELAY": 0.1,
+            "ADAPTIVE_THROTTLE_MAX_DELAY": 60,
+            "ADAPTIVE_THROTTLE_MAX_CONCURRENCY": 8,
+            "ADAPTIVE_THROTTLE_TARGET_CONCURRENCY": 1,
+            "ADAPTIVE_THROTTLE_STATE_PATH": str(state_path),
+        }
+    )
+    crawler = SimpleNamespace(
+        settings=settings,
+        signals=Mock(),
+        stats=Mock(),
+        engine=SimpleNamespace(downloader=SimpleNamespace(slots=slots)),
+    )
+    return AdaptiveThrottle(crawler)
+
+
+def _download(throttle, domain, latency, times=1):
+    for _ in range(times):
+        request = Request(
+            f"https://{domain}/page",
+            meta={"download_slot": domain, "download_latency": latency},
+        )
+        response = HtmlResponse(request.url, request=request, body=b"<html></html>")
+        throttle._response_downloaded(response, request, spider=None)
+
+
+def test_crawlers_sharing_the_state_file_keep_each_others_updates(tmp_path):
+    state_path = tmp_path / "throttle.json"
+    state_path.write_text(
+        json.dumps(
+            {
+                "a.com": {"delay": 5.0, "concurrency": 1, "crawl_delay": 0.0},
+                "b.com": {"delay": 5.0, "concurrency": 1, "crawl_delay": 0.0},
+            }
+        )
+    )
+    slots = {
+        "a.com": SimpleNamespace(delay=1.0, concurrency=1),
+        "b.com": SimpleNamespace(delay=1.0, concurrency=1),
+    }
+    first = _throttle(state_path, slots)
+    second = _throttle(state_path, slots)
+
+    # The first crawler speeds a.com up and closes; the second, which only
+    # crawled b.com, closes later with its stale view of a.com.
+    _download(first, "a.com", latency=0.5, times=30)
+    first._spider_closed(spider=None, reason="finished")
+    _download(second, "b.com", latency=2.0)
+    second._spider_closed(spider=None, reason="finished")
+
+    saved = json.loads(state_path.read_text())
+    assert saved["a.com"]["delay"] == 0.5
+    assert saved["a.com"]["concurrency"] > 1
+    assert saved["b.com"]["delay"] == 4.5  # lowered gradually from 5.0
+
+
+def test_saved_rates_are_the_starting_point(tmp_path):
+    state_path = tmp_path / "throttle.json"
+    state_path.write_text(
+        json.dumps({"a.com": {"delay": 5.0, "concurrency": 3, "crawl_delay": 0.0}})
+    )
+    slot = SimpleNamespace(delay=1.0, concurrency=1)
+    throttle = _throttle(state_path, {"a.com": slot})
+
+    _download(throttle, "a.com", latency=5.0)
+
+    assert slot.concurrency == 4
+    assert slot.delay == 5.0
+
+
+def _budget(**settings):
+    closed = []
+
+    async def close_spider_async(reason):
+        closed.append(reason)
+
+    crawler = SimpleNamespace(
+        settings=Settings(
+            {
+                "CRAWL_BUDGET_MAX_PAGES": 0,
+                "CRAWL_BUDGET_MAX_BYTES": 0,
+                "CRAWL_BUDGET_MAX_SECONDS": 0,
+                "CRAWL_YIELD_WINDOW": 0,
+                "CRAWL_YIELD_MIN_RATIO": 0.5,
+                **settings,
+            }
+        ),
+        signals=Mock(),
+        stats=Mock(),
+        engine=SimpleNamespace(close_spider_async=close_spider_async),
+    )
+    return CrawlBudget(crawler), closed
+
+
+def _page(budget):
+    request = Request("https://example.com/page")
+    response = HtmlResponse(
+        request.url,
+        request=request,
+        headers={"Content-Type": "text/html"},
+        body=b"<html></html>",
+    )
+    budget._response_received(response, request, spider=None)
+
+
+def test_yield_window_of_zero_disables_the_yield_rule():
+    with pytest.raises(NotConfigured):
+        _budget()
+
+    budget, closed = _budget(CRAWL_BUDGET_MAX_PAGES=100)
+    for _ in range(10):
+        _page(budget)
+    assert budget.stop_reason is None
+    assert closed == []
+
+
+def test_low_yield_closes_the_spider_once(monkeypatch):
+    # Run the close coroutine without an installed reactor
+    monkeypatch.setattr(extensions, "deferred_from_coro", Deferred.fromCoroutine)
+    budget, closed = _budget(CRAWL_YIELD_WINDOW=4)
+    for _ in range(8):
+        _page(budget)
+    assert budget.stop_reason == LOW_YIELD
+    assert closed == [LOW_YIELD]
@@ -0,0 +1,115 @@
+import gzip
+import json
+
+import pyarrow.parquet as pq
+import zstandard
+
+from kurdish_scrapy import feeds
+from kurdish_scrapy.feeds import JsonLinesShardWriter, ParquetFeedWriter, free_path
+
+
+def _item(number):
+    return {
+        "text": f"nivîs {number}",
+        "title": f"Sernav {number}",
+        "url": f"https://example.com/{number}",
+        "publisher": "example.com",
+        "word_count": 2,
+        "lang": "kmr_Latn",
+        "lang_score": 0.99,
+        "source_type": "sitemap",
+    }
+
+
+def _read_lines(path, opener=gzip.open):
+    with opener(path, "rt", encoding="utf-8") as lines:
+        return [json.loads(line) for line in lines]
+
+
+def test_free_path_skips_finished_and_unfinished_files(tmp_path):
+    path = tmp_path / "out.parquet"
+    assert free_path(str(path)) == str(path)
+    path.touch()
+    (tmp_path / "out-1.parquet.tmp").touch()
+    assert free_path(str(path)) == str(tmp_path / "out-2.parquet")
+
+
+def test_parquet_writer_writes_row_groups_and_renames_when_closed(tmp_path):
+    writer = ParquetFeedWriter(str(tmp_path / "out.parquet"), row_group_size=2)
+    for number in range(5):
+        writer.write(_item(number))
+    assert not (tmp_path / "out.parquet").exists()
+    writer.close()
+
+    parquet_file = pq.ParquetFile(tmp_path / "out.parquet")
+    assert parquet_file.metadata.num_row_groups == 3
+    assert parquet_file.read().to_pylist() == [_item(number) for number in range(5)]
+    assert not (tmp_path / "out.parquet.tmp").exists()
+
+
+def test_parquet_writer_never_overwrites_earlier_output(tmp_path):
+    (tmp_path / "out.parquet").write_bytes(b"earlier run")
+    writer = ParquetFeedWriter(str(tmp_path / "out.parquet"))
+    writer.write(_item(1))
+    writer.close()
+    assert (tmp_path / "out.parquet").read_bytes() == b"earlier run"
+    assert pq.read_table(tmp_path / "out-1.parquet").num_rows == 1
+
+
+def test_gzip_shards_rotate_by_item_count(tmp_path):
+    writer = JsonLinesShardWriter(str(tmp_path / "out.jsonl.gz"), max_items=2)
+    for number in range(5):
+        writer.write(_item(number))
+    writer.close()
+
+    names = sorted(path.name for path in tmp_path.iterdir())
+    assert names == [
+        "out.part-00000.jsonl.gz",
+        "out.part-00001.jsonl.gz",
+        "out.part-00002.jsonl.gz",
+    ]
+    items = [item for name in names for item in _read_lines(tmp_path / name)]
+    assert items == [_item(number) for number in range(5)]
+
+
+def test_zstd_shards_continue_after_the_parts_on_disk(tmp_path):
+    (tmp_path / "out.part-00003.jsonl.zst").touch()
+    writer = JsonLinesShardWriter(str(tmp_path / "out.jsonl.zst"))
+    writer.write(_item(1))
+    writer.close()
+
+    with open(tmp_path / "out.part-00004.jsonl.zst", "rb") as raw:
+        data = zstandard.ZstdDecompressor().stream_reader(raw).read()
+    assert json.loads(data) == _item(1)
+
+
+def test_writers_stay_open_until_shutdown(tmp_path, monkeypatch):
+    from twisted.internet import reactor
+
+    triggers = []
+    monkeypatch.setattr(
+        reactor, "addSystemEventTrigger", lambda *args: triggers.append(args)
+    )
+    path = str(tmp_path / "out.parquet")
+    options = {"format": "parquet", "row_group_size": 10}
+    writer = feeds.open_writer(path, options)
+    writer.write(_item(1))
+    # A queue worker's next domain, after every earlier crawler finished
+    assert feeds.open_writer(path, options) is writer
+    writer.write(_item(2))
+    assert triggers == [("before", "shutdown", feeds.close_writers)]
+
+    feeds.close_writers()
+    assert pq.read_table(path).num_rows == 2
+    assert not (tmp_path / "out-1.parquet").exists()
+
+
+def test_shard_numbering_skips_parts_still_being_written(tmp_path):
+    (tmp_path / "out.part-00000.jsonl.gz").touch()
+    (tmp_path / "out.part-00001.jsonl.gz.tmp").touch()
+    writer = JsonLinesShardWriter(str(tmp_path / "out.jsonl.gz"), gzip_level=1)
+    writer.write(_item(1))
+    writer.close()
+
+    assert (tmp_path / "out.part-00001.jsonl.gz.tmp").stat().st_size == 0
+    assert _read_lines(tmp_path / "out.part-00002.jsonl.gz") == [_item(1)]
@@ -0,0 +1,73 @@
+import numpy as np
+
+from kurdish_scrapy.near_duplicates import MinHasher, NearDuplicateIndex
+
+STORY = " ".join(f"peyv{index}" for index in range(200))
+OTHER_STORY = " ".join(f"gotin{index}" for index in range(200))
+
+
+def _edited(text, position, word="guherî"):
+    words = text.split()
+    words[position] = word
+    return " ".join(words)
+
+
+def test_signatures_are_stable_across_hashers():
+    text = "Ev nûçeyek e li ser bajêr û gundên derdorê"
+    first = MinHasher(num_perm=64).signature(text)
+    second = MinHasher(num_perm=64).signature(text)
+    assert first.dtype == np.uint32
+    assert len(first) == 64
+    assert np.array_equal(first, second)
+
+
+def test_signature_similarity_follows_the_shared_shingles():
+    hasher = MinHasher()
+    signature = hasher.signature(STORY)
+    close = hasher.signature(_edited(STORY, 100))
+    unrelated = hasher.signature(OTHER_STORY)
+    assert np.mean(signature == close) > 0.8
+    assert np.mean(signature == unrelated) < 0.1
+
+
+def test_exact_copies_ignore_case_and_whitespace():
+    index = NearDuplicateIndex(":memory:")
+    assert index.add(STORY, "https://a.example/1") is None
+    duplicate = index.add("  " + STORY.upper().replace(" ", "\n"), "https://b.example/1")
+    assert duplicate.kind == "exact"
+    assert duplicate.url == "https://a.example/1"
+    assert duplicate.similarity == 1.0
+    index.close()
+
+
+def test_near_duplicates_are_found_and_distinct_texts_kept():
+    index = NearDuplicateIndex(":memory:", threshold=0.8)
+    assert index.add(STORY, "https://a.example/1") is None
+    duplicate = index.add(_edited(STORY, 100), "https://b.example/1")
+    assert duplicate.kind == "near"
+    assert duplicate.url == "https://a.example/1"
+    assert 0.8 <= duplicate.similarity < 1.0
+    assert index.add(OTHER_STORY, "https://c.example/1") is None
+    index.close()
+
+
+def test_index_survives_reopening(tmp_path):
+    path = str(tmp_path / "dedup.sqlite")
+    index = NearDuplicateIndex(path)
+    index.add(STORY, "https://a.example/1")
+    index.close()
+
+    reopened = NearDuplicateIndex(path)
+    assert reopened.add(STORY, "https://b.example/1").kind == "exact"
+    reopened.close()
+
+
+def test_oldest_documents_are_evicted(monkeypatch):
+    monkeypatch.setattr(NearDuplicateIndex, "EVICT_INTERVAL", 2)
+    index = NearDuplicateIndex(":memory:", max_documents=2)
+    for number in range(4):
+        text = " ".join(f"nûçe{number}-{word}" for word in range(50))
+        assert index.add(text, f"https://a.example/{number}") is None
+    urls = [url for (url,) in index.db.execute("SELECT url FROM documents ORDER BY id")]
+    assert urls == ["https://a.example/2", "https://a.example/3"]
+    index.close()
@@ -0,0 +1,113 @@
+import sqlite3
+from types import SimpleNamespace
+from unittest.mock import Mock
+
+import pytest
+from scrapy.exceptions import DropItem
+from scrapy.settings import Settings
+
+from kurdish_scrapy import pipelines
+
+
+class FakeModel:
+    def __init__(self):
+        self.calls = []
+
+    def predict(self, texts):
+        self.calls.append(len(texts))
+        return [["__label__kmr_Latn"]] * len(texts), [[0.98765]] * len(texts)
+
+
+class FakeStats(dict):
+    def inc_value(self, key, count=1):
+        self[key] = self.get(key, 0) + count
+
+    def get_value(self, key):
+        return self.get(key)
+
+
+def _stats():
+    return FakeStats()
+
+
+def test_language_id_batches_items_of_all_crawlers(monkeypatch):
+    model = FakeModel()
+    monkeypatch.setattr(pipelines, "get_language_model", lambda: model)
+    first = pipelines.open_batcher(batch_size=3, max_delay=60)
+    second = pipelines.open_batcher(batch_size=3, max_delay=60)
+    assert first is second
+
+    stats_a, stats_b = _stats(), _stats()
+    results = []
+    for text, stats in [("a", stats_a), ("b", stats_b), ("c", stats_a)]:
+        first.predict({"text": text}, stats).addCallback(results.append)
+
+    assert model.calls == [3]
+    assert [item["lang"] for item in results] == ["kmr_Latn"] * 3
+    assert results[0]["lang_score"] == 0.988
+    assert stats_a.get_value("lang_id/batches") == 1
+    assert stats_a.get_value("lang_id/batch_size/2-3") == 1
+    assert stats_b.get_value("lang_id/batch_size/2-3") == 1
+
+    pipelines.close_batcher()
+    pipelines.close_batcher()
+
+
+def test_last_crawler_closing_flushes_the_batcher(monkeypatch):
+    model = FakeModel()
+    monkeypatch.setattr(pipelines, "get_language_model", lambda: model)
+    batcher = pipelines.open_batcher(batch_size=64, max_delay=60)
+    results = []
+    batcher.predict({"text": "a"}, _stats()).addCallback(results.append)
+    assert results == []
+
+    pipelines.close_batcher()
+    assert model.calls == [1]
+    assert len(results) == 1
+
+
+STORY = " ".join(f"peyv{index}" for index in range(200))
+
+
+def _dedup(path):
+    settings = Settings(
+        {
+            "DEDUP_ENABLED": True,
+            "DEDUP_INDEX_PATH": str(path),
+            "DEDUP_NEAR_THRESHOLD": 0.8,
+            "DEDUP_NUM_PERM": 128,
+            "DEDUP_BANDS": 16,
+            "DEDUP_SHINGLE_SIZE": 5,
+            "DEDUP_MAX_DOCUMENTS": 0,
+        }
+    )
+    pipeline = pipelines.DedupPipeline.from_crawler(
+        SimpleNamespace(settings=settings, stats=_stats())
+    )
+    spider = SimpleNamespace(allowed_domains=["example.com"], logger=Mock())
+    pipeline.open_spider(spider)
+    return pipeline, spider
+
+
+def test_dedup_drops_exact_and_near_duplicates_across_crawlers(tmp_path):
+    first, first_spider = _dedup(tmp_path / "dedup.sqlite")
+    second, second_spider = _dedup(tmp_path / "dedup.sqlite")
+    assert first.index is second.index
+
+    item = {"text": STORY, "url": "https://a.example/1"}
+    assert first.process_item(item, first_spider) is item
+    with pytest.raises(DropItem, match="exact duplicate of https://a.example/1"):
+        second.process_item(
+            {"text": STORY.upper(), "url": "https://b.example/1"}, second_spider
+        )
+    near = STORY.replace("peyv100", "guherî")
+    with pytest.raises(DropItem, match="near duplicate of https://a.example/1"):
+        second.process_item({"text": near, "url": "https://b.example/2"}, second_spider)
+    assert second.stats == {"dedup/exact": 1, "dedup/near": 1}
+
+    first.close_spider(first_spider)
+    other = {"text": "nûçeyeke din", "url": "https://b.example/3"}
+    assert second.process_item(other, second_spider) is other
+    second.close_spider(second_spider)
+    with pytest.raises(sqlite3.ProgrammingError):
+        second.index.db.execute("SELECT 1")
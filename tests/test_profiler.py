@@ -0,0 +1,73 @@
+import multiprocessing
+import signal
+import threading
+import time
+
+from extractor import process_pool
+from kurdish_scrapy import instrumentation, profiler
+from kurdish_scrapy.profiler import SamplingProfiler
+
+
+def _busy(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def test_follower_writes_one_file_per_window(tmp_path):
+    window = multiprocessing.Value("d", 0.0)
+    stop_busy = threading.Event()
+    busy = threading.Thread(target=_busy, args=(stop_busy,), name="busy")
+    busy.start()
+    follower = SamplingProfiler(str(tmp_path), interval=0.005)
+    follower.follow(window)
+    try:
+        window.value = time.time()
+        time.sleep(0.5)
+        window.value = 0.0
+        time.sleep(0.3)
+        files = list(tmp_path.glob("profile_*.folded"))
+        assert len(files) == 1
+        assert "busy;" in files[0].read_text(encoding="utf-8")
+
+        # A window still open when the worker stops is written too. It starts
+        # a second later, so it gets its own file name.
+        window.value = time.time() + 1
+        time.sleep(0.3)
+    finally:
+        follower.stop()
+        stop_busy.set()
+        busy.join()
+    assert len(list(tmp_path.glob("profile_*.folded"))) == 2
+
+
+class _StageRecorder:
+    def extract(self, html, url):
+        return instrumentation.current_stage()
+
+
+def test_worker_extraction_is_labelled_without_metrics(monkeypatch):
+    monkeypatch.setattr(process_pool, "_worker_extractor", _StageRecorder())
+    monkeypatch.setattr(instrumentation, "_metrics", None)
+    url = "https://www.Nuhev.com/a"
+    stage, _ = process_pool._extract_in_worker("<html></html>", url)
+    assert stage == (instrumentation.STAGE_EXTRACT, "nuhev.com")
+    assert instrumentation.current_stage() is None
+
+
+def test_signal_toggles_from_the_reactor_loop(tmp_path, monkeypatch):
+    from twisted.internet import reactor
+
+    calls = []
+    monkeypatch.setattr(reactor, "addSystemEventTrigger", lambda *args: None)
+    monkeypatch.setattr(reactor, "callFromThread", lambda *args: calls.append(args))
+    monkeypatch.setattr(profiler, "_profiler", None)
+    previous_handler = signal.getsignal(signal.SIGUSR1)
+    try:
+        sampler = profiler.install(str(tmp_path), 0.01, 5, "SIGUSR1")
+        # Arriving while `start()` holds the lock must not deadlock
+        with sampler._lock:
+            signal.raise_signal(signal.SIGUSR1)
+    finally:
+        signal.signal(signal.SIGUSR1, previous_handler)
+    assert calls == [(sampler.toggle, 5)]
+    assert not sampler.running
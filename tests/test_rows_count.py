@@ -0,0 +1,51 @@
+import io
+
+from scrapy.exporters import JsonItemExporter
+
+from rows_count import count_file, iter_rows
+
+
+def _export_runs(path, runs, indent):
+    # Two crawls writing to the same .json output with overwrite=False
+    buffer = io.BytesIO()
+    for items in runs:
+        exporter = JsonItemExporter(buffer, indent=indent)
+        exporter.start_exporting()
+        for item in items:
+            exporter.export_item(item)
+        exporter.finish_exporting()
+    path.write_bytes(buffer.getvalue())
+
+
+RUNS = [
+    [
+        {"url": "https://a.example/1", "text": "yek du"},
+        {"url": "https://a.example/2", "text": "[sê] çar, pênc"},
+    ],
+    [{"url": "https://b.example/1", "text": "şeş"}],
+]
+
+
+def test_json_export_with_appended_arrays(tmp_path):
+    path = tmp_path / "items.json"
+    _export_runs(path, RUNS, indent=0)
+    assert "][" in path.read_text(encoding="utf-8").splitlines()
+
+    assert list(iter_rows(str(path))) == [item for items in RUNS for item in items]
+    stats = count_file(str(path), exact=True)
+    assert stats.rows == 3
+    assert stats.unique["url"].count() == 3
+
+
+def test_json_export_on_one_line(tmp_path):
+    path = tmp_path / "items.json"
+    _export_runs(path, RUNS, indent=None)
+
+    assert list(iter_rows(str(path))) == [item for items in RUNS for item in items]
+
+
+def test_jsonl(tmp_path):
+    path = tmp_path / "items.jsonl"
+    path.write_text('{"url": "u1"}\n\n{"url": "u2"}\n', encoding="utf-8")
+
+    assert list(iter_rows(str(path))) == [{"url": "u1"}, {"url": "u2"}]
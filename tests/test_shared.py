@@ -0,0 +1,20 @@
+from kurdish_scrapy.shared import SharedRegistry
+
+
+def test_last_release_hands_back_the_object():
+    registry = SharedRegistry()
+    created = []
+
+    def factory():
+        created.append(object())
+        return created[-1]
+
+    first = registry.acquire("path", factory)
+    assert registry.acquire("path", factory) is first
+    assert registry.acquire("other", factory) is not first
+    assert len(created) == 2
+
+    assert registry.release("path") is None
+    assert registry.release("path") is first
+    assert registry.release("path") is None  # already gone
+    assert registry.acquire("path", factory) is not first
@@ -0,0 +1,115 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from kurdish_scrapy.sitemap_discovery import SitemapDiscovery
+
+URLSET = (
+    b'<?xml version="1.0"?><urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">'
+    b"<url><loc>http://example.com/a</loc></url></urlset>"
+)
+
+
+class Site(ThreadingHTTPServer):
+    """Stand-in site serving `pages` (path -> (content type, body)), else 404."""
+
+    daemon_threads = True
+
+    def __init__(self, pages: dict, delay: float = 0.0):
+        super().__init__(("127.0.0.1", 0), SiteHandler)
+        self.pages = pages
+        self.delay = delay
+        self.requested: list[str] = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/"
+
+
+class SiteHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        site = self.server
+        with site.lock:
+            site.requested.append(self.path)
+            site.in_flight += 1
+            site.max_in_flight = max(site.max_in_flight, site.in_flight)
+        try:
+            time.sleep(site.delay)
+            page = site.pages.get(self.path)
+            if page is None:
+                self.send_error(404)
+                return
+            content_type, body = page
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        finally:
+            with site.lock:
+                site.in_flight -= 1
+
+
+@pytest.fixture
+def serve():
+    sites = []
+
+    def start(pages, delay=0.0):
+        site = Site(pages, delay)
+        threading.Thread(target=site.serve_forever, daemon=True).start()
+        sites.append(site)
+        return site
+
+    yield start
+    for site in sites:
+        site.shutdown()
+        site.server_close()
+
+
+def test_sitemaps_listed_in_robots_txt(serve):
+    site = serve(
+        {
+            "/robots.txt": (
+                "text/plain",
+                b"User-agent: *\nSitemap: /news-sitemap.xml\n"
+                b"Sitemap: http://other.example/sitemap.xml\n",
+            ),
+            "/news-sitemap.xml": ("application/xml", URLSET),
+        }
+    )
+    with SitemapDiscovery(max_domains=1, per_host=2, patterns=["sitemap.xml"]) as discovery:
+        assert discovery.discover(site.url) == {site.url + "news-sitemap.xml"}
+        assert discovery.bytes_transferred > 0
+    # Found through robots.txt, so no pattern was probed
+    assert "/sitemap.xml" not in site.requested
+
+
+def test_pattern_candidates_skip_html_and_stop_after_a_hit(serve):
+    site = serve(
+        {
+            "/latest": ("text/html", b"<html><body>latest news</body></html>"),
+            "/sitemap.xml": ("application/xml", URLSET),
+        }
+    )
+    patterns = ["latest", "sitemap.xml", "post-sitemap.xml", "sitemap_index.xml"]
+    with SitemapDiscovery(max_domains=1, per_host=2, patterns=patterns) as discovery:
+        assert discovery.discover(site.url) == {site.url + "sitemap.xml"}
+    assert "/post-sitemap.xml" not in site.requested
+    assert "/sitemap_index.xml" not in site.requested
+
+
+def test_probes_per_host_stay_within_the_limit(serve):
+    site = serve({}, delay=0.05)
+    patterns = [f"sitemap-{index}.xml" for index in range(8)]
+    with SitemapDiscovery(max_domains=2, per_host=3, patterns=patterns) as discovery:
+        assert discovery.discover(site.url) == set()
+    assert len(site.requested) == 1 + len(patterns)  # robots.txt, then every pattern
+    assert 2 <= site.max_in_flight <= 3
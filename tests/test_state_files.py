@@ -0,0 +1,48 @@
+import json
+from concurrent.futures import ProcessPoolExecutor
+
+from kurdish_scrapy.sitemap_discovery import DiscoveryCache
+from kurdish_scrapy.state_files import update_json
+
+
+def _add_keys(path, worker, count):
+    for index in range(count):
+        update_json(path, lambda stored: {**stored, f"{worker}-{index}": index}, default={})
+
+
+def test_concurrent_updates_keep_every_entry(tmp_path):
+    path = str(tmp_path / "state.json")
+    with ProcessPoolExecutor(4) as executor:
+        for future in [executor.submit(_add_keys, path, worker, 25) for worker in range(4)]:
+            future.result()
+
+    assert len(json.loads((tmp_path / "state.json").read_text())) == 100
+    assert [p.name for p in tmp_path.iterdir() if p.suffix == ".tmp"] == []
+
+
+def test_discovery_shards_saving_together_keep_each_others_domains(tmp_path):
+    path = str(tmp_path / "discovery.json")
+    first = DiscoveryCache(path, ttl=3600, negative_ttl=3600)
+    second = DiscoveryCache(path, ttl=3600, negative_ttl=3600)
+    first.set("https://a.example", {"https://a.example/sitemap.xml"})
+    second.set("https://b.example", set())
+    first.save()
+    second.save()
+
+    reloaded = DiscoveryCache(path, ttl=3600, negative_ttl=3600)
+    assert reloaded.get("https://a.example") == {"https://a.example/sitemap.xml"}
+    assert reloaded.get("https://b.example") == set()
+
+
+def test_discovery_save_keeps_the_newer_result(tmp_path):
+    path = str(tmp_path / "discovery.json")
+    stale = DiscoveryCache(path, ttl=3600, negative_ttl=3600)
+    stale.set("https://a.example", set())
+    stale._entries["https://a.example"]["checked_at"] -= 60
+    fresh = DiscoveryCache(path, ttl=3600, negative_ttl=3600)
+    fresh.set("https://a.example", {"https://a.example/sitemap.xml"})
+    fresh.save()
+    stale.save()
+
+    reloaded = DiscoveryCache(path, ttl=3600, negative_ttl=3600)
+    assert reloaded.get("https://a.example") == {"https://a.example/sitemap.xml"}
@@ -0,0 +1,98 @@
+from extractor.url_canonicalizer import UrlCanonicalizer
+
+
+def _learn(canonicalizer, pairs):
+    for url, canonical_url in pairs:
+        canonicalizer.learn(url, canonical_url)
+
+
+def test_param_dropped_by_canonical_of_same_page_is_learned():
+    canonicalizer = UrlCanonicalizer("https://example.com/")
+    _learn(
+        canonicalizer,
+        [
+            (f"https://example.com/news/{n}?from=home", f"https://example.com/news/{n}")
+            for n in range(3)
+        ],
+    )
+
+    assert canonicalizer.canonicalize("https://example.com/news/9?from=home") == (
+        "https://example.com/news/9"
+    )
+
+
+def test_query_id_redirected_to_another_path_is_not_learned():
+    # WordPress: /?p=N names the post whose canonical URL is its permalink.
+    canonicalizer = UrlCanonicalizer("https://example.com/")
+    _learn(
+        canonicalizer,
+        [
+            (f"https://example.com/?p={n}", f"https://example.com/story-{n}/")
+            for n in range(10)
+        ],
+    )
+
+    assert not canonicalizer.is_ignorable_param("p")
+    assert canonicalizer.canonicalize("https://example.com/?p=1") != (
+        canonicalizer.canonicalize("https://example.com/?p=2")
+    )
+
+
+def test_other_scheme_or_host_does_not_vote():
+    canonicalizer = UrlCanonicalizer("https://example.com/")
+    _learn(
+        canonicalizer,
+        [
+            ("http://example.com/a?page=2", "https://example.com/a"),
+            ("https://www.example.com/a?page=2", "https://example.com/a"),
+            ("https://example.com/a?page=2", "https://www.example.com/a"),
+        ],
+    )
+
+    assert not canonicalizer.is_ignorable_param("page")
+
+
+def test_scheme_and_host_are_kept_until_the_site_origin_is_learned():
+    canonicalizer = UrlCanonicalizer("http://denge-gel.org/")
+    assert canonicalizer.canonicalize("https://denge-gel.org/news/x") == (
+        "https://denge-gel.org/news/x"
+    )
+    assert canonicalizer.canonicalize("http://www.denge-gel.org/news/x") == (
+        "http://www.denge-gel.org/news/x"
+    )
+
+
+def test_redirects_teach_the_site_origin():
+    canonicalizer = UrlCanonicalizer("http://denge-gel.org/")
+    _learn(
+        canonicalizer,
+        [
+            (f"http://denge-gel.org/news/{n}", f"https://denge-gel.org/news/{n}")
+            for n in range(10)
+        ],
+    )
+
+    assert canonicalizer.site_origin() == "https://denge-gel.org"
+    for url in (
+        "http://denge-gel.org/news/x",
+        "https://www.denge-gel.org/news/x",
+        "HTTPS://denge-gel.org:443/news/x",
+    ):
+        assert canonicalizer.canonicalize(url) == "https://denge-gel.org/news/x"
+    assert canonicalizer.canonicalize("http://denge-gel.org:8080/news/x") == (
+        "http://denge-gel.org:8080/news/x"
+    )
+
+
+def test_disagreeing_pages_leave_the_origin_open():
+    canonicalizer = UrlCanonicalizer("https://example.com/")
+    _learn(
+        canonicalizer,
+        [("https://example.com/a", "https://example.com/a")] * 3
+        + [("https://example.com/b", "https://www.example.com/b")] * 3,
+    )
+
+    assert canonicalizer.site_origin() is None
+    assert canonicalizer.canonicalize("http://www.example.com/c") == (
+        "http://www.example.com/c"
+    )
@@ -0,0 +1,95 @@
+import pytest
+
+from extractor.url_extractor import (
+    REASON_MEDIA,
+    REASON_OFFSITE,
+    REASON_SCHEME,
+    UrlExtractor,
+)
+
+
+@pytest.mark.parametrize(
+    "url, reason",
+    [
+        ("https://example.com/2024/01/news-story", None),
+        ("http://www.example.com/tag/ziman", None),
+        ("https://news.example.com/story", None),
+        ("https://example.com/hotel-news", None),
+        ("https://example.com/report.html", None),
+        ("HTTPS://example.com/upper-case-scheme", None),
+        ("mailto:info@example.com", REASON_SCHEME),
+        ("javascript:void(0)", REASON_SCHEME),
+        ("tel:+9640000000", REASON_SCHEME),
+        ("ftp://example.com/file", REASON_SCHEME),
+        ("https://evilexample.com/story", REASON_OFFSITE),
+        ("https://notexample.com/story", REASON_OFFSITE),
+        ("https://example.com.evil.org/story", REASON_OFFSITE),
+        ("https://twitter.com/share?url=https://example.com/story", REASON_OFFSITE),
+        ("https://example.com/files/report.pdf", REASON_MEDIA),
+        ("https://example.com/img/photo.JPG", REASON_MEDIA),
+        ("https://example.com/audio/song.mp3?download=1", REASON_MEDIA),
+        ("https://example.com/archive.zip", REASON_MEDIA),
+    ],
+)
+def test_classify(url, reason):
+    assert UrlExtractor.classify(url, "example.com") == reason
+    assert UrlExtractor.should_request(url, "example.com") is (reason is None)
+
+
+def test_get_domain_strips_www_and_lowercases():
+    assert UrlExtractor.get_domain("https://WWW.Example.com/path") == "example.com"
+
+
+def _response(body: bytes, url: str = "https://example.com/news/"):
+    from scrapy.http import HtmlResponse
+
+    return HtmlResponse(url=url, body=body, encoding="utf-8")
+
+
+def test_extract_resolves_filters_and_drops_fragments():
+    body = b"""<html><body>
+    <a href="/story-1#comments">1</a>
+    <a class='x' href='story-2'>2</a>
+    <a href=https://sub.example.com/story-3>3</a>
+    <a href="https://other.org/">off</a>
+    <a href="/photo.jpg">img</a>
+    <a href="mailto:a@example.com">mail</a>
+    <a href="/q?a=1&amp;b=2">q</a>
+    </body></html>"""
+    assert UrlExtractor().extract(_response(body)) == {
+        "https://example.com/story-1",
+        "https://example.com/news/story-2",
+        "https://sub.example.com/story-3",
+        "https://example.com/q?a=1&b=2",
+    }
+
+
+def test_extract_follows_base_href():
+    body = b'<head><base href="https://example.com/ku/"></head><a href="story">s</a>'
+    assert UrlExtractor().extract(_response(body)) == {"https://example.com/ku/story"}
+
+
+def test_extract_skips_anchors_in_scripts_styles_and_comments():
+    body = b"""<html><body>
+    <script>document.write('<a href="/from-script">x</a>');</script>
+    <SCRIPT type="text/template"><a href="/from-template">x</a></SCRIPT>
+    <style>/* <a href="/from-style"> */</style>
+    <!-- <a href="/from-comment">old</a> -->
+    <a href="/real">real</a>
+    </body></html>"""
+    assert UrlExtractor().extract(_response(body)) == {"https://example.com/real"}
+
+
+def test_extract_dedups_on_href_value():
+    class CountingExtractor(UrlExtractor):
+        checked = 0
+
+        @classmethod
+        def should_request(cls, url, domain):
+            cls.checked += 1
+            return super().should_request(url, domain)
+
+    body = b"""<a href="/story">a</a> <a class="more" href="/story">b</a>
+    <a href='/story' title="t">c</a>"""
+    assert CountingExtractor().extract(_response(body)) == {"https://example.com/story"}
+    assert CountingExtractor.checked == 1
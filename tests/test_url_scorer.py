@@ -0,0 +1,72 @@
+from types import SimpleNamespace
+
+from scrapy import signals
+from scrapy.exceptions import DropItem
+from scrapy.http import HtmlResponse
+from scrapy.settings import Settings
+from scrapy.signalmanager import SignalManager
+
+from extractor.url_scorer import UrlScorer
+from kurdish_scrapy.spiders.recursive import RecursiveSpider
+
+
+def test_article_links_outrank_listings():
+    scorer = UrlScorer()
+    ranked = [
+        "https://example.com/news/2024/05/12/kurdish-language-day-celebrated-in-cities",
+        "https://example.com/news/2024/05/12/",
+        "https://example.com/news/123456",
+        "https://example.com/news/",
+        "https://example.com/news/page/2",
+    ]
+
+    scores = [scorer.score(url) for url in ranked]
+
+    assert scores == sorted(set(scores), reverse=True)
+    assert scorer.score("https://example.com/") < scorer.score(ranked[0])
+
+
+def test_prefix_yield_moves_the_score():
+    scorer = UrlScorer()
+    for index in range(10):
+        scorer.record(f"https://example.com/news/{index}/story", True)
+        scorer.record(f"https://example.com/tag/{index}/list", False)
+
+    news = scorer.score("https://example.com/news/99/story")
+    tag = scorer.score("https://example.com/tag/99/story")
+
+    assert news > tag
+    assert scorer.history == {"/news/N": [10, 10], "/tag/N": [10, 0]}
+
+
+def test_too_few_samples_do_not_count():
+    scorer = UrlScorer()
+    for index in range(UrlScorer.MIN_SAMPLES - 1):
+        scorer.record(f"https://example.com/tag/x{index}", False)
+
+    assert scorer.score("https://example.com/tag/y") == UrlScorer().score(
+        "https://example.com/tag/y"
+    )
+
+
+def test_spider_records_yield_from_pipeline_outcome():
+    crawler = SimpleNamespace(
+        settings=Settings({"URL_PRIORITY_ENABLED": True}), signals=SignalManager()
+    )
+    spider = RecursiveSpider.from_crawler(crawler, url="https://example.com/")
+    spider.state = {}
+
+    kept = HtmlResponse("https://example.com/news/1/a", body=b"")
+    dropped = HtmlResponse("https://example.com/news/1/b", body=b"")
+    crawler.signals.send_catch_log(
+        signals.item_scraped, item={}, response=kept, spider=spider
+    )
+    crawler.signals.send_catch_log(
+        signals.item_dropped,
+        item={},
+        response=dropped,
+        exception=DropItem("not Kurdish"),
+        spider=spider,
+    )
+
+    assert spider.state["url_prefix_yield"] == {"/news/N": [2, 1]}
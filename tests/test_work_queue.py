@@ -0,0 +1,70 @@
+from kurdish_scrapy.work_queue import (
+    STATUS_DONE,
+    STATUS_FAILED,
+    STATUS_LEASED,
+    STATUS_PENDING,
+    SqliteWorkQueue,
+)
+
+
+def _queue(tmp_path, max_attempts=3):
+    return SqliteWorkQueue(str(tmp_path / "queue.sqlite3"), max_attempts=max_attempts)
+
+
+def test_runners_never_lease_the_same_item(tmp_path):
+    first = _queue(tmp_path)
+    second = _queue(tmp_path)
+    first.add(["https://a.example", "https://b.example"])
+
+    claimed = {first.claim("a", 60), second.claim("b", 60)}
+
+    assert claimed == {"https://a.example", "https://b.example"}
+    assert first.claim("a", 60) is None
+
+
+def test_expired_lease_is_taken_over(tmp_path):
+    queue = _queue(tmp_path)
+    queue.add(["https://a.example"])
+    assert queue.claim("dead", -1) == "https://a.example"  # expired at once
+
+    assert queue.claim("alive", 60) == "https://a.example"
+    # The first runner's lease is gone: it can neither renew nor end it.
+    assert not queue.heartbeat("dead", "https://a.example", 60)
+    queue.complete("dead", "https://a.example")
+    assert queue.counts() == {STATUS_LEASED: 1}
+
+    assert queue.heartbeat("alive", "https://a.example", 60)
+    queue.complete("alive", "https://a.example")
+    assert queue.counts() == {STATUS_DONE: 1}
+
+
+def test_released_item_keeps_its_attempts(tmp_path):
+    queue = _queue(tmp_path, max_attempts=1)
+    queue.add(["https://a.example"])
+    queue.claim("a", 60)
+    queue.release("a", "https://a.example")
+
+    assert queue.claim("b", 60) == "https://a.example"
+
+
+def test_item_failing_every_attempt_ends_failed(tmp_path):
+    queue = _queue(tmp_path, max_attempts=2)
+    queue.add(["https://a.example"])
+    queue.claim("a", 60)
+    queue.fail("a", "https://a.example")
+    assert queue.counts() == {STATUS_PENDING: 1}
+
+    queue.claim("a", 60)
+    queue.fail("a", "https://a.example")
+    assert queue.counts() == {STATUS_FAILED: 1}
+    assert queue.claim("a", 60) is None
+
+
+def test_expired_last_attempt_ends_failed(tmp_path):
+    queue = _queue(tmp_path, max_attempts=2)
+    queue.add(["https://a.example"])
+    queue.claim("a", -1)
+    queue.claim("b", -1)
+
+    assert queue.claim("c", 60) is None
+    assert queue.counts() == {STATUS_FAILED: 1}